@@ -4,3 +4,7 @@ class AIConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.ai'
     verbose_name = 'AI & Machine Learning'
+
+    def ready(self):
+        from . import feature_store
+        feature_store.connect_signals()
@@ -0,0 +1,328 @@
+"""
+Chatbot runtime.
+
+Each bot's ``training_data`` compiles into a TF-IDF vectorizer plus a
+logistic-regression intent classifier. ``training_data`` is a list of
+``{"intent", "examples": [...], "responses": [...]}`` objects (single
+``{"intent", "text"}`` pairs are accepted too). ``configuration`` may set
+``confidence_threshold``, ``fallback_response`` and ``escalation_intents``.
+Compiled bots are cached per process and keyed by the bot's ``updated_at``,
+so editing a bot recompiles it on the next message.
+
+Incoming messages are gathered into micro-batches: the first caller waits up
+to ``CHATBOT_BATCH_WAIT`` seconds for others (or until ``CHATBOT_BATCH_SIZE``
+are queued), then classifies the whole batch with one matrix product per bot
+and writes every message and conversation change with one ``bulk_create``
+and one ``bulk_update``. A session belongs to the bot that started it;
+a message naming another bot's session fails with ``SessionConflict``
+without touching that conversation. Reply latency, including time spent waiting for a
+batch, is tracked per bot and reported as p50/p95/p99.
+"""
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import Chatbot, ChatbotConversation, ChatbotMessage
+
+
+SESSION_ID_LENGTH = ChatbotConversation._meta.get_field('session_id').max_length
+DEFAULT_THRESHOLD = 0.35
+DEFAULT_FALLBACK = "Sorry, I didn't quite get that. Could you rephrase?"
+DEFAULT_ESCALATION = ('escalate', 'human', 'agent')
+ESCALATION_REPLY = 'Let me connect you with a member of our team.'
+
+ENTITY_PATTERN = re.compile('|'.join([
+    r'(?P<email>[\w.+-]+@[\w-]+\.[\w.-]+)',
+    r'(?P<ticket>\bTKT-\d{8}\b)',
+    r'(?P<date>\b\d{4}-\d{2}-\d{2}\b)',
+    r'(?P<amount>[$€£]\s?\d[\d,]*(?:\.\d{1,2})?)',
+    r'(?P<phone>\+?\d[\d\s().-]{6,}\d)',
+]))
+
+
+class SessionConflict(Exception):
+    """The session id already belongs to a conversation with another chatbot."""
+
+
+def extract_entities(text):
+    return [
+        {'type': match.lastgroup, 'value': match.group(), 'start': match.start(), 'end': match.end()}
+        for match in ENTITY_PATTERN.finditer(text)
+    ]
+
+
+def parse_training_data(training_data):
+    """``(examples, labels, responses by intent)`` from a bot's ``training_data``."""
+    examples, labels, responses = [], [], {}
+    for entry in training_data or []:
+        if not isinstance(entry, dict) or not entry.get('intent'):
+            continue
+        intent = str(entry['intent'])
+        texts = entry.get('examples') or ([entry['text']] if entry.get('text') else [])
+        for text in texts:
+            examples.append(str(text))
+            labels.append(intent)
+        replies = entry.get('responses') or ([entry['response']] if entry.get('response') else [])
+        responses.setdefault(intent, []).extend(str(reply) for reply in replies)
+    return examples, labels, responses
+
+
+class CompiledBot:
+    """A bot's classifier and replies, ready to answer a batch of messages."""
+
+    def __init__(self, chatbot):
+        config = chatbot.configuration or {}
+        self.threshold = float(config.get('confidence_threshold', DEFAULT_THRESHOLD))
+        self.fallback = config.get('fallback_response', DEFAULT_FALLBACK)
+        self.escalation = set(config.get('escalation_intents', DEFAULT_ESCALATION))
+        examples, labels, self.responses = parse_training_data(chatbot.training_data)
+        self.intents = sorted(set(labels))
+        self.vectorizer = self.classifier = None
+        if len(self.intents) > 1:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.linear_model import LogisticRegression
+
+            self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True)
+            self.classifier = LogisticRegression(max_iter=1000, C=float(config.get('regularization', 10)))
+            self.classifier.fit(self.vectorizer.fit_transform(examples), labels)
+            self.intents = list(self.classifier.classes_)
+
+    def classify(self, texts):
+        """Best intent and its probability for every text."""
+        if self.classifier is None:
+            intent = self.intents[0] if self.intents else ''
+            return [intent] * len(texts), np.ones(len(texts)) if intent else np.zeros(len(texts))
+        probabilities = self.classifier.predict_proba(self.vectorizer.transform(texts))
+        best = probabilities.argmax(axis=1)
+        return [self.intents[index] for index in best], probabilities[np.arange(len(texts)), best]
+
+    def reply(self, text, intent, confidence):
+        """``(reply, intent, escalate)``; low-confidence messages get the fallback."""
+        if not intent or confidence < self.threshold:
+            return self.fallback, '', False
+        if intent in self.escalation:
+            return ESCALATION_REPLY, intent, True
+        replies = self.responses.get(intent)
+        if not replies:
+            return self.fallback, intent, False
+        # Stable choice, so the same question gets the same answer.
+        return replies[zlib.crc32(text.encode()) % len(replies)], intent, False
+
+
+class BotCache:
+    """Least-recently-used compiled bots keyed by ``(id, updated_at)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chatbot):
+        key = (chatbot.pk, chatbot.updated_at)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+        compiled = CompiledBot(chatbot)
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+
+class LatencyTracker:
+    """Recent reply latencies per bot, in milliseconds."""
+
+    def __init__(self, window=2000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, chatbot_id, milliseconds):
+        with self._lock:
+            self._samples.setdefault(chatbot_id, deque(maxlen=self.window)).append(milliseconds)
+
+    def report(self, chatbot_id):
+        with self._lock:
+            samples = np.asarray(self._samples.get(chatbot_id, ()), dtype=float)
+        if not len(samples):
+            return {'samples': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {'samples': len(samples), 'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+
+class MicroBatcher:
+    """
+    Groups concurrent ``submit`` calls into batches for ``process``. The
+    first caller of a batch waits for it to fill (or for ``max_wait``),
+    processes it and hands every caller its result.
+    """
+
+    def __init__(self, process, max_size, max_wait):
+        self.process = process
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+        self._pending = []
+        self._leading = False
+
+    def submit(self, item):
+        future = Future()
+        with self._lock:
+            self._pending.append((item, future))
+            lead = not self._leading
+            self._leading = True
+            if len(self._pending) >= self.max_size:
+                self._full.set()
+        if lead:
+            self._full.wait(self.max_wait)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._leading = False
+                self._full.clear()
+            try:
+                results = self.process([item for item, _ in batch])
+            except Exception as exc:
+                for _, waiting in batch:
+                    waiting.set_exception(exc)
+            else:
+                for (_, waiting), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        waiting.set_exception(result)
+                    else:
+                        waiting.set_result(result)
+        return future.result()
+
+
+bots = BotCache(settings.CHATBOT_CACHE_SIZE)
+latency = LatencyTracker()
+
+
+def conflicting_sessions(chatbot, session_ids):
+    """Those of ``session_ids`` already used by another chatbot's conversations."""
+    return set(
+        ChatbotConversation.objects.filter(session_id__in=session_ids)
+        .exclude(chatbot=chatbot).values_list('session_id', flat=True)
+    )
+
+
+def _conversations(items):
+    """Conversations keyed by ``(chatbot_id, session_id)``; sessions owned by another bot are left out."""
+    sessions = {(item['chatbot_id'], item['session_id']): item for item in items}
+
+    def load(session_ids):
+        return {
+            (conversation.chatbot_id, conversation.session_id): conversation
+            for conversation in ChatbotConversation.objects.filter(session_id__in=session_ids)
+        }
+
+    existing = load({session_id for _, session_id in sessions})
+    taken = {session_id for _, session_id in existing}
+    missing = [
+        ChatbotConversation(
+            chatbot_id=chatbot_id, session_id=session_id, customer_id=item.get('customer_id'),
+            user_agent=item.get('user_agent', ''), ip_address=item.get('ip_address'),
+        )
+        for (chatbot_id, session_id), item in sessions.items() if session_id not in taken
+    ]
+    if missing:
+        ChatbotConversation.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update(load([conversation.session_id for conversation in missing]))
+    return existing
+
+
+def process_batch(items):
+    """
+    Answer a batch of messages. Each item holds ``chatbot_id``, ``session_id``,
+    ``text`` and ``received`` (``time.perf_counter()`` on arrival), plus
+    optional ``customer_id``, ``user_agent`` and ``ip_address``. The result
+    of an item whose session belongs to another bot is a ``SessionConflict``.
+    """
+    bot_ids = {item['chatbot_id'] for item in items}
+    chatbots = {chatbot.pk: chatbot for chatbot in Chatbot.objects.filter(pk__in=bot_ids)}
+    classified = [None] * len(items)
+    by_bot = {}
+    for position, item in enumerate(items):
+        by_bot.setdefault(item['chatbot_id'], []).append(position)
+    for chatbot_id, positions in by_bot.items():
+        compiled = bots.get(chatbots[chatbot_id])
+        intents, confidences = compiled.classify([items[position]['text'] for position in positions])
+        for position, intent, confidence in zip(positions, intents, confidences):
+            text = items[position]['text']
+            reply, intent, escalate = compiled.reply(text, intent, float(confidence))
+            classified[position] = (reply, intent, float(confidence), escalate, extract_entities(text))
+
+    results = []
+    with transaction.atomic():
+        conversations = _conversations(items)
+        messages, changed = [], {}
+        for item, (reply, intent, confidence, escalate, entities) in zip(items, classified):
+            conversation = conversations.get((item['chatbot_id'], item['session_id']))
+            if conversation is None:
+                results.append(SessionConflict(item['session_id']))
+                continue
+            score = Decimal(str(round(confidence, 4)))
+            messages.append(ChatbotMessage(
+                conversation=conversation, message_type='user', content=item['text'],
+                intent_detected=intent, confidence_score=score, entities=entities,
+            ))
+            elapsed = (time.perf_counter() - item['received']) * 1000
+            messages.append(ChatbotMessage(
+                conversation=conversation, message_type='escalation' if escalate else 'bot', content=reply,
+                metadata={'latency_ms': round(elapsed, 2)},
+            ))
+            metadata = conversation.metadata or {}
+            metadata['message_count'] = metadata.get('message_count', 0) + 1
+            metadata['last_intent'] = intent
+            conversation.metadata = metadata
+            if escalate:
+                conversation.status = 'escalated'
+                conversation.ended_at = conversation.ended_at or timezone.now()
+            changed[conversation.pk] = conversation
+            latency.record(item['chatbot_id'], elapsed)
+            results.append({
+                'session_id': item['session_id'], 'reply': reply, 'intent': intent,
+                'confidence': round(confidence, 4), 'entities': entities,
+                'escalated': escalate, 'latency_ms': round(elapsed, 2),
+            })
+        ChatbotMessage.objects.bulk_create(messages, batch_size=500)
+        ChatbotConversation.objects.bulk_update(list(changed.values()), ['metadata', 'status', 'ended_at'], batch_size=500)
+    bump_tags([model_tag(ChatbotMessage), model_tag(ChatbotConversation)])
+    return results
+
+
+batcher = MicroBatcher(process_batch, settings.CHATBOT_BATCH_SIZE, settings.CHATBOT_BATCH_WAIT)
+
+
+def handle_message(chatbot, session_id, text, **extra):
+    """Answer one message, batched with whatever else arrives at the same time."""
+    return batcher.submit({
+        'chatbot_id': chatbot.pk, 'session_id': session_id, 'text': text,
+        'received': time.perf_counter(), **extra,
+    })
+
+
+def handle_messages(chatbot, messages, **extra):
+    """Answer several messages as one batch; each is ``{"session_id", "text"}``."""
+    received = time.perf_counter()
+    results = process_batch([
+        {'chatbot_id': chatbot.pk, 'received': received, **extra, **message} for message in messages
+    ])
+    for result in results:
+        if isinstance(result, SessionConflict):
+            raise result
+    return results
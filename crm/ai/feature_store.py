@@ -0,0 +1,388 @@
+"""
+Customer feature store.
+
+Per-customer feature vectors are materialized once and shared by every
+batch job (scoring, training, recommendations) instead of each re-deriving
+them from interactions, tasks, tickets, opportunities, NPS, customer
+metrics and email sends.
+
+A snapshot is a directory under ``AI_FEATURE_STORE_DIR``:
+
+* ``ids.npy`` - customer ids as sorted fixed-width bytes, so lookups are a
+  vectorized ``searchsorted``;
+* ``features.npy`` - a float64 ``rows x FEATURES`` matrix;
+* ``manifest.json`` - feature names, row count and the refresh watermark.
+
+``CURRENT`` names the live snapshot and is swapped atomically, so readers
+always see a complete snapshot. Both arrays are opened with
+``mmap_mode='r'``: a reader maps the file and only the rows it slices are
+paged in.
+
+``refresh`` writes a new snapshot from the previous one: rows of customers
+with no change since the watermark are copied, changed and new customers
+are recomputed, deleted customers are dropped. A changed feature list
+forces a full build.
+
+A customer counts as changed when a source row's timestamp passed the
+watermark or when it is listed in ``FeatureStoreChange``. Saves and deletes
+of every source mark the customer there on commit (``connect_signals``), so
+deleted rows and edits to tables that only carry ``created_at`` are caught
+too; ``refresh`` clears the marks it consumed.
+
+Age features (``tenure_days``, ``days_since_interaction``) are stored as the
+epoch second they count from and turned into days when read, so they stay
+correct for rows that have not been refreshed.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from crm.analytics.models import CustomerMetrics
+from crm.core.models import Customer, Interaction, Task
+from crm.marketing.models import EmailSend
+from crm.sales.models import Opportunity
+from crm.support.models import SupportTicket
+from crm.support.sla import OPEN_STATUSES
+from crm.surveys.models import NPSScore
+
+from .models import FeatureStoreChange
+
+
+FEATURES = [
+    'tenure_days', 'is_active', 'interactions', 'days_since_interaction',
+    'tickets', 'open_tickets', 'opportunities', 'won_amount', 'nps_average', 'nps_responses',
+    'open_tasks', 'emails_sent', 'email_open_rate', 'email_click_rate',
+    'logins', 'satisfaction', 'revenue',
+]
+AGE_FEATURES = ('tenure_days', 'days_since_interaction')
+COLUMN = {name: position for position, name in enumerate(FEATURES)}
+NEVER = 3650  # Days reported when there is nothing to count from
+ID_DTYPE = 'S36'
+BATCH_SIZE = 2000
+OVERLAP = timedelta(seconds=5)
+
+# Tables whose changes alter a customer's features, with the timestamp columns
+# that move when they do.
+SOURCES = [
+    (Customer.objects, 'id', ['updated_at']),
+    (Interaction.objects, 'customer_id', ['created_at']),
+    (Task.objects, 'customer_id', ['updated_at']),
+    (SupportTicket.objects, 'customer_id', ['updated_at']),
+    (Opportunity.objects, 'customer_id', ['updated_at']),
+    (NPSScore.objects, 'customer_id', ['created_at']),
+    (CustomerMetrics.objects, 'customer_id', ['created_at']),
+    (EmailSend.objects, 'customer_id', ['sent_at', 'opened_at', 'clicked_at']),
+]
+
+
+def _epoch(moment):
+    return moment.timestamp() if moment else 0.0
+
+
+def compute_raw(customer_ids):
+    """Stored feature rows for ``customer_ids`` (in that order), ages as epoch seconds."""
+    index = {str(customer_id): row for row, customer_id in enumerate(customer_ids)}
+    matrix = np.zeros((len(customer_ids), len(FEATURES)))
+
+    def fill(rows, **columns):
+        for customer_id, *values in rows:
+            row = index[str(customer_id)]
+            for name, value in zip(columns, values):
+                matrix[row, COLUMN[name]] = columns[name](value)
+
+    def number(value):
+        return float(value or 0)
+
+    def grouped(queryset, **aggregates):
+        return (
+            queryset.filter(customer_id__in=customer_ids).values_list('customer_id')
+            .annotate(**aggregates).order_by()
+        )
+
+    fill(
+        Customer.objects.filter(pk__in=customer_ids).values_list('id', 'created_at', 'is_active'),
+        tenure_days=_epoch, is_active=number,
+    )
+    fill(
+        grouped(Interaction.objects, count=Count('id'), last=Max('date')),
+        interactions=number, days_since_interaction=_epoch,
+    )
+    fill(
+        grouped(SupportTicket.objects, count=Count('id'), open=Count('id', filter=Q(status__in=OPEN_STATUSES))),
+        tickets=number, open_tickets=number,
+    )
+    fill(
+        grouped(Opportunity.objects, count=Count('id'), won=Sum('amount', filter=Q(stage='closed_won'))),
+        opportunities=number, won_amount=number,
+    )
+    fill(
+        grouped(NPSScore.objects, average=Avg('score'), count=Count('id')),
+        nps_average=number, nps_responses=number,
+    )
+    fill(
+        grouped(Task.objects, open=Count('id', filter=~Q(status__in=['completed', 'cancelled']))),
+        open_tasks=number,
+    )
+    fill(
+        grouped(
+            EmailSend.objects, sent=Count('id'),
+            opened=Count('id', filter=Q(opened_at__isnull=False)),
+            clicked=Count('id', filter=Q(clicked_at__isnull=False)),
+        ),
+        emails_sent=number, email_open_rate=number, email_click_rate=number,
+    )
+    sent = matrix[:, COLUMN['emails_sent']]
+    for name in ('email_open_rate', 'email_click_rate'):
+        column = matrix[:, COLUMN[name]]
+        matrix[:, COLUMN[name]] = np.divide(column, sent, out=np.zeros_like(column), where=sent > 0)
+    fill(
+        grouped(
+            CustomerMetrics.objects, logins=Sum('login_frequency'),
+            satisfaction=Avg('satisfaction_score'), revenue=Sum('revenue'),
+        ),
+        logins=number, satisfaction=number, revenue=number,
+    )
+    return matrix
+
+
+def to_features(raw, columns=None, now=None):
+    """Model-ready copy of stored rows: ages become days before ``now``; optionally only ``columns``."""
+    now = (now or timezone.now()).timestamp()
+    features = np.array(raw, dtype=float)
+    for name in AGE_FEATURES:
+        moments = features[:, COLUMN[name]]
+        features[:, COLUMN[name]] = np.where(moments > 0, (now - moments) / 86400, NEVER)
+    return features if columns is None else features[:, columns]
+
+
+def customer_features(customer_ids, now=None):
+    """Feature matrix computed live from the database."""
+    return to_features(compute_raw(list(customer_ids)), now=now)
+
+
+class Snapshot:
+    """One materialized snapshot, memory-mapped read-only."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as handle:
+            self.manifest = json.load(handle)
+        self.features = self.manifest['features']
+        self.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        self.matrix = np.load(os.path.join(path, 'features.npy'), mmap_mode='r')
+
+    @property
+    def watermark(self):
+        return datetime.fromisoformat(self.manifest['watermark'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locate(self, customer_ids):
+        """Row of each id in the snapshot, -1 where it is missing."""
+        if isinstance(customer_ids, np.ndarray) and customer_ids.dtype.kind == 'S':
+            wanted = customer_ids
+        else:
+            wanted = np.asarray([str(customer_id) for customer_id in customer_ids], dtype=ID_DTYPE)
+        if not len(self.ids) or not len(wanted):
+            return np.full(len(wanted), -1)
+        rows = np.minimum(np.searchsorted(self.ids, wanted), len(self.ids) - 1)
+        return np.where(self.ids[rows] == wanted, rows, -1)
+
+    def rows(self, customer_ids, columns=None, now=None):
+        """Features for ``customer_ids``, computing any the snapshot lacks from the database."""
+        customer_ids = list(customer_ids)
+        rows = self.locate(customer_ids)
+        raw = np.empty((len(customer_ids), self.matrix.shape[1]))
+        found = rows >= 0
+        raw[found] = self.matrix[rows[found]]
+        if not found.all():
+            missing = [customer_id for customer_id, hit in zip(customer_ids, found) if not hit]
+            raw[~found] = compute_raw(missing)
+        return to_features(raw, columns, now)
+
+    def batches(self, size, columns=None, now=None):
+        """``(ids, features)`` over the whole snapshot, slicing the mapped files ``size`` rows at a time."""
+        for start in range(0, len(self.ids), size):
+            ids = [value.decode() for value in self.ids[start:start + size]]
+            yield ids, to_features(self.matrix[start:start + size], columns, now)
+
+
+def store_dir():
+    return settings.AI_FEATURE_STORE_DIR
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def current():
+    """The live snapshot, or None before the first build or after a feature change."""
+    try:
+        with open(os.path.join(store_dir(), 'CURRENT')) as handle:
+            name = handle.read().strip()
+    except FileNotFoundError:
+        return None
+    with _snapshots_lock:
+        snapshot = _snapshots.get(name)
+        if snapshot is None:
+            try:
+                snapshot = Snapshot(os.path.join(store_dir(), name))
+            except FileNotFoundError:
+                return None
+            _snapshots.clear()
+            _snapshots[name] = snapshot
+    return snapshot if snapshot.features == FEATURES else None
+
+
+def _customer(instance):
+    # Read from __dict__ so a deferred customer_id is not fetched.
+    return instance.__dict__.get('id' if isinstance(instance, Customer) else 'customer_id')
+
+
+def mark_changed(customer_ids):
+    """Record customers whose stored features are out of date."""
+    rows = [FeatureStoreChange(customer_id=customer_id) for customer_id in set(customer_ids) if customer_id]
+    if rows:
+        FeatureStoreChange.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['customer_id'], update_fields=['marked_at'],
+        )
+
+
+def remember_customer(instance, **kwargs):
+    instance._feature_customer = _customer(instance)
+
+
+def track_save(sender, instance, **kwargs):
+    # Both the old and the new customer when a row is reassigned.
+    customer_ids = [getattr(instance, '_feature_customer', None), _customer(instance)]
+    transaction.on_commit(lambda: mark_changed(customer_ids))
+    remember_customer(instance)
+
+
+def track_delete(sender, instance, **kwargs):
+    customer_ids = [_customer(instance)]
+    transaction.on_commit(lambda: mark_changed(customer_ids))
+
+
+def changed_since(moment, until=None):
+    """Ids of customers whose features may differ since ``moment`` (marks up to ``until`` included)."""
+    marks = FeatureStoreChange.objects.all()
+    if until is not None:
+        marks = marks.filter(marked_at__lte=until)
+    changed = {str(value) for value in marks.values_list('customer_id', flat=True).iterator()}
+    for manager, column, timestamps in SOURCES:
+        condition = Q()
+        for field in timestamps:
+            condition |= Q(**{f'{field}__gt': moment})
+        rows = manager.filter(condition).exclude(**{f'{column}__isnull': True}).values_list(column, flat=True).distinct()
+        changed.update(str(value) for value in rows.iterator())
+    return changed
+
+
+def _write(ids, fill, full, refreshed, watermark):
+    from numpy.lib.format import open_memmap
+
+    os.makedirs(store_dir(), exist_ok=True)
+    name = f'v{int(time.time() * 1000):015d}'
+    path = os.path.join(store_dir(), name)
+    partial = f'{path}.part'
+    os.makedirs(partial)
+    np.save(os.path.join(partial, 'ids.npy'), ids)
+    matrix = open_memmap(os.path.join(partial, 'features.npy'), mode='w+', dtype=np.float64,
+                         shape=(len(ids), len(FEATURES)))
+    fill(matrix)
+    matrix.flush()
+    del matrix
+    manifest = {
+        'version': name, 'features': FEATURES, 'rows': len(ids), 'full': full, 'refreshed': refreshed,
+        'watermark': watermark.isoformat(), 'built_at': timezone.now().isoformat(),
+    }
+    with open(os.path.join(partial, 'manifest.json'), 'w') as handle:
+        json.dump(manifest, handle)
+    os.replace(partial, path)
+    pointer = os.path.join(store_dir(), 'CURRENT.part')
+    with open(pointer, 'w') as handle:
+        handle.write(name)
+    os.replace(pointer, os.path.join(store_dir(), 'CURRENT'))
+    _prune(keep=settings.AI_FEATURE_STORE_KEEP, current=name)
+    return manifest
+
+
+def _prune(keep, current):
+    # Open memory maps keep working after their files are unlinked.
+    names = sorted(
+        entry for entry in os.listdir(store_dir())
+        if entry.startswith('v') and not entry.endswith('.part') and entry != current
+    )
+    for name in names[:max(len(names) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(store_dir(), name), ignore_errors=True)
+
+
+def _all_ids():
+    ids = np.fromiter(
+        (str(value) for value in Customer.objects.values_list('id', flat=True).iterator(chunk_size=10000)),
+        dtype=ID_DTYPE,
+    )
+    ids.sort()
+    return ids
+
+
+def _recompute(matrix, ids, positions):
+    for start in range(0, len(positions), BATCH_SIZE):
+        batch = positions[start:start + BATCH_SIZE]
+        matrix[batch] = compute_raw([ids[position].decode() for position in batch])
+
+
+def build():
+    """Materialize every customer's features into a new snapshot; returns its manifest."""
+    watermark = timezone.now()
+    ids = _all_ids()
+    manifest = _write(ids, lambda matrix: _recompute(matrix, ids, np.arange(len(ids))),
+                      full=True, refreshed=len(ids), watermark=watermark)
+    FeatureStoreChange.objects.filter(marked_at__lte=watermark).delete()
+    return manifest
+
+
+def refresh(full=False):
+    """Bring the store up to date, rebuilding only changed customers when possible."""
+    previous = None if full else current()
+    if previous is None:
+        return build()
+    watermark = timezone.now()
+    ids = _all_ids()
+    changed = np.fromiter(changed_since(previous.watermark - OVERLAP, until=watermark), dtype=ID_DTYPE)
+    changed.sort()
+    old_rows = previous.locate(ids)
+    stale = (old_rows < 0) | np.isin(ids, changed)
+
+    def fill(matrix):
+        kept = np.flatnonzero(~stale)
+        for start in range(0, len(kept), BATCH_SIZE * 10):
+            batch = kept[start:start + BATCH_SIZE * 10]
+            matrix[batch] = previous.matrix[old_rows[batch]]
+        _recompute(matrix, ids, np.flatnonzero(stale))
+
+    manifest = _write(ids, fill, full=False, refreshed=int(stale.sum()), watermark=watermark)
+    # Marks made after the watermark survive for the next refresh.
+    FeatureStoreChange.objects.filter(marked_at__lte=watermark).delete()
+    return manifest
+
+
+def connect_signals():
+    for manager, _column, _timestamps in SOURCES:
+        model = manager.model
+        uid = f'crm.ai.features.{model._meta.label_lower}'
+        post_init.connect(remember_customer, sender=model, dispatch_uid=uid)
+        post_save.connect(track_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(track_delete, sender=model, dispatch_uid=uid)
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from crm.ai.transcripts import abandon_idle, compact
+
+
+class Command(BaseCommand):
+    help = 'Fold the messages of ended chatbot conversations into compressed transcripts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=1, help='Only conversations that ended at least this many days ago')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--abandon-after', type=float, default=24,
+                            help='First mark active conversations idle for this many hours as abandoned (0 to skip)')
+
+    def handle(self, *args, **options):
+        if options['abandon_after'] > 0:
+            abandoned = abandon_idle(timedelta(hours=options['abandon_after']))
+            self.stdout.write(f'Marked {abandoned} idle conversation(s) abandoned')
+        conversations, messages = compact(timedelta(days=options['days']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {messages} message(s) from {conversations} conversation(s)'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.ai.recommendations import generate
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top recommendations of every active customer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, help='Recommendations per customer')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = generate(k=options['top'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} recommendation(s)'))
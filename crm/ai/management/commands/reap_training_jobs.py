@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from crm.ai.training import reap_stale
+
+
+class Command(BaseCommand):
+    help = 'Fail training jobs whose worker stopped reporting progress, so their models can be trained again'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Reaped {reap_stale()} stale training job(s)'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.ai.feature_store import refresh
+
+
+class Command(BaseCommand):
+    help = 'Update the customer feature store, recomputing only customers changed since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every customer')
+
+    def handle(self, *args, **options):
+        manifest = refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {manifest['version']}: {manifest['rows']} customer(s), {manifest['refreshed']} recomputed"
+        ))
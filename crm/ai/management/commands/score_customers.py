@@ -0,0 +1,25 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.ai.models import AIModel
+from crm.ai.scoring import ScoringError, score_customers
+
+
+class Command(BaseCommand):
+    help = 'Score active customers with an AI model and store the predictive scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='AIModel id')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, help='Worker processes (default: AI_SCORING_WORKERS, 0 = inline)')
+
+    def handle(self, *args, **options):
+        try:
+            model = AIModel.objects.get(pk=options['model'])
+        except (AIModel.DoesNotExist, ValidationError):
+            raise CommandError(f"Unknown model {options['model']}")
+        try:
+            scored = score_customers(model, batch_size=options['batch_size'], workers=options['workers'])
+        except ScoringError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Scored {scored} customer(s) with {model}'))
@@ -0,0 +1,110 @@
+"""
+Process-local cache of loaded model artifacts.
+
+Artifacts are joblib files holding either a fitted estimator or a dict with
+``estimator`` and ``features`` (the column order the estimator was fitted
+on). Each process loads an artifact once and keeps the most recently used
+ones, keyed by path and modification time so a retrained file is picked up
+on the next call.
+
+This module imports no Django code so process-pool workers can use it
+whatever their start method.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class Artifact:
+    __slots__ = ('estimator', 'features')
+
+    def __init__(self, estimator, features=None):
+        self.estimator = estimator
+        self.features = list(features) if features is not None else None
+
+
+class ModelCache:
+    """Least-recently-used map of ``(path, mtime)`` to loaded ``Artifact``."""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def stamp(path):
+        return path, os.path.getmtime(path)
+
+    def get(self, path, stamp=None):
+        key = stamp or self.stamp(path)
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is not None:
+                self._entries.move_to_end(key)
+                return artifact
+        artifact = load(path)
+        with self._lock:
+            self._entries[key] = artifact
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return artifact
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def load(path):
+    import joblib
+
+    payload = joblib.load(path)
+    if isinstance(payload, dict):
+        return Artifact(payload['estimator'], payload.get('features'))
+    return Artifact(payload)
+
+
+# Sized from settings.AI_MODEL_CACHE_SIZE by crm.ai.scoring.
+models = ModelCache()
+
+
+def probabilities(estimator, matrix):
+    """Scores in ``[0, 100]``: positive-class probability, or a regressor's clipped prediction."""
+    if hasattr(estimator, 'predict_proba'):
+        return estimator.predict_proba(matrix)[:, -1] * 100
+    return np.clip(np.asarray(estimator.predict(matrix), dtype=float), 0, 100)
+
+
+def contributions(estimator, matrix, top=3):
+    """
+    Indices and weights of each row's strongest features: ``coef * (x - mean)``
+    for linear models, global importances otherwise, ``None`` if neither exists.
+    """
+    if hasattr(estimator, 'steps'):
+        # Pipelines: explain the final estimator on the transformed features.
+        for _, step in estimator.steps[:-1]:
+            matrix = step.transform(matrix)
+        estimator = estimator.steps[-1][1]
+    coef = getattr(estimator, 'coef_', None)
+    if coef is not None:
+        weights = (matrix - matrix.mean(axis=0)) * np.ravel(np.asarray(coef)[-1])
+    else:
+        importances = getattr(estimator, 'feature_importances_', None)
+        if importances is None:
+            return None, None
+        weights = np.broadcast_to(np.asarray(importances, dtype=float), matrix.shape)
+    top = min(top, matrix.shape[1])
+    indices = np.argsort(-np.abs(weights), axis=1)[:, :top]
+    return indices, np.take_along_axis(weights, indices, axis=1)
+
+
+def predict(stamp, matrix, top=3):
+    """Score one batch with the cached artifact at ``stamp``; safe to run in a worker process."""
+    estimator = models.get(stamp[0], stamp).estimator
+    scores = probabilities(estimator, matrix)
+    # Distance from the 50-point decision boundary, as a percentage.
+    confidence = np.abs(scores - 50) * 2
+    indices, weights = contributions(estimator, matrix, top)
+    return scores, confidence, indices, weights
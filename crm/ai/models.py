@@ -77,6 +77,9 @@ class PredictiveScore(models.Model):
     class Meta:
         ordering = ['-calculated_at']
         unique_together = ['customer', 'score_type']
+        indexes = [
+            models.Index(fields=['customer', 'expires_at'], name='ai_score_customer_expiry_idx'),
+        ]
     
     def __str__(self):
         return f"{self.customer.name} - {self.get_score_type_display()}: {self.score_value}"
@@ -141,6 +144,8 @@ class ChatbotConversation(models.Model):
     user_agent = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     metadata = models.JSONField(default=dict)  # Additional conversation metadata
+    transcript = models.BinaryField(null=True, blank=True, editable=False)  # Compressed messages, see ai.transcripts
+    compacted_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-started_at']
@@ -148,6 +153,11 @@ class ChatbotConversation(models.Model):
     def __str__(self):
         return f"{self.chatbot.name} - {self.session_id}"
 
+    def save(self, *args, **kwargs):
+        if self.status != 'active' and not self.ended_at:
+            self.ended_at = timezone.now()
+        super().save(*args, **kwargs)
+
 class ChatbotMessage(models.Model):
     """Individual messages in chatbot conversations"""
     MESSAGE_TYPES = [
@@ -246,6 +256,9 @@ class AIRecommendation(models.Model):
     
     class Meta:
         ordering = ['-confidence_score', '-created_at']
+        indexes = [
+            models.Index(fields=['customer', '-confidence_score'], name='ai_rec_customer_score_idx'),
+        ]
     
     def __str__(self):
         return f"{self.customer.name} - {self.get_recommendation_type_display()}: {self.title}"
@@ -281,6 +294,38 @@ class AITrainingData(models.Model):
     def __str__(self):
         return f"{self.name} - {self.get_data_type_display()}"
 
+class AITrainingJob(models.Model):
+    """Background training run of an AI model"""
+    JOB_STATUS = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ai_model = models.ForeignKey(AIModel, on_delete=models.CASCADE, related_name='training_jobs')
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='queued')
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    progress = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # Percent complete
+    cancel_requested = models.BooleanField(default=False)
+    message = models.TextField(blank=True)
+    metrics = models.JSONField(default=dict)
+    artifact_path = models.CharField(max_length=500, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ai_training_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Last progress report of a running job
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.ai_model.name} training - {self.get_status_display()}"
+
 class AIModelPerformance(models.Model):
     """AI model performance tracking"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -303,3 +348,11 @@ class AIModelPerformance(models.Model):
     
     def __str__(self):
         return f"{self.ai_model.name} Performance - {self.date}"
+
+class FeatureStoreChange(models.Model):
+    """Customer whose stored features are out of date; cleared by the next feature store refresh"""
+    customer_id = models.UUIDField(primary_key=True)
+    marked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.customer_id} changed at {self.marked_at}"
@@ -0,0 +1,233 @@
+"""
+Personalization rule evaluation.
+
+Active ``PersonalizationRule`` rows are compiled once into Python predicates
+and kept in memory sorted by ``priority`` (lowest first, as the model orders
+them). The compiled set is rebuilt when the rule table's version moves or
+after ``PERSONALIZATION_RULES_TTL`` seconds, whichever comes first, so
+evaluating a context is a walk over prepared closures. The version lives in
+the shared cache and so follows saves made by any process; the TTL bounds
+how long writes that skip signals (``QuerySet.update``, raw SQL) go unseen.
+
+``target_audience`` and ``trigger_conditions`` share one condition grammar,
+evaluated against a flat context dict::
+
+    {"status": "customer"}                       equality
+    {"industry": ["Technology", "Finance"]}      membership
+    {"churn_risk": {"gte": 70, "lt": 90}}        operators: eq ne gt gte lt lte in
+                                                 not_in contains startswith exists between
+    {"any": [...]} / {"all": [...]} / {"not": {...}}
+
+A context is the customer's attributes, its feature-store features, its
+current predictive scores and whatever the caller adds (page, event, ...).
+The first matching rule of each ``rule_type`` wins and contributes its
+``personalization_logic``.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from crm.core.cache import get_tag_versions, model_tag
+from crm.core.models import Customer
+
+from . import feature_store
+from .models import PersonalizationRule, PredictiveScore
+
+
+class RuleError(ValueError):
+    """A rule's conditions do not follow the condition grammar."""
+
+
+def _between(value, bounds):
+    low, high = bounds
+    return low <= value <= high
+
+
+OPERATORS = {
+    'eq': lambda value, expected: value == expected,
+    'ne': lambda value, expected: value != expected,
+    'gt': lambda value, expected: value is not None and value > expected,
+    'gte': lambda value, expected: value is not None and value >= expected,
+    'lt': lambda value, expected: value is not None and value < expected,
+    'lte': lambda value, expected: value is not None and value <= expected,
+    'in': lambda value, expected: value in expected,
+    'not_in': lambda value, expected: value not in expected,
+    'contains': lambda value, expected: value is not None and expected in value,
+    'startswith': lambda value, expected: isinstance(value, str) and value.startswith(expected),
+    'exists': lambda value, expected: (value is not None) == bool(expected),
+    'between': lambda value, expected: value is not None and _between(value, expected),
+}
+MISSING = object()
+
+
+def _field(name, expected):
+    if isinstance(expected, dict):
+        unknown = set(expected) - set(OPERATORS)
+        if unknown:
+            raise RuleError(f'Unknown operator(s) for {name}: {", ".join(sorted(unknown))}')
+        if 'between' in expected and not (isinstance(expected['between'], list) and len(expected['between']) == 2):
+            raise RuleError(f'between for {name} needs [low, high]')
+        try:
+            checks = [
+                (OPERATORS[operator], frozenset(value) if operator in ('in', 'not_in') and isinstance(value, list) else value)
+                for operator, value in expected.items()
+            ]
+        except TypeError:
+            raise RuleError(f'Values for {name} must be plain values')
+
+        def test(context):
+            value = context.get(name)
+            try:
+                return all(check(value, argument) for check, argument in checks)
+            except TypeError:
+                return False
+        return test
+    if isinstance(expected, list):
+        try:
+            allowed = frozenset(expected)
+        except TypeError:
+            raise RuleError(f'Values for {name} must be plain values')
+
+        def member(context):
+            try:
+                return context.get(name, MISSING) in allowed
+            except TypeError:
+                return False
+        return member
+    return lambda context: context.get(name, MISSING) == expected
+
+
+def compile_conditions(conditions):
+    """A predicate over a context dict; an empty condition always matches."""
+    if not conditions:
+        return lambda context: True
+    if not isinstance(conditions, dict):
+        raise RuleError('Conditions must be an object')
+    tests = []
+    for key, expected in conditions.items():
+        if key in ('any', 'all'):
+            if not isinstance(expected, list):
+                raise RuleError(f'{key} needs a list of conditions')
+            parts = [compile_conditions(part) for part in expected]
+            tests.append(
+                (lambda context, parts=parts: any(part(context) for part in parts)) if key == 'any'
+                else (lambda context, parts=parts: all(part(context) for part in parts))
+            )
+        elif key == 'not':
+            part = compile_conditions(expected)
+            tests.append(lambda context, part=part: not part(context))
+        else:
+            tests.append(_field(key, expected))
+    if len(tests) == 1:
+        return tests[0]
+    return lambda context: all(test(context) for test in tests)
+
+
+class CompiledRule:
+    __slots__ = ('id', 'name', 'rule_type', 'priority', 'logic', 'matches')
+
+    def __init__(self, rule):
+        self.id = str(rule.pk)
+        self.name = rule.name
+        self.rule_type = rule.rule_type
+        self.priority = rule.priority
+        self.logic = rule.personalization_logic
+        audience = compile_conditions(rule.target_audience)
+        trigger = compile_conditions(rule.trigger_conditions)
+        self.matches = lambda context: audience(context) and trigger(context)
+
+    def as_dict(self):
+        return {'rule': self.id, 'name': self.name, 'rule_type': self.rule_type,
+                'priority': self.priority, 'personalization': self.logic}
+
+
+def validate_rule(target_audience, trigger_conditions):
+    """Raise ``RuleError`` if either condition cannot be compiled."""
+    compile_conditions(target_audience)
+    compile_conditions(trigger_conditions)
+
+
+_rules = {'version': None, 'compiled_at': 0.0, 'rules': [], 'skipped': []}
+_rules_lock = threading.Lock()
+
+
+def active_rules():
+    """Compiled active rules in priority order, recompiled when a rule row changes or the TTL runs out."""
+    tag = model_tag(PersonalizationRule)
+    version = get_tag_versions([tag])[tag]
+    with _rules_lock:
+        expired = time.monotonic() - _rules['compiled_at'] >= settings.PERSONALIZATION_RULES_TTL
+        if _rules['version'] != version or expired:
+            rules, skipped = [], []
+            for rule in PersonalizationRule.objects.filter(is_active=True).order_by('priority', '-created_at'):
+                try:
+                    rules.append(CompiledRule(rule))
+                except RuleError:
+                    skipped.append(str(rule.pk))
+            _rules.update(version=version, compiled_at=time.monotonic(), rules=rules, skipped=skipped)
+        return _rules['rules']
+
+
+def evaluate(context, rules=None):
+    """The winning rule of each rule type for ``context``, in priority order."""
+    matched, seen = [], set()
+    for rule in active_rules() if rules is None else rules:
+        if rule.rule_type not in seen and rule.matches(context):
+            seen.add(rule.rule_type)
+            matched.append(rule)
+    return matched
+
+
+CUSTOMER_FIELDS = ('status', 'source', 'position', 'is_active', 'company_id')
+
+
+def customer_contexts(customer_ids):
+    """Context dicts keyed by customer id: attributes, features and current scores."""
+    contexts = {
+        str(row.pop('id')): row
+        for row in Customer.objects.filter(pk__in=customer_ids).values(
+            'id', *CUSTOMER_FIELDS, industry=F('company__industry'), company_size=F('company__size'),
+        )
+    }
+    for context in contexts.values():
+        context['company_id'] = str(context['company_id'])
+    snapshot = feature_store.current()
+    if snapshot is not None and contexts:
+        ids = list(contexts)
+        found = snapshot.locate(ids) >= 0
+        present = [customer_id for customer_id, hit in zip(ids, found) if hit]
+        if present:
+            for customer_id, features in zip(present, snapshot.rows(present)):
+                contexts[customer_id].update(zip(feature_store.FEATURES, features.tolist()))
+    for customer_id, score_type, value in PredictiveScore.objects.filter(
+        Q(expires_at__gt=timezone.now()) | Q(expires_at__isnull=True), customer_id__in=customer_ids,
+    ).values_list('customer_id', 'score_type', 'score_value'):
+        contexts[str(customer_id)][score_type] = float(value)
+    return contexts
+
+
+def personalize(customer_id=None, context=None):
+    """``(matches, microseconds spent evaluating)`` for one customer and/or request context."""
+    merged = {}
+    if customer_id is not None:
+        merged.update(customer_contexts([customer_id]).get(str(customer_id), {}))
+    merged.update(context or {})
+    rules = active_rules()
+    started = time.perf_counter()
+    matches = evaluate(merged, rules)
+    return [rule.as_dict() for rule in matches], (time.perf_counter() - started) * 1e6
+
+
+def evaluate_audience(customer_ids, context=None, batch_size=2000):
+    """Winning rules for many customers; returns ``{customer id: [rule ids]}``."""
+    rules = active_rules()
+    assignments = {}
+    customer_ids = list(customer_ids)
+    for start in range(0, len(customer_ids), batch_size):
+        for customer_id, customer_context in customer_contexts(customer_ids[start:start + batch_size]).items():
+            customer_context.update(context or {})
+            assignments[customer_id] = [rule.id for rule in evaluate(customer_context, rules)]
+    return assignments
@@ -0,0 +1,271 @@
+"""
+Recommendation engine.
+
+There is no product catalogue, so a product is an opportunity title (deals
+copy their opportunity's title). Every customer becomes a sparse row over
+products and context columns:
+
+* won opportunities and deals weigh 1, open opportunities 0.5;
+* interactions add ``log1p(count)`` per interaction type;
+* product feedback adds its rating (scaled to 0..1) per feedback type.
+
+Two similarities are combined. Item-item: the cosine similarity of product
+columns across customers, so a customer's products point at products bought
+alongside them. Customer-customer: the cosine similarity of rows, whose
+``AI_RECOMMENDATION_NEIGHBOURS`` nearest neighbours vote with their
+products. Context columns held by more than
+``AI_RECOMMENDATION_CONTEXT_MAX_SHARE`` of customers are left out of it:
+they match almost everyone, and would make every batch's similarity block
+dense. Products a customer already has or is negotiating are never
+recommended.
+
+``generate`` runs in batches of customers and replaces each customer's
+undelivered engine recommendations with the top ``k``. The rows, indexed by
+``(customer, -confidence_score)``, are the precomputed index that
+``top_for_customer`` reads. Requests queue it with ``start``; it runs on
+the same background backend as training.
+"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from scipy import sparse
+
+from crm.analytics.models import ProductFeedback
+from crm.core.cache import bump_tags, model_tag
+from crm.core.models import Customer, Interaction
+from crm.sales.models import Opportunity
+
+from .models import AIModel, AIRecommendation
+
+
+SOURCE = 'engine'
+WON_WEIGHT = 1.0
+OPEN_WEIGHT = 0.5
+OPEN_STAGES = ('prospecting', 'qualification', 'needs_analysis', 'proposal', 'negotiation')
+RUNNING_KEY = 'crm:ai:recommendations:running'
+
+
+class AlreadyGenerating(Exception):
+    """A recommendation run is already queued or running."""
+
+
+class Matrix:
+    """Customer rows over product columns followed by context columns."""
+
+    def __init__(self, customers, products, context, values):
+        self.customers = customers
+        self.products = products
+        self.context = context
+        self.position = {customer_id: row for row, customer_id in enumerate(customers)}
+        self.values = values
+
+    @property
+    def owned(self):
+        return self.values[:, :len(self.products)]
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def load_matrix():
+    customers = list(Customer.objects.filter(is_active=True).order_by('pk').values_list('id', flat=True))
+    position = {customer_id: row for row, customer_id in enumerate(customers)}
+    cells = {}
+
+    products = {}
+    for customer_id, title, stage in Opportunity.objects.filter(
+        Q(stage='closed_won') | Q(stage__in=OPEN_STAGES) | Q(deal__isnull=False),
+    ).values_list('customer_id', 'title', 'stage').iterator():
+        row = position.get(customer_id)
+        name = title.strip()
+        if row is None or not name:
+            continue
+        column = products.setdefault(name.lower(), (len(products), name))[0]
+        weight = OPEN_WEIGHT if stage in OPEN_STAGES else WON_WEIGHT
+        cells[row, column] = max(cells.get((row, column), 0), weight)
+
+    context = {}
+
+    def add(key, row, value):
+        column = len(products) + context.setdefault(key, len(context))
+        cells[row, column] = cells.get((row, column), 0) + value
+
+    for customer_id, kind, count in Interaction.objects.values('customer_id', 'type').annotate(
+        count=Count('id'),
+    ).values_list('customer_id', 'type', 'count'):
+        if customer_id in position:
+            add(f'interaction:{kind}', position[customer_id], float(np.log1p(count)))
+    for customer_id, kind, rating in ProductFeedback.objects.values_list('customer_id', 'type', 'rating').iterator():
+        if customer_id in position:
+            add(f'feedback:{kind}', position[customer_id], (rating or 3) / 5)
+
+    rows, columns = zip(*cells) if cells else ((), ())
+    values = sparse.csr_matrix(
+        (np.fromiter(cells.values(), dtype=np.float32, count=len(cells)), (rows, columns)),
+        shape=(len(customers), len(products) + len(context)),
+    )
+    names = [name for _, name in sorted(products.values())]
+    return Matrix(customers, names, sorted(context, key=context.get), values)
+
+
+def item_similarity(matrix):
+    """Product × product cosine similarity, without self-similarity."""
+    columns = _normalize_rows(matrix.owned.T.tocsr())
+    similarity = (columns @ columns.T).tolil()
+    similarity.setdiag(0)
+    return similarity.tocsr()
+
+
+def neighbour_values(matrix, max_share):
+    """Rows compared for neighbours: products plus context columns held by at most ``max_share`` of customers."""
+    held = np.asarray((matrix.values[:, len(matrix.products):] > 0).sum(axis=0)).ravel()
+    narrow = np.flatnonzero(held <= max_share * len(matrix.customers))
+    return matrix.values[:, np.concatenate([np.arange(len(matrix.products)), len(matrix.products) + narrow])]
+
+
+def _top_neighbours(similarity, k):
+    """Keep the ``k`` largest entries of every row of a sparse matrix."""
+    similarity = similarity.tocsr()
+    keep = np.zeros(similarity.nnz, dtype=bool)
+    for row in range(similarity.shape[0]):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        if end - start <= k:
+            keep[start:end] = True
+        else:
+            keep[start + np.argpartition(-similarity.data[start:end], k)[:k]] = True
+    similarity.data[~keep] = 0
+    similarity.eliminate_zeros()
+    return similarity
+
+
+def _scale(scores):
+    peak = scores.max(axis=1, keepdims=True)
+    peak[peak == 0] = 1
+    return scores / peak
+
+
+def score_batch(matrix, normalized, items, rows, neighbours):
+    """``(scores, item scores, neighbour scores)`` for product columns of ``rows``."""
+    owned = matrix.owned[rows]
+    by_item = np.asarray((owned @ items).todense())
+    similarity = normalized[rows] @ normalized.T
+    similarity = similarity.tolil()
+    for offset, row in enumerate(rows):
+        similarity[offset, row] = 0
+    similarity = _top_neighbours(similarity, neighbours)
+    by_neighbour = np.asarray((similarity @ matrix.owned).todense())
+    scores = 0.5 * _scale(by_item) + 0.5 * _scale(by_neighbour)
+    scores[owned.toarray() > 0] = 0
+    return scores, by_item, by_neighbour
+
+
+def top_k(scores, k):
+    """Column indices of the ``k`` best positive scores of every row, best first."""
+    k = min(k, scores.shape[1])
+    if not k:
+        return [[] for _ in range(len(scores))]
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, best, axis=1).argsort(axis=1)[:, ::-1]
+    best = np.take_along_axis(best, order, axis=1)
+    return [[column for column in row if scores[index, column] > 0] for index, row in enumerate(best)]
+
+
+def recommendation_model():
+    return AIModel.objects.filter(model_type='recommendation_engine', status='active').order_by('-updated_at').first()
+
+
+def generate(customer_ids=None, k=None, batch_size=500):
+    """Recompute engine recommendations; returns how many rows were written."""
+    ai_model = recommendation_model()
+    config = ai_model.model_config if ai_model else {}
+    k = k or config.get('top_k', settings.AI_RECOMMENDATIONS_PER_CUSTOMER)
+    neighbours = config.get('neighbours', settings.AI_RECOMMENDATION_NEIGHBOURS)
+    expires_at = timezone.now() + timedelta(hours=settings.AI_RECOMMENDATION_TTL_HOURS)
+
+    matrix = load_matrix()
+    if not matrix.products:
+        return 0
+    items = item_similarity(matrix)
+    normalized = _normalize_rows(neighbour_values(matrix, settings.AI_RECOMMENDATION_CONTEXT_MAX_SHARE)).tocsr()
+    wanted = matrix.customers if customer_ids is None else [
+        customer_id for customer_id in customer_ids if customer_id in matrix.position
+    ]
+
+    written = 0
+    for start in range(0, len(wanted), batch_size):
+        batch = wanted[start:start + batch_size]
+        rows = [matrix.position[customer_id] for customer_id in batch]
+        scores, by_item, by_neighbour = score_batch(matrix, normalized, items, rows, neighbours)
+        has_products = np.asarray(matrix.owned[rows].getnnz(axis=1)) > 0
+        recommendations = []
+        for index, (customer_id, columns) in enumerate(zip(batch, top_k(scores, k))):
+            for column in columns:
+                product = matrix.products[column]
+                recommendations.append(AIRecommendation(
+                    customer_id=customer_id, ai_model=ai_model,
+                    recommendation_type='cross_sell' if has_products[index] else 'product',
+                    title=f'Offer {product}',
+                    description=f'Customers with a similar history have {product}.',
+                    recommendation_data={
+                        'source': SOURCE, 'product': product,
+                        'item_score': round(float(by_item[index, column]), 4),
+                        'neighbour_score': round(float(by_neighbour[index, column]), 4),
+                    },
+                    confidence_score=Decimal(str(round(float(scores[index, column]), 4))),
+                    expires_at=expires_at,
+                ))
+        with transaction.atomic():
+            AIRecommendation.objects.filter(
+                customer_id__in=batch, is_delivered=False, recommendation_data__source=SOURCE,
+            ).delete()
+            AIRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+        written += len(recommendations)
+    bump_tags([model_tag(AIRecommendation)])
+    return written
+
+
+def start(customer_ids=None):
+    """Queue ``generate`` once the current transaction commits; one run at a time."""
+    customer_ids = None if customer_ids is None else [str(customer_id) for customer_id in customer_ids]
+    # Expires on its own should a worker die mid-run.
+    if not cache.add(RUNNING_KEY, True, timeout=settings.AI_RECOMMENDATION_TIMEOUT):
+        raise AlreadyGenerating()
+    transaction.on_commit(lambda: dispatch(customer_ids))
+
+
+def dispatch(customer_ids):
+    if settings.AI_TRAINING_BACKEND == 'celery':
+        from .tasks import generate_recommendations
+
+        generate_recommendations.delay(customer_ids)
+    else:
+        from .training import executor
+
+        executor().submit(run, customer_ids).add_done_callback(lambda future: cache.delete(RUNNING_KEY))
+
+
+def run(customer_ids):
+    """Background entry point of ``start``; used by both the process pool and the Celery task."""
+    try:
+        generate(None if customer_ids is None else [uuid.UUID(value) for value in customer_ids])
+    finally:
+        cache.delete(RUNNING_KEY)
+
+
+def top_for_customer(customer_id, k=None, now=None):
+    """A customer's best current recommendations, from the precomputed rows."""
+    return AIRecommendation.objects.filter(
+        customer_id=customer_id,
+    ).filter(
+        Q(expires_at__gt=now or timezone.now()) | Q(expires_at__isnull=True),
+    ).order_by('-confidence_score', '-created_at')[:k or settings.AI_RECOMMENDATIONS_PER_CUSTOMER]
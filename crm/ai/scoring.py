@@ -0,0 +1,246 @@
+"""
+Batch predictive scoring.
+
+An ``AIModel``'s artifact (``model_file_path``) is loaded once per process
+through ``model_cache``. Customers are scored in batches: each batch's
+features are sliced from the memory-mapped ``feature_store`` snapshot (or,
+before the first build, computed with a handful of grouped queries),
+scored in a process pool (or inline when ``AI_SCORING_WORKERS`` is 0) and
+written back with a single upsert into ``PredictiveScore``, one row per
+customer and score type carrying an ``expires_at``.
+
+The pool is created once per process and kept, so its workers keep their
+loaded models between runs. Code that is itself running in a pool worker
+(a queued scoring run) scores inline rather than starting a nested pool.
+
+Artifacts are only loaded from inside ``AI_MODEL_DIR``; loading is
+unpickling, so a path anywhere else is refused. Scoring every active
+customer is queued with ``start`` and runs on the same background backend
+as training.
+
+``latest_scores`` is the read path: the current, unexpired scores of a
+customer from the ``(customer, expires_at)`` index.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+from crm.core.models import Customer
+
+from . import feature_store, model_cache
+from .feature_store import FEATURES
+from .models import AIModel, PredictiveScore
+
+
+model_cache.models.maxsize = settings.AI_MODEL_CACHE_SIZE
+
+SCORE_TYPES = {'churn_prediction': 'churn_risk', 'lead_scoring': 'lead_score'}
+RUNNING_PREFIX = 'crm:ai:scoring:'
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def executor():
+    # model_cache imports no Django code, so spawned workers need no setup.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.AI_SCORING_WORKERS),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+class ScoringError(Exception):
+    """The model cannot be used for scoring."""
+
+
+class AlreadyScoring(Exception):
+    """A full scoring run of the model is already queued or running."""
+
+
+def artifact_path(ai_model):
+    """The model's artifact path, resolved; raises ``ScoringError`` unless it lies inside ``AI_MODEL_DIR``."""
+    if not ai_model.model_file_path:
+        raise ScoringError('The model has no artifact file.')
+    root = os.path.realpath(settings.AI_MODEL_DIR)
+    path = os.path.realpath(ai_model.model_file_path)
+    if os.path.commonpath([root, path]) != root:
+        raise ScoringError('The model artifact is outside the model directory.')
+    return path
+
+
+def load_artifact(ai_model):
+    """``(stamp, artifact)`` for the model; any failure to read or unpack it is a ``ScoringError``."""
+    path = artifact_path(ai_model)
+    try:
+        stamp = model_cache.ModelCache.stamp(path)
+    except OSError as exc:
+        raise ScoringError(f'Cannot read the model artifact: {exc.strerror}')
+    try:
+        artifact = model_cache.models.get(path, stamp)
+    except Exception as exc:
+        raise ScoringError(f'Cannot load the model artifact ({type(exc).__name__}).')
+    if not hasattr(artifact.estimator, 'predict'):
+        raise ScoringError('The model artifact does not hold an estimator.')
+    return stamp, artifact
+
+
+def score_type_for(ai_model):
+    return ai_model.model_config.get('score_type') or SCORE_TYPES.get(ai_model.model_type, 'custom')
+
+
+def _columns(artifact):
+    """Positions of the artifact's features in ``FEATURES``."""
+    names = artifact.features or FEATURES
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        raise ScoringError(f'Unknown features: {", ".join(unknown)}')
+    return [FEATURES.index(name) for name in names], names
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _active(batches, columns):
+    active = feature_store.COLUMN['is_active']
+    for ids, features in batches:
+        keep = features[:, active] > 0
+        if keep.any():
+            yield [customer_id for customer_id, kept in zip(ids, keep) if kept], features[keep][:, columns]
+
+
+def _percent(value):
+    return Decimal(str(round(float(value), 2)))
+
+
+def _rows(ai_model, score_type, expires_at, customer_ids, result, names):
+    scores, confidence, indices, weights = result
+    rows = []
+    for position, customer_id in enumerate(customer_ids):
+        factors = [] if indices is None else [
+            {'feature': names[feature], 'impact': round(float(weight), 4)}
+            for feature, weight in zip(indices[position], weights[position])
+        ]
+        rows.append(PredictiveScore(
+            customer_id=customer_id, score_type=score_type, ai_model=ai_model,
+            score_value=_percent(scores[position]), confidence_level=_percent(confidence[position]),
+            factors=factors, expires_at=expires_at,
+        ))
+    return rows
+
+
+def _save(rows):
+    PredictiveScore.objects.bulk_create(
+        rows, batch_size=1000,
+        update_conflicts=True, unique_fields=['customer', 'score_type'],
+        update_fields=['score_value', 'confidence_level', 'factors', 'ai_model', 'calculated_at', 'expires_at'],
+    )
+
+
+def score_customers(ai_model, customer_ids=None, batch_size=2000, workers=None):
+    """Score customers (all active ones by default) with ``ai_model``; returns how many were written."""
+    stamp, artifact = load_artifact(ai_model)
+    columns, names = _columns(artifact)
+    score_type = score_type_for(ai_model)
+    ttl = ai_model.model_config.get('score_ttl_hours', settings.AI_SCORE_TTL_HOURS)
+    expires_at = timezone.now() + timedelta(hours=ttl)
+    workers = settings.AI_SCORING_WORKERS if workers is None else workers
+    snapshot = feature_store.current()
+    if customer_ids is not None:
+        batches = (
+            (batch, snapshot.rows(batch, columns) if snapshot else feature_store.customer_features(batch)[:, columns])
+            for batch in _batches(customer_ids, batch_size)
+        )
+    elif snapshot is not None:
+        batches = _active(snapshot.batches(batch_size), columns)
+    else:
+        active = Customer.objects.filter(is_active=True).order_by('pk').values_list('id', flat=True).iterator()
+        batches = (
+            (batch, feature_store.customer_features(batch)[:, columns])
+            for batch in _batches(active, batch_size)
+        )
+
+    written = 0
+    if workers <= 0 or multiprocessing.parent_process() is not None:
+        for batch, matrix in batches:
+            _save(_rows(ai_model, score_type, expires_at, batch, model_cache.predict(stamp, matrix), names))
+            written += len(batch)
+    else:
+        pool = executor()
+        pending = []
+        for batch, matrix in batches:
+            # The next batch is read while workers score earlier ones.
+            pending.append((batch, pool.submit(model_cache.predict, stamp, matrix)))
+            if len(pending) > workers:
+                batch, future = pending.pop(0)
+                _save(_rows(ai_model, score_type, expires_at, batch, future.result(), names))
+                written += len(batch)
+        for batch, future in pending:
+            _save(_rows(ai_model, score_type, expires_at, batch, future.result(), names))
+            written += len(batch)
+    if written:
+        bump_tags([model_tag(PredictiveScore)])
+    return written
+
+
+def start(ai_model):
+    """
+    Queue scoring of every active customer once the current transaction
+    commits. The artifact is checked first so a broken model fails the
+    request rather than the job.
+    """
+    _columns(load_artifact(ai_model)[1])
+    model_id = str(ai_model.pk)
+    # Expires on its own should a worker die mid-run.
+    if not cache.add(RUNNING_PREFIX + model_id, True, timeout=settings.AI_SCORING_TIMEOUT):
+        raise AlreadyScoring()
+    transaction.on_commit(lambda: dispatch(model_id))
+
+
+def dispatch(model_id):
+    if settings.AI_TRAINING_BACKEND == 'celery':
+        from .tasks import score_model
+
+        score_model.delay(model_id)
+    else:
+        from .training import executor
+
+        # The worker's own release only reaches a cache shared with this process.
+        executor().submit(run, model_id).add_done_callback(lambda future: cache.delete(RUNNING_PREFIX + model_id))
+
+
+def run(model_id):
+    """Background entry point of ``start``; used by both the process pool and the Celery task."""
+    try:
+        ai_model = AIModel.objects.filter(pk=model_id).first()
+        if ai_model is not None:
+            score_customers(ai_model)
+    finally:
+        cache.delete(RUNNING_PREFIX + model_id)
+
+
+def latest_scores(customer_id, now=None):
+    """Unexpired scores of a customer, newest first."""
+    return PredictiveScore.objects.filter(
+        customer_id=customer_id,
+    ).filter(
+        Q(expires_at__gt=now or timezone.now()) | Q(expires_at__isnull=True),
+    ).order_by('-calculated_at')
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from .models import (
     AIModel, PredictiveScore, Chatbot, ChatbotConversation, ChatbotMessage,
-    PersonalizationRule, AIRecommendation, AITrainingData, AIModelPerformance
+    PersonalizationRule, AIRecommendation, AITrainingData, AIModelPerformance, AITrainingJob
 )
 from crm.core.serializers import UserSerializer, CustomerSerializer
+from . import transcripts
 
 
 class AIModelSerializer(serializers.ModelSerializer):
@@ -12,7 +13,8 @@ class AIModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIModel
         fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'updated_at', 'last_trained']
+        # Artifacts are only written by training; a client-set path would be unpickled when scoring.
+        read_only_fields = ['id', 'created_at', 'updated_at', 'last_trained', 'model_file_path']
 
 
 class PredictiveScoreSerializer(serializers.ModelSerializer):
@@ -44,12 +46,16 @@ class ChatbotMessageSerializer(serializers.ModelSerializer):
 class ChatbotConversationSerializer(serializers.ModelSerializer):
     chatbot = ChatbotSerializer(read_only=True)
     customer = CustomerSerializer(read_only=True)
-    messages = ChatbotMessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
     
     class Meta:
         model = ChatbotConversation
-        fields = '__all__'
-        read_only_fields = ['id', 'session_id', 'started_at', 'ended_at', 'created_at']
+        exclude = ['transcript']
+        read_only_fields = ['id', 'session_id', 'started_at', 'ended_at', 'created_at', 'compacted_at']
+
+    def get_messages(self, obj):
+        # Compacted conversations keep their messages in the transcript blob
+        return ChatbotMessageSerializer(transcripts.messages(obj), many=True).data
 
 
 class PersonalizationRuleSerializer(serializers.ModelSerializer):
@@ -60,6 +66,19 @@ class PersonalizationRuleSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate(self, attrs):
+        from .personalization import RuleError, validate_rule
+
+        instance = self.instance
+        try:
+            validate_rule(
+                attrs.get('target_audience', instance.target_audience if instance else {}),
+                attrs.get('trigger_conditions', instance.trigger_conditions if instance else {}),
+            )
+        except RuleError as exc:
+            raise serializers.ValidationError(str(exc))
+        return attrs
+
 
 class AIRecommendationSerializer(serializers.ModelSerializer):
     customer = CustomerSerializer(read_only=True)
@@ -68,7 +87,7 @@ class AIRecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIRecommendation
         fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'implemented_at']
+        read_only_fields = ['id', 'created_at', 'delivered_at', 'acted_upon_at']
 
 
 class AITrainingDataSerializer(serializers.ModelSerializer):
@@ -87,3 +106,12 @@ class AIModelPerformanceSerializer(serializers.ModelSerializer):
         model = AIModelPerformance
         fields = '__all__'
         read_only_fields = ['id', 'evaluation_date', 'created_at']
+
+
+class AITrainingJobSerializer(serializers.ModelSerializer):
+    created_by = UserSerializer(read_only=True)
+    
+    class Meta:
+        model = AITrainingJob
+        fields = '__all__'
+        read_only_fields = [field.name for field in AITrainingJob._meta.fields]
@@ -0,0 +1,20 @@
+"""Celery entry points, used when ``AI_TRAINING_BACKEND`` is ``'celery'``."""
+from celery import shared_task
+
+from . import recommendations, scoring
+from .training import run_job
+
+
+@shared_task(name='crm.ai.run_training_job')
+def run_training_job(job_id):
+    run_job(job_id)
+
+
+@shared_task(name='crm.ai.score_model')
+def score_model(model_id):
+    scoring.run(model_id)
+
+
+@shared_task(name='crm.ai.generate_recommendations')
+def generate_recommendations(customer_ids=None):
+    recommendations.run(customer_ids)
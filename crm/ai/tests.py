@@ -0,0 +1,367 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import joblib
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from sklearn.linear_model import LogisticRegression
+
+from crm.analytics.models import CustomerMetrics
+from crm.core.models import Company, Customer, Interaction, User as CRMUser
+
+from . import feature_store, personalization, recommendations, scoring, training, transcripts
+from .feature_store import FEATURES
+from .models import (
+    AIModel, AITrainingData, AITrainingJob, Chatbot, ChatbotConversation, ChatbotMessage, FeatureStoreChange,
+    PersonalizationRule, PredictiveScore,
+)
+
+
+class TemporaryDirectoryMixin:
+    """Point ``setting`` at a fresh directory for each test."""
+
+    setting = None
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overridden = override_settings(**{self.setting: self.directory})
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+
+def make_customers(count, prefix='customer'):
+    company = Company.objects.create(name=f'{prefix} Inc')
+    return [
+        Customer.objects.create(
+            company=company, first_name=prefix.title(), last_name=str(number), email=f'{prefix}{number}@example.com',
+        )
+        for number in range(count)
+    ]
+
+
+class FeatureStoreTests(TemporaryDirectoryMixin, TestCase):
+    setting = 'AI_FEATURE_STORE_DIR'
+
+    def setUp(self):
+        super().setUp()
+        # Every row here is written within the overlap, which would mark all customers changed.
+        overlap = mock.patch.object(feature_store, 'OVERLAP', timedelta(0))
+        overlap.start()
+        self.addCleanup(overlap.stop)
+        self.agent = CRMUser.objects.create(username='agent')
+        self.customers = make_customers(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interaction = self.interact(self.customers[0])
+            self.interact(self.customers[0])
+        feature_store.build()
+
+    def interact(self, customer):
+        return Interaction.objects.create(customer=customer, user=self.agent, type='call', subject='Hello', description='')
+
+    def feature(self, customer, name):
+        return feature_store.current().rows([customer.pk])[0][feature_store.COLUMN[name]]
+
+    def test_build_consumes_marks(self):
+        self.assertEqual(feature_store.current().manifest['rows'], 3)
+        self.assertFalse(FeatureStoreChange.objects.exists())
+        self.assertEqual(self.feature(self.customers[0], 'interactions'), 2)
+
+    def test_delete_of_a_created_at_only_source(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interaction.delete()
+        manifest = feature_store.refresh()
+        self.assertFalse(manifest['full'])
+        self.assertEqual(manifest['refreshed'], 1)
+        self.assertEqual(self.feature(self.customers[0], 'interactions'), 1)
+        self.assertFalse(FeatureStoreChange.objects.exists())
+
+    def test_edit_of_a_created_at_only_source(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            metrics = CustomerMetrics.objects.create(customer=self.customers[1], date=timezone.localdate(), revenue=10)
+        feature_store.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            metrics.revenue = 250
+            metrics.save()
+        self.assertEqual(feature_store.refresh()['refreshed'], 1)
+        self.assertEqual(self.feature(self.customers[1], 'revenue'), 250)
+
+    def test_reassigned_row_refreshes_both_customers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interaction.customer = self.customers[2]
+            self.interaction.save()
+        self.assertEqual(feature_store.refresh()['refreshed'], 2)
+        self.assertEqual(self.feature(self.customers[0], 'interactions'), 1)
+        self.assertEqual(self.feature(self.customers[2], 'interactions'), 1)
+
+    def test_new_and_deleted_customers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            added = make_customers(1, prefix='late')[0]
+            self.customers[1].delete()
+        manifest = feature_store.refresh()
+        self.assertEqual(manifest['rows'], 3)
+        snapshot = feature_store.current()
+        self.assertEqual(list(snapshot.locate([added.pk, self.customers[1].pk]) >= 0), [True, False])
+
+    def test_untouched_customers_are_copied(self):
+        self.assertEqual(feature_store.refresh()['refreshed'], 0)
+
+
+class ScoringTests(TemporaryDirectoryMixin, TestCase):
+    setting = 'AI_MODEL_DIR'
+
+    def setUp(self):
+        super().setUp()
+        features = override_settings(AI_FEATURE_STORE_DIR=os.path.join(self.directory, 'features'))
+        features.enable()
+        self.addCleanup(features.disable)
+        path = os.path.join(self.directory, 'churn.joblib')
+        estimator = LogisticRegression().fit(np.arange(20, dtype=float).reshape(10, 2), [0, 1] * 5)
+        joblib.dump({'estimator': estimator, 'features': FEATURES[:2]}, path)
+        self.model = AIModel.objects.create(
+            name='Churn', model_type='churn_prediction', status='active', model_file_path=path,
+        )
+        self.customers = make_customers(3)
+
+    def test_scores_inline(self):
+        written = scoring.score_customers(self.model, [customer.pk for customer in self.customers], workers=0)
+        self.assertEqual(written, 3)
+        self.assertEqual(PredictiveScore.objects.filter(score_type='churn_risk').count(), 3)
+
+    def test_pool_workers_score_inline(self):
+        with mock.patch.object(scoring.multiprocessing, 'parent_process', return_value=object()), \
+                mock.patch.object(scoring, 'executor', side_effect=AssertionError('nested pool')):
+            self.assertEqual(scoring.score_customers(self.model, [self.customers[0].pk], workers=2), 1)
+
+    def test_one_pool_per_process(self):
+        self.assertIs(scoring.executor(), scoring.executor())
+
+    def test_artifacts_outside_the_model_directory_are_refused(self):
+        self.model.model_file_path = '/etc/passwd'
+        with self.assertRaises(scoring.ScoringError):
+            scoring.artifact_path(self.model)
+
+
+class TrainingTests(TemporaryDirectoryMixin, TestCase):
+    setting = 'AI_MODEL_DIR'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('trainer')
+        self.model = AIModel.objects.create(
+            name='Churn', model_type='churn_prediction', status='inactive',
+            model_config={'features': ['logins', 'revenue']}, hyperparameters={'random_state': 0},
+        )
+        AITrainingData.objects.create(
+            data_type='behavior', name='History', is_approved=True,
+            data_content={'samples': [
+                {'features': {'logins': number % 10, 'revenue': number * 10}, 'label': int(number % 10 < 5)}
+                for number in range(60)
+            ]},
+        )
+
+    def start(self):
+        # Callbacks are dropped so the tests run the worker inline instead of through the pool.
+        with self.captureOnCommitCallbacks():
+            return training.start(self.model, self.user)
+
+    def test_job_runs_to_completion(self):
+        job = self.start()
+        self.model.refresh_from_db()
+        self.assertEqual(self.model.status, 'training')
+        training.run_job(job.pk)
+        job.refresh_from_db()
+        self.model.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.progress, 100)
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertEqual(self.model.status, 'active')
+        self.assertTrue(os.path.exists(self.model.model_file_path))
+        self.assertEqual(scoring.artifact_path(self.model), os.path.realpath(self.model.model_file_path))
+
+    def test_one_active_job_per_model(self):
+        self.start()
+        with self.assertRaises(training.AlreadyTraining):
+            training.start(self.model, self.user)
+
+    def test_cancel_before_the_worker_starts(self):
+        job = self.start()
+        self.assertTrue(training.cancel(job))
+        training.run_job(job.pk)
+        job.refresh_from_db()
+        self.model.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(self.model.status, 'inactive')
+        self.assertFalse(training.cancel(job))
+
+    def test_cancel_through_the_api(self):
+        job = self.start()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(f'/api/ai/training-jobs/{job.pk}/cancel/').status_code, 200)
+        training.run_job(job.pk)
+        self.assertEqual(self.client.post(f'/api/ai/training-jobs/{job.pk}/cancel/').status_code, 409)
+
+    def test_stale_jobs_are_reaped(self):
+        job = self.start()
+        long_ago = timezone.now() - timedelta(days=1)
+        AITrainingJob.objects.filter(pk=job.pk).update(status='running', started_at=long_ago, heartbeat_at=long_ago)
+        self.assertEqual(training.reap_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        with self.assertRaises(training.Cancelled):
+            training._report(job.pk, 1, 10)
+        self.start()
+
+
+class ChatbotSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        training_data = [
+            {'intent': 'greet', 'examples': ['hello', 'hi there'], 'responses': ['Hello!']},
+            {'intent': 'bye', 'examples': ['bye', 'see you'], 'responses': ['Goodbye!']},
+        ]
+        cls.first = Chatbot.objects.create(name='First', bot_type='faq', platform='website', training_data=training_data)
+        cls.second = Chatbot.objects.create(name='Second', bot_type='faq', platform='website', training_data=training_data)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('visitor'))
+
+    def send(self, chatbot, **body):
+        return self.client.post(f'/api/ai/chatbots/{chatbot.pk}/message/', body, content_type='application/json')
+
+    def test_sessions_belong_to_one_bot(self):
+        self.assertEqual(self.send(self.first, session_id='shared', text='hello').status_code, 200)
+        response = self.send(self.second, session_id='shared', text='hello')
+        self.assertEqual(response.status_code, 400)
+        response = self.send(self.second, messages=[{'session_id': 'shared', 'text': 'hello'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChatbotConversation.objects.get(session_id='shared').chatbot, self.first)
+
+    def test_long_session_ids_are_rejected(self):
+        response = self.send(self.first, session_id='x' * 101, text='hello')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChatbotConversation.objects.exists())
+
+
+class TranscriptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chatbot = Chatbot.objects.create(name='Helper', bot_type='faq', platform='website')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('agent'))
+        self.conversation = ChatbotConversation.objects.create(chatbot=self.chatbot, session_id='session-1')
+        now = timezone.now()
+        self.originals = []
+        for offset, (kind, text) in enumerate([('user', 'Where is my order?'), ('bot', 'Let me check.'), ('user', 'Thanks')]):
+            message = ChatbotMessage.objects.create(
+                conversation=self.conversation, message_type=kind, content=text,
+                intent_detected='order' if kind == 'user' else '', entities=[{'type': 'ticket', 'value': 'TKT-1'}],
+            )
+            ChatbotMessage.objects.filter(pk=message.pk).update(timestamp=now - timedelta(minutes=10 - offset))
+            self.originals.append(message.pk)
+
+    def end_and_compact(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(transcripts.end(self.conversation))
+            return transcripts.compact(older_than=timedelta(0))
+
+    def test_round_trip(self):
+        before = [
+            (message.pk, message.message_type, message.content, message.timestamp, message.intent_detected, message.entities)
+            for message in transcripts.messages(self.conversation)
+        ]
+        self.assertEqual(self.end_and_compact(), (1, 3))
+        self.assertFalse(ChatbotMessage.objects.filter(conversation=self.conversation).exists())
+        conversation = ChatbotConversation.objects.get(pk=self.conversation.pk)
+        self.assertIsNotNone(conversation.compacted_at)
+        after = [
+            (message.pk, message.message_type, message.content, message.timestamp, message.intent_detected, message.entities)
+            for message in transcripts.messages(conversation)
+        ]
+        self.assertEqual(after, before)
+
+    def test_only_encoded_rows_are_deleted(self):
+        encode = transcripts.encode
+
+        def encode_while_a_message_arrives(messages):
+            ChatbotMessage.objects.create(conversation=self.conversation, message_type='user', content='Late')
+            return encode(messages)
+
+        transcripts.encode = encode_while_a_message_arrives
+        self.addCleanup(setattr, transcripts, 'encode', encode)
+        self.end_and_compact()
+        self.assertEqual(list(ChatbotMessage.objects.values_list('content', flat=True)), ['Late'])
+        self.assertEqual(len(transcripts.archived_messages(self.conversation.pk)), 4)
+
+    def test_ending_stamps_ended_at_once(self):
+        self.assertTrue(transcripts.end(self.conversation, 'abandoned'))
+        self.assertIsNotNone(self.conversation.ended_at)
+        self.assertFalse(transcripts.end(self.conversation))
+        response = self.client.post(f'/api/ai/conversations/{self.conversation.pk}/end/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_idle_conversations_are_abandoned(self):
+        ChatbotMessage.objects.filter(conversation=self.conversation).update(timestamp=timezone.now() - timedelta(days=2))
+        self.assertEqual(transcripts.abandon_idle(timedelta(hours=24)), 1)
+        conversation = ChatbotConversation.objects.get(pk=self.conversation.pk)
+        self.assertEqual(conversation.status, 'abandoned')
+        self.assertIsNotNone(conversation.ended_at)
+
+    def test_archived_list_applies_search_and_ordering(self):
+        self.end_and_compact()
+        url = f'/api/ai/messages/?conversation={self.conversation.pk}'
+        listed = self.client.get(f'{url}&search=order').json()['results']
+        self.assertEqual([message['content'] for message in listed], ['Where is my order?'])
+        listed = self.client.get(f'{url}&ordering=-timestamp').json()['results']
+        self.assertEqual([message['content'] for message in listed], ['Thanks', 'Let me check.', 'Where is my order?'])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.delete(recommendations.RUNNING_KEY)
+        self.addCleanup(cache.delete, recommendations.RUNNING_KEY)
+        self.client.force_login(User.objects.create_user('seller'))
+
+    def test_generation_is_queued_once(self):
+        url = '/api/ai/recommendations/generate/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.client.post(url).status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+    def test_malformed_ids_are_bad_requests(self):
+        response = self.client.post('/api/ai/recommendations/generate/', {'customers': ['abc']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(cache.get(recommendations.RUNNING_KEY))
+
+
+class PersonalizationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('marketer'))
+
+    def test_malformed_audience_ids_are_bad_requests(self):
+        url = '/api/ai/personalization-rules/evaluate-audience/'
+        for customers in (['abc'], 'abc', 5):
+            with self.subTest(customers=customers):
+                response = self.client.post(url, {'customers': customers}, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_rules_reload_after_the_ttl(self):
+        PersonalizationRule.objects.create(
+            name='Everyone', rule_type='content', target_audience={}, trigger_conditions={}, personalization_logic={},
+        )
+        with override_settings(PERSONALIZATION_RULES_TTL=3600):
+            self.assertEqual(len(personalization.active_rules()), 1)
+            # update() sends no signal, so the table version stays put.
+            PersonalizationRule.objects.update(is_active=False)
+            self.assertEqual(len(personalization.active_rules()), 1)
+        with override_settings(PERSONALIZATION_RULES_TTL=0):
+            self.assertEqual(personalization.active_rules(), [])
@@ -0,0 +1,388 @@
+"""
+Background model training.
+
+``start`` records an ``AITrainingJob`` and hands it to a worker once the
+request's transaction commits: a local process pool by default, or Celery
+when ``AI_TRAINING_BACKEND`` is ``'celery'``. The request returns at once.
+
+A job streams the model's approved ``AITrainingData`` rows in chunks. Each
+row's ``data_content`` is one sample, ``{"features": {...} | [...],
+"label": ...}``, or several under ``"samples"``. Features follow
+``model_config["features"]`` (default: the scoring features), so a trained
+artifact can be served by ``crm.ai.scoring`` directly. Each chunk updates a
+scaler and an SGD estimator incrementally (``partial_fit``), so memory stays
+flat however much data there is; every fifth sample is held out for
+evaluation.
+
+After each chunk the job's progress and ``heartbeat_at`` are saved and
+``cancel_requested`` is checked. A finished job writes the artifact
+atomically, points the model at it and stores the hold-out metrics as
+``AIModelPerformance``.
+
+A worker can vanish (the web process holding the local pool restarts, a
+Celery message is lost), so ``reap_stale`` fails running jobs whose
+heartbeat is older than ``AI_TRAINING_HEARTBEAT_TIMEOUT`` and queued jobs
+never picked up within ``AI_TRAINING_QUEUE_TIMEOUT``. ``start`` reaps before
+checking for an active job, and the ``reap_training_jobs`` command does it
+on a schedule. A reaped job that is in fact still running stops at its next
+progress report.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import AIModel, AIModelPerformance, AITrainingData, AITrainingJob
+
+
+REGRESSION_TYPES = ('regression', 'forecasting')
+ACTIVE_STATUSES = ('queued', 'running')
+ESTIMATOR_PARAMS = ('alpha', 'penalty', 'l1_ratio', 'learning_rate', 'eta0', 'random_state')
+HOLDOUT_EVERY = 5
+
+
+class AlreadyTraining(Exception):
+    """The model already has a queued or running job."""
+
+
+class Cancelled(Exception):
+    """The job was cancelled while running."""
+
+
+def stale_jobs(now=None):
+    """Active jobs whose worker has evidently gone away."""
+    now = now or timezone.now()
+    return AITrainingJob.objects.filter(
+        Q(status='running') & (
+            Q(heartbeat_at__lt=now - timedelta(seconds=settings.AI_TRAINING_HEARTBEAT_TIMEOUT))
+            | Q(heartbeat_at__isnull=True, started_at__lt=now - timedelta(seconds=settings.AI_TRAINING_HEARTBEAT_TIMEOUT))
+        )
+        | Q(status='queued', created_at__lt=now - timedelta(seconds=settings.AI_TRAINING_QUEUE_TIMEOUT))
+    )
+
+
+def reap_stale(now=None):
+    """Fail stale jobs and release their models; returns how many were reaped."""
+    jobs = list(stale_jobs(now).values_list('pk', 'ai_model_id'))
+    reaped = 0
+    for job_id, model_id in jobs:
+        if _finish(job_id, 'failed', message='The worker stopped reporting progress'):
+            reaped += 1
+            model = AIModel.objects.get(pk=model_id)
+            if not AITrainingJob.objects.filter(ai_model_id=model_id, status__in=ACTIVE_STATUSES).exists():
+                model.status = 'active' if model.model_file_path else 'inactive'
+                model.save(update_fields=['status', 'updated_at'])
+    return reaped
+
+
+def start(ai_model, user=None):
+    """Queue a training job for ``ai_model``; returns the ``AITrainingJob``."""
+    reap_stale()
+    with transaction.atomic():
+        AIModel.objects.select_for_update().filter(pk=ai_model.pk).first()
+        if AITrainingJob.objects.filter(ai_model=ai_model, status__in=ACTIVE_STATUSES).exists():
+            raise AlreadyTraining()
+        job = AITrainingJob.objects.create(ai_model=ai_model, created_by=user)
+        ai_model.status = 'training'
+        ai_model.save(update_fields=['status', 'updated_at'])
+        job_id = str(job.pk)
+        transaction.on_commit(lambda: dispatch(job_id))
+    return job
+
+
+def cancel(job):
+    """Ask a queued or running job to stop; returns False if it already finished."""
+    updated = AITrainingJob.objects.filter(pk=job.pk, status__in=ACTIVE_STATUSES).update(cancel_requested=True)
+    bump_tags([model_tag(AITrainingJob)])
+    return bool(updated)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def executor():
+    # Spawned workers set up Django themselves instead of inheriting the
+    # parent's open database connections. The initializer is unpickled before
+    # Django is ready, so it must not live in a module that imports models.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.AI_TRAINING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _pool
+
+
+def dispatch(job_id):
+    if settings.AI_TRAINING_BACKEND == 'celery':
+        from .tasks import run_training_job
+
+        run_training_job.delay(job_id)
+    else:
+        executor().submit(run_job, job_id)
+
+
+def _samples(content):
+    if isinstance(content, dict) and isinstance(content.get('samples'), list):
+        return content['samples']
+    return [content]
+
+
+def _vector(features, names):
+    if isinstance(features, dict):
+        return [float(features.get(name) or 0) for name in names]
+    if isinstance(features, (list, tuple)) and len(features) == len(names):
+        return [float(value or 0) for value in features]
+    return None
+
+
+def training_rows(ai_model):
+    info = ai_model.training_data_info or {}
+    queryset = AITrainingData.objects.filter(is_approved=True)
+    if info.get('data_type'):
+        queryset = queryset.filter(data_type=info['data_type'])
+    if info.get('names'):
+        queryset = queryset.filter(name__in=info['names'])
+    return queryset
+
+
+def _contents(queryset, page=1000):
+    # Keyset pages rather than one long cursor, so progress writes between
+    # pages never wait on an open read.
+    last = None
+    while True:
+        rows = queryset.order_by('id')
+        if last is not None:
+            rows = rows.filter(id__gt=last)
+        rows = list(rows.values_list('id', 'data_content')[:page])
+        if not rows:
+            return
+        last = rows[-1][0]
+        for _, content in rows:
+            yield content
+
+
+def chunks(queryset, names, size):
+    """``(rows_read, features, labels)`` per chunk of about ``size`` samples."""
+    features, labels, rows = [], [], 0
+    for content in _contents(queryset):
+        rows += 1
+        for sample in _samples(content):
+            if not isinstance(sample, dict) or sample.get('label') is None:
+                continue
+            vector = _vector(sample.get('features'), names)
+            if vector is not None:
+                features.append(vector)
+                labels.append(sample['label'])
+        if len(features) >= size:
+            yield rows, np.asarray(features, dtype=float), np.asarray(labels)
+            features, labels, rows = [], [], 0
+    if features or rows:
+        yield rows, np.asarray(features, dtype=float).reshape(-1, len(names)), np.asarray(labels)
+
+
+def build_estimator(ai_model):
+    from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+    params = {key: value for key, value in (ai_model.hyperparameters or {}).items() if key in ESTIMATOR_PARAMS}
+    if ai_model.model_type in REGRESSION_TYPES:
+        return SGDRegressor(**params), None
+    classes = np.asarray((ai_model.model_config or {}).get('classes', [0, 1]))
+    return SGDClassifier(loss='log_loss', **params), classes
+
+
+def evaluate(estimator, features, labels, regression):
+    from sklearn import metrics
+
+    if not len(labels):
+        return {'samples': 0}
+    started = time.perf_counter()
+    predicted = estimator.predict(features)
+    elapsed = (time.perf_counter() - started) / len(labels)
+    if regression:
+        return {
+            'samples': len(labels),
+            'r2': float(metrics.r2_score(labels, predicted)),
+            'mae': float(metrics.mean_absolute_error(labels, predicted)),
+            'seconds_per_prediction': elapsed,
+        }
+    average = 'binary' if len(np.unique(np.concatenate([labels, predicted]))) <= 2 else 'macro'
+    scores = metrics.precision_recall_fscore_support(labels, predicted, average=average, zero_division=0)
+    return {
+        'samples': len(labels),
+        'accurate': int((predicted == labels).sum()),
+        'accuracy': float(metrics.accuracy_score(labels, predicted)),
+        'precision': float(scores[0]),
+        'recall': float(scores[1]),
+        'f1': float(scores[2]),
+        'seconds_per_prediction': elapsed,
+    }
+
+
+def _ratio(value):
+    return Decimal(str(round(min(max(float(value), 0), 1), 4)))
+
+
+def record_performance(results, day=None):
+    """Upsert the day's ``AIModelPerformance`` rows from ``(ai_model, metrics)`` pairs."""
+    rows = []
+    for model, result in results:
+        samples = result.get('samples', 0)
+        accurate = result.get('accurate', 0)
+        rows.append(AIModelPerformance(
+            ai_model=model, date=day or timezone.localdate(),
+            total_predictions=samples, accurate_predictions=accurate,
+            accuracy_rate=_ratio(result.get('accuracy', 0)),
+            precision=_ratio(result.get('precision', 0)),
+            recall=_ratio(result.get('recall', 0)),
+            f1_score=_ratio(result.get('f1', 0)),
+            avg_response_time=Decimal(str(round(result.get('seconds_per_prediction', 0), 4))),
+            error_count=samples - accurate if 'accurate' in result else 0,
+            error_rate=_ratio(1 - result['accuracy']) if 'accuracy' in result else 0,
+        ))
+    AIModelPerformance.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['ai_model', 'date'],
+        update_fields=[
+            'total_predictions', 'accurate_predictions', 'accuracy_rate', 'precision', 'recall',
+            'f1_score', 'avg_response_time', 'error_count', 'error_rate',
+        ],
+    )
+    bump_tags([model_tag(AIModelPerformance)])
+
+
+def _report(job_id, rows_done, total):
+    progress = Decimal(str(round(min(rows_done / total, 1) * 100, 2))) if total else Decimal('0')
+    running = AITrainingJob.objects.filter(pk=job_id, status='running').update(
+        processed_rows=rows_done, progress=progress, heartbeat_at=timezone.now(),
+    )
+    bump_tags([model_tag(AITrainingJob)])
+    # A job that is no longer running was reaped as stale.
+    if not running or AITrainingJob.objects.filter(pk=job_id, cancel_requested=True).exists():
+        raise Cancelled()
+
+
+def save_artifact(ai_model, job, estimator, names):
+    import joblib
+
+    directory = settings.AI_MODEL_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{ai_model.pk}-{job.pk}.joblib')
+    partial = f'{path}.part'
+    joblib.dump({'estimator': estimator, 'features': names}, partial)
+    # Readers never see a half-written file.
+    os.replace(partial, path)
+    return path
+
+
+def train(job):
+    """Fit the job's model over its training data; returns ``(artifact_path, metrics)``."""
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    from .feature_store import FEATURES
+
+    ai_model = job.ai_model
+    names = list((ai_model.model_config or {}).get('features') or FEATURES)
+    hyperparameters = ai_model.hyperparameters or {}
+    epochs = max(int(hyperparameters.get('epochs', 1)), 1)
+    chunk_size = int(hyperparameters.get('chunk_size', settings.AI_TRAINING_CHUNK_SIZE))
+    regression = ai_model.model_type in REGRESSION_TYPES
+
+    queryset = training_rows(ai_model)
+    total = queryset.count() * epochs
+    AITrainingJob.objects.filter(pk=job.pk).update(total_rows=total)
+    scaler = StandardScaler()
+    estimator, classes = build_estimator(ai_model)
+    holdout_features, holdout_labels = [], []
+    done = seen = 0
+    for epoch in range(epochs):
+        for rows, features, labels in chunks(queryset, names, chunk_size):
+            done += rows
+            if len(labels):
+                held = (np.arange(seen, seen + len(labels)) % HOLDOUT_EVERY) == 0
+                seen += len(labels)
+                if epoch == 0 and held.any():
+                    holdout_features.append(features[held])
+                    holdout_labels.append(labels[held])
+                features, labels = features[~held], labels[~held]
+            if len(labels):
+                scaler.partial_fit(features)
+                scaled = scaler.transform(features)
+                if classes is None:
+                    estimator.partial_fit(scaled, labels.astype(float))
+                else:
+                    estimator.partial_fit(scaled, labels.astype(classes.dtype), classes=classes)
+            _report(job.pk, done, total)
+        seen = 0
+    if not hasattr(estimator, 'coef_'):
+        raise ValueError('No usable training samples were found.')
+
+    pipeline = Pipeline([('scale', scaler), ('model', estimator)])
+    if holdout_labels:
+        holdout_features, holdout_labels = np.vstack(holdout_features), np.concatenate(holdout_labels)
+        if classes is not None:
+            holdout_labels = holdout_labels.astype(classes.dtype)
+        result = evaluate(pipeline, holdout_features, holdout_labels, regression)
+    else:
+        result = {'samples': 0}
+    return save_artifact(ai_model, job, pipeline, names), result
+
+
+def _finish(job_id, status, **fields):
+    """Close an active job; returns False if it was already closed (reaped, for instance)."""
+    finished = AITrainingJob.objects.filter(pk=job_id, status__in=ACTIVE_STATUSES).update(
+        status=status, finished_at=timezone.now(), **fields,
+    )
+    bump_tags([model_tag(AITrainingJob)])
+    return bool(finished)
+
+
+def run_job(job_id):
+    """Run one queued job to completion; used by both the process pool and the Celery task."""
+    now = timezone.now()
+    claimed = AITrainingJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=now, heartbeat_at=now,
+    )
+    if not claimed:
+        return
+    job = AITrainingJob.objects.select_related('ai_model').get(pk=job_id)
+    ai_model = job.ai_model
+    try:
+        if job.cancel_requested:
+            raise Cancelled()
+        path, result = train(job)
+    except Cancelled:
+        if _finish(job_id, 'cancelled', message='Cancelled on request'):
+            ai_model.status = 'active' if ai_model.model_file_path else 'inactive'
+            ai_model.save(update_fields=['status', 'updated_at'])
+        return
+    except Exception as exc:
+        if _finish(job_id, 'failed', message=f'{type(exc).__name__}: {exc}'):
+            ai_model.status = 'error'
+            ai_model.save(update_fields=['status', 'updated_at'])
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        ai_model.model_file_path = path
+        ai_model.status = 'active'
+        ai_model.last_trained = now
+        ai_model.performance_metrics = result
+        ai_model.save(update_fields=['model_file_path', 'status', 'last_trained', 'performance_metrics', 'updated_at'])
+        record_performance([(ai_model, result)])
+        _finish(job_id, 'completed', progress=Decimal('100'), metrics=result, artifact_path=path)
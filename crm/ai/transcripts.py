@@ -0,0 +1,141 @@
+"""
+Compacted chatbot transcripts.
+
+A conversation ends when its ``status`` leaves ``active``, which stamps
+``ended_at`` (``end`` for callers that close it explicitly, and
+``abandon_idle`` for sessions nobody closed). Once it has ended,
+``compact`` folds its ``ChatbotMessage`` rows into one zlib-compressed JSON
+blob on ``ChatbotConversation.transcript`` and deletes the rows, keeping the
+hot message table small. Each message is stored as a compact list of its
+fields and comes back as an unsaved ``ChatbotMessage``, so serializers render
+archived and live messages identically.
+
+Messages written after compaction stay rows until the next run, which merges
+them into the existing transcript; ``messages`` always returns both, in
+timestamp order.
+"""
+import json
+import uuid
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import ChatbotConversation, ChatbotMessage
+
+
+CLOSED_STATUSES = ('completed', 'escalated', 'abandoned')
+
+
+def encode(messages):
+    rows = [
+        [
+            message.id.hex, message.message_type, message.content, message.timestamp.isoformat(),
+            message.intent_detected, None if message.confidence_score is None else str(message.confidence_score),
+            message.entities, message.metadata,
+        ]
+        for message in messages
+    ]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 6)
+
+
+def decode(blob, conversation_id):
+    messages = []
+    for message_id, message_type, content, timestamp, intent, confidence, entities, metadata in json.loads(
+        zlib.decompress(bytes(blob))
+    ):
+        messages.append(ChatbotMessage(
+            id=uuid.UUID(message_id), conversation_id=conversation_id, message_type=message_type,
+            content=content, timestamp=parse_datetime(timestamp), intent_detected=intent,
+            confidence_score=None if confidence is None else Decimal(confidence),
+            entities=entities, metadata=metadata,
+        ))
+    return messages
+
+
+def messages(conversation, live=None):
+    """Every message of ``conversation``, archived or not, oldest first."""
+    live = list(conversation.messages.all() if live is None else live)
+    if not conversation.transcript:
+        return live
+    return sorted(decode(conversation.transcript, conversation.pk) + live, key=lambda message: message.timestamp)
+
+
+def archived_messages(conversation_id):
+    """Messages of a compacted conversation, or ``None`` if it has no transcript."""
+    conversation = ChatbotConversation.objects.filter(
+        pk=conversation_id, transcript__isnull=False,
+    ).only('id', 'transcript').first()
+    if conversation is None:
+        return None
+    return messages(conversation, ChatbotMessage.objects.filter(conversation_id=conversation_id))
+
+
+def end(conversation, status='completed'):
+    """Close a conversation; returns False if it had already ended."""
+    if conversation.status != 'active':
+        return False
+    conversation.status = status
+    conversation.ended_at = timezone.now()
+    conversation.save(update_fields=['status', 'ended_at'])
+    bump_tags([model_tag(ChatbotConversation)])
+    return True
+
+
+def abandon_idle(idle_for):
+    """Mark active conversations without a message for ``idle_for`` as abandoned; returns how many."""
+    now = timezone.now()
+    idle = ChatbotConversation.objects.filter(status='active').annotate(
+        last_activity=Coalesce(Max('messages__timestamp'), 'started_at'),
+    ).filter(last_activity__lt=now - idle_for).values_list('pk', flat=True)
+    abandoned = ChatbotConversation.objects.filter(pk__in=list(idle)).update(status='abandoned', ended_at=now)
+    if abandoned:
+        bump_tags([model_tag(ChatbotConversation)])
+    return abandoned
+
+
+def compactable(ended_before):
+    return ChatbotConversation.objects.filter(
+        status__in=CLOSED_STATUSES, ended_at__isnull=False, ended_at__lt=ended_before,
+        messages__isnull=False,
+    ).distinct()
+
+
+def compact(older_than=timedelta(days=1), batch_size=200):
+    """Fold ended conversations into transcripts; returns ``(conversations, messages)`` compacted."""
+    ended_before = timezone.now() - older_than
+    conversations = folded = 0
+    last = None
+    while True:
+        pending = compactable(ended_before).order_by('pk')
+        if last is not None:
+            pending = pending.filter(pk__gt=last)
+        batch = list(pending.only('id', 'transcript')[:batch_size])
+        if not batch:
+            break
+        last = batch[-1].pk
+        with transaction.atomic():
+            rows = {}
+            for message in ChatbotMessage.objects.filter(conversation__in=batch).order_by('conversation', 'timestamp'):
+                rows.setdefault(message.conversation_id, []).append(message)
+            now = timezone.now()
+            encoded = []
+            for conversation in batch:
+                conversation.transcript = encode(messages(conversation, rows.get(conversation.pk, [])))
+                conversation.compacted_at = now
+                encoded.extend(message.pk for message in rows.get(conversation.pk, []))
+            ChatbotConversation.objects.bulk_update(batch, ['transcript', 'compacted_at'])
+            # Only the rows just encoded; messages that arrived since wait for the next run.
+            ChatbotMessage.objects.filter(pk__in=encoded).delete()
+            folded += len(encoded)
+        conversations += len(batch)
+    if conversations:
+        bump_tags([model_tag(ChatbotConversation), model_tag(ChatbotMessage)])
+    return conversations, folded
@@ -4,6 +4,7 @@ from . import views
 
 router = DefaultRouter()
 router.register(r'models', views.AIModelViewSet)
+router.register(r'training-jobs', views.AITrainingJobViewSet)
 router.register(r'predictive-scores', views.PredictiveScoreViewSet)
 router.register(r'chatbots', views.ChatbotViewSet)
 router.register(r'conversations', views.ChatbotConversationViewSet)
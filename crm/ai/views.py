@@ -4,20 +4,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.cache import cache_response
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     AIModel, PredictiveScore, Chatbot, ChatbotConversation, ChatbotMessage,
-    PersonalizationRule, AIRecommendation, AITrainingData, AIModelPerformance
+    PersonalizationRule, AIRecommendation, AITrainingData, AIModelPerformance, AITrainingJob
 )
 from .serializers import (
     AIModelSerializer, PredictiveScoreSerializer, ChatbotSerializer,
     ChatbotConversationSerializer, ChatbotMessageSerializer, PersonalizationRuleSerializer,
-    AIRecommendationSerializer, AITrainingDataSerializer, AIModelPerformanceSerializer
+    AIRecommendationSerializer, AITrainingDataSerializer, AIModelPerformanceSerializer,
+    AITrainingJobSerializer
 )
+from crm.core.models import Customer
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models import Avg
 from django.utils import timezone
 
 
-class AIModelViewSet(viewsets.ModelViewSet):
+class AIModelViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = AIModel.objects.all()
     serializer_class = AIModelSerializer
     permission_classes = [IsAuthenticated]
@@ -29,11 +34,15 @@ class AIModelViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def train(self, request, pk=None):
+        """Queue a background training job for this model"""
+        from . import training
+
         model = self.get_object()
-        model.status = 'training'
-        model.save()
-        # Here you would implement the actual training logic
-        return Response({'status': 'Training started'})
+        try:
+            job = training.start(model, request.user)
+        except training.AlreadyTraining:
+            return Response({'error': 'This model is already being trained'}, status=status.HTTP_409_CONFLICT)
+        return Response({'status': 'Training started', 'job': job.pk}, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def activate(self, request, pk=None):
@@ -42,8 +51,59 @@ class AIModelViewSet(viewsets.ModelViewSet):
         model.save()
         return Response({'status': 'Model activated'})
 
+    @action(detail=True, methods=['post'])
+    def score(self, request, pk=None):
+        """Score the given customers now, or queue scoring of every active customer"""
+        from . import scoring
+
+        model = self.get_object()
+        customers = request.data.get('customers')
+        try:
+            if not customers:
+                scoring.start(model)
+                return Response({'status': 'Scoring started'}, status=status.HTTP_202_ACCEPTED)
+            known = list(Customer.objects.filter(pk__in=customers).values_list('id', flat=True))
+            scored = scoring.score_customers(model, known, workers=0)
+        except scoring.AlreadyScoring:
+            return Response({'error': 'This model is already scoring every customer'}, status=status.HTTP_409_CONFLICT)
+        except (scoring.ScoringError, DjangoValidationError) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'scored': scored})
+
+
+class AITrainingJobViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = AITrainingJob.objects.select_related('created_by')
+    serializer_class = AITrainingJobSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['ai_model', 'status']
+    ordering_fields = ['created_at', 'finished_at']
+    ordering = ['-created_at']
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get a job's status and progress"""
+        job = self.get_object()
+        return Response({
+            'status': job.status,
+            'progress': job.progress,
+            'processed_rows': job.processed_rows,
+            'total_rows': job.total_rows,
+            'cancel_requested': job.cancel_requested,
+            'message': job.message,
+        })
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Ask a queued or running job to stop"""
+        from . import training
+
+        if not training.cancel(self.get_object()):
+            return Response({'error': 'This job has already finished'}, status=status.HTTP_409_CONFLICT)
+        return Response({'status': 'Cancellation requested'})
 
-class PredictiveScoreViewSet(viewsets.ModelViewSet):
+
+class PredictiveScoreViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = PredictiveScore.objects.all()
     serializer_class = PredictiveScoreSerializer
     permission_classes = [IsAuthenticated]
@@ -60,8 +120,22 @@ class PredictiveScoreViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(high_risk_scores, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """Get a customer's current, unexpired scores"""
+        from .scoring import latest_scores
+
+        customer = request.query_params.get('customer')
+        if not customer:
+            return Response({'error': 'customer is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            scores = list(latest_scores(customer))
+        except DjangoValidationError:
+            return Response({'error': 'Invalid customer id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(scores, many=True).data)
 
-class ChatbotViewSet(viewsets.ModelViewSet):
+
+class ChatbotViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Chatbot.objects.all()
     serializer_class = ChatbotSerializer
     permission_classes = [IsAuthenticated]
@@ -85,9 +159,59 @@ class ChatbotViewSet(viewsets.ModelViewSet):
         chatbot.save()
         return Response({'status': 'Chatbot deactivated'})
 
+    @action(detail=True, methods=['post'])
+    def message(self, request, pk=None):
+        """Answer a message ({session_id, text}) or a list of them ({messages: [...]})"""
+        from . import chatbot as runtime
 
-class ChatbotConversationViewSet(viewsets.ModelViewSet):
-    queryset = ChatbotConversation.objects.all()
+        chatbot = self.get_object()
+        if not chatbot.is_active:
+            return Response({'error': 'This chatbot is inactive'}, status=status.HTTP_409_CONFLICT)
+        messages = request.data.get('messages')
+        if messages is None:
+            messages = [{'session_id': request.data.get('session_id'), 'text': request.data.get('text')}]
+        if not isinstance(messages, list) or not all(
+            isinstance(message, dict) and message.get('session_id') and message.get('text') for message in messages
+        ):
+            return Response({'error': 'session_id and text are required'}, status=status.HTTP_400_BAD_REQUEST)
+        customer = request.data.get('customer')
+        try:
+            if customer and not Customer.objects.filter(pk=customer).exists():
+                return Response({'error': 'Unknown customer'}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError:
+            return Response({'error': 'Invalid customer id'}, status=status.HTTP_400_BAD_REQUEST)
+        extra = {
+            'customer_id': customer or None,
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+            'ip_address': request.META.get('REMOTE_ADDR'),
+        }
+        messages = [{'session_id': str(m['session_id']), 'text': str(m['text'])} for m in messages]
+        if any(len(message['session_id']) > runtime.SESSION_ID_LENGTH for message in messages):
+            return Response(
+                {'error': f'session_id may be at most {runtime.SESSION_ID_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if runtime.conflicting_sessions(chatbot, [message['session_id'] for message in messages]):
+            return Response({'error': 'session_id belongs to another chatbot'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if len(messages) == 1:
+                replies = [runtime.handle_message(chatbot, **messages[0], **extra)]
+            else:
+                replies = runtime.handle_messages(chatbot, messages, **extra)
+        except runtime.SessionConflict:
+            return Response({'error': 'session_id belongs to another chatbot'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(replies if 'messages' in request.data else replies[0])
+
+    @action(detail=True, methods=['get'])
+    def latency(self, request, pk=None):
+        """Get this process's recent reply latency percentiles"""
+        from . import chatbot as runtime
+
+        return Response(runtime.latency.report(self.get_object().pk))
+
+
+class ChatbotConversationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = ChatbotConversation.objects.select_related('chatbot', 'customer').prefetch_related('messages')
     serializer_class = ChatbotConversationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -96,19 +220,62 @@ class ChatbotConversationViewSet(viewsets.ModelViewSet):
     ordering_fields = ['started_at', 'ended_at', 'created_at']
     ordering = ['-started_at']
 
+    @action(detail=True, methods=['post'])
+    def end(self, request, pk=None):
+        """End an active conversation ({status}: completed, escalated or abandoned)"""
+        from .transcripts import CLOSED_STATUSES, end
+
+        conversation = self.get_object()
+        closing = request.data.get('status', 'completed')
+        if closing not in CLOSED_STATUSES:
+            return Response(
+                {'error': f'status must be one of: {", ".join(CLOSED_STATUSES)}'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not end(conversation, closing):
+            return Response({'error': 'This conversation has already ended'}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(conversation).data)
+
 
-class ChatbotMessageViewSet(viewsets.ModelViewSet):
+class ChatbotMessageViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ChatbotMessage.objects.all()
     serializer_class = ChatbotMessageSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['conversation', 'message_type', 'sender_type']
+    filterset_fields = ['conversation', 'message_type']
     search_fields = ['content']
-    ordering_fields = ['timestamp', 'created_at']
+    ordering_fields = ['timestamp']
     ordering = ['conversation', 'timestamp']
 
+    def filter_queryset(self, queryset):
+        # A compacted conversation's messages are read from its transcript
+        conversation = self.request.query_params.get('conversation')
+        if self.action == 'list' and conversation:
+            from .transcripts import archived_messages
+
+            try:
+                messages = archived_messages(conversation)
+            except DjangoValidationError:
+                messages = None
+            if messages is not None:
+                return self._filter_archived(queryset, messages)
+        return super().filter_queryset(queryset)
+
+    def _filter_archived(self, queryset, messages):
+        # The same message_type, search and ordering parameters the filter backends apply to rows
+        message_type = self.request.query_params.get('message_type')
+        terms = [term.lower() for term in SearchFilter().get_search_terms(self.request)]
+        messages = [
+            message for message in messages
+            if (not message_type or message.message_type == message_type)
+            and all(term in message.content.lower() for term in terms)
+        ]
+        for field in reversed(OrderingFilter().get_ordering(self.request, queryset, self) or []):
+            attname = ChatbotMessage._meta.get_field(field.lstrip('-')).attname
+            messages.sort(key=lambda message: getattr(message, attname), reverse=field.startswith('-'))
+        return messages
 
-class PersonalizationRuleViewSet(viewsets.ModelViewSet):
+
+class PersonalizationRuleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = PersonalizationRule.objects.all()
     serializer_class = PersonalizationRuleSerializer
     permission_classes = [IsAuthenticated]
@@ -125,13 +292,57 @@ class PersonalizationRuleViewSet(viewsets.ModelViewSet):
         rule.save()
         return Response({'status': 'Rule activated'})
 
+    @action(detail=False, methods=['post'])
+    def evaluate(self, request):
+        """Get the personalization for a customer and/or request context"""
+        from .personalization import personalize
+
+        context = request.data.get('context') or {}
+        if not isinstance(context, dict):
+            return Response({'error': 'context must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        customer = request.data.get('customer')
+        try:
+            if customer and not Customer.objects.filter(pk=customer).exists():
+                return Response({'error': 'Unknown customer'}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError:
+            return Response({'error': 'Invalid customer id'}, status=status.HTTP_400_BAD_REQUEST)
+        matches, elapsed = personalize(customer or None, context)
+        return Response({'matches': matches, 'evaluation_us': round(elapsed, 1)})
+
+    @action(detail=False, methods=['post'], url_path='evaluate-audience')
+    def evaluate_audience(self, request):
+        """Evaluate the active rules for the given customers, or every active customer"""
+        from .personalization import evaluate_audience
+
+        context = request.data.get('context') or {}
+        customers = request.data.get('customers')
+        if not isinstance(context, dict):
+            return Response({'error': 'context must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        if customers and not isinstance(customers, list):
+            return Response({'error': 'customers must be a list of ids'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            audience = Customer.objects.filter(is_active=True)
+            if customers:
+                audience = Customer.objects.filter(pk__in=customers)
+            assignments = evaluate_audience(audience.values_list('id', flat=True), context)
+        except DjangoValidationError as exc:
+            return Response({'error': exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+        counts = {}
+        for rules in assignments.values():
+            for rule in rules:
+                counts[rule] = counts.get(rule, 0) + 1
+        result = {'evaluated': len(assignments), 'rules': counts}
+        if customers:
+            result['assignments'] = assignments
+        return Response(result)
+
 
-class AIRecommendationViewSet(viewsets.ModelViewSet):
+class AIRecommendationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = AIRecommendation.objects.all()
     serializer_class = AIRecommendationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['recommendation_type', 'customer', 'ai_model', 'is_implemented']
+    filterset_fields = ['recommendation_type', 'customer', 'ai_model', 'is_delivered', 'is_acted_upon']
     search_fields = ['title', 'description']
     ordering_fields = ['confidence_score', 'created_at']
     ordering = ['-confidence_score', '-created_at']
@@ -139,13 +350,46 @@ class AIRecommendationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def implement(self, request, pk=None):
         recommendation = self.get_object()
-        recommendation.is_implemented = True
-        recommendation.implemented_at = timezone.now()
+        recommendation.is_acted_upon = True
+        recommendation.acted_upon_at = timezone.now()
         recommendation.save()
         return Response({'status': 'Recommendation implemented'})
 
+    @action(detail=False, methods=['get'], url_path='for-customer')
+    @cache_response(AIRecommendation)
+    def for_customer(self, request):
+        """Get a customer's top current recommendations (?customer=&limit=)"""
+        from .recommendations import top_for_customer
+
+        customer = request.query_params.get('customer')
+        if not customer:
+            return Response({'error': 'customer is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+            recommendations = list(top_for_customer(customer, limit))
+        except (ValueError, DjangoValidationError):
+            return Response({'error': 'Invalid customer or limit'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(recommendations, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Queue recomputing engine recommendations for the given customers, or all of them"""
+        from . import recommendations
+
+        customers = request.data.get('customers')
+        try:
+            known = None
+            if customers:
+                known = list(Customer.objects.filter(pk__in=customers).values_list('id', flat=True))
+            recommendations.start(known)
+        except recommendations.AlreadyGenerating:
+            return Response({'error': 'Recommendations are already being generated'}, status=status.HTTP_409_CONFLICT)
+        except DjangoValidationError as exc:
+            return Response({'error': exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'Generation started'}, status=status.HTTP_202_ACCEPTED)
+
 
-class AITrainingDataViewSet(viewsets.ModelViewSet):
+class AITrainingDataViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = AITrainingData.objects.all()
     serializer_class = AITrainingDataSerializer
     permission_classes = [IsAuthenticated]
@@ -156,7 +400,7 @@ class AITrainingDataViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class AIModelPerformanceViewSet(viewsets.ModelViewSet):
+class AIModelPerformanceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = AIModelPerformance.objects.all()
     serializer_class = AIModelPerformanceSerializer
     permission_classes = [IsAuthenticated]
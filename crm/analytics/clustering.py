@@ -0,0 +1,124 @@
+"""
+Near-duplicate clustering of ``ProductFeedback``.
+
+Each row's title and description are hashed into word unigrams and bigrams
+(``HashingVectorizer``, so there is no vocabulary to fit or store). MinHash
+signatures over those shingle sets are computed for all rows at once and cut
+into LSH bands: only rows sharing a band bucket, and of the same feedback
+type, become candidate pairs, which keeps the job far below comparing every
+pair of rows. Candidates are confirmed by the cosine similarity of their hashed
+TF-IDF vectors, and confirmed pairs are merged with union-find.
+
+Every member of a cluster, singletons included, points at its oldest row
+through ``cluster``, so one item per cluster can be listed with its count.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import ProductFeedback
+
+
+PERMUTATIONS = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 Jaccard almost always collide
+PRIME = (1 << 31) - 1
+SEED = 1009
+CHUNK = 2000
+
+_shingles = HashingVectorizer(
+    ngram_range=(1, 2), n_features=1 << 22, binary=True, norm=None, alternate_sign=False, stop_words='english',
+)
+_terms = HashingVectorizer(n_features=1 << 20, norm=None, alternate_sign=False, stop_words='english')
+
+
+def texts(rows):
+    return [f'{title} {description}' for _, title, description, _ in rows]
+
+
+def minhash(shingles):
+    """``(rows, PERMUTATIONS)`` MinHash signatures of a binary sparse matrix."""
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, PRIME, PERMUTATIONS, dtype=np.int64)
+    b = rng.integers(0, PRIME, PERMUTATIONS, dtype=np.int64)
+    signatures = np.full((shingles.shape[0], PERMUTATIONS), PRIME, dtype=np.int64)
+    for start in range(0, shingles.shape[0], CHUNK):
+        chunk = shingles[start:start + CHUNK]
+        if not chunk.nnz:
+            continue
+        hashed = (np.outer(chunk.indices.astype(np.int64), a) + b) % PRIME
+        filled = np.flatnonzero(np.diff(chunk.indptr))
+        signatures[start + filled] = np.minimum.reduceat(hashed, chunk.indptr[filled], axis=0)
+    return signatures
+
+
+def candidate_pairs(signatures, groups):
+    """
+    ``(pairs, 2)`` array linking rows that share an LSH band bucket within the
+    same group. Each bucket member is paired with the bucket's first row only,
+    so a large group of duplicates costs a linear number of comparisons.
+    """
+    width = PERMUTATIONS // BANDS
+    codes = np.unique(np.asarray(groups), return_inverse=True)[1].ravel()
+    # Rows without a single shingle would all share every bucket.
+    hashed = np.flatnonzero(signatures[:, 0] < PRIME)
+    found = [np.empty((0, 2), dtype=np.int64)]
+    for band in range(BANDS):
+        keys = np.column_stack([codes[hashed], signatures[hashed, band * width:(band + 1) * width]])
+        bucket = np.unique(keys, axis=0, return_inverse=True)[1].ravel()
+        heads = np.full(bucket.max() + 1 if len(bucket) else 0, len(signatures))
+        np.minimum.at(heads, bucket, hashed)
+        head = heads[bucket]
+        linked = head != hashed
+        found.append(np.column_stack([head[linked], hashed[linked]]))
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def cosine(vectors, pairs):
+    if not len(pairs):
+        return np.empty(0)
+    return np.asarray(vectors[pairs[:, 0]].multiply(vectors[pairs[:, 1]]).sum(axis=1)).ravel()
+
+
+def _root(parents, row):
+    while parents[row] != row:
+        parents[row] = parents[parents[row]]
+        row = parents[row]
+    return row
+
+
+def clusters(rows, threshold=None):
+    """Representative row index for every row of ``[(pk, title, description, type)]``."""
+    threshold = settings.FEEDBACK_CLUSTER_SIMILARITY if threshold is None else threshold
+    if not rows:
+        return []
+    documents = texts(rows)
+    signatures = minhash(_shingles.transform(documents).tocsr())
+    pairs = candidate_pairs(signatures, [kind for *_, kind in rows])
+    vectors = TfidfTransformer().fit_transform(_terms.transform(documents)).tocsr()
+    parents = list(range(len(rows)))
+    for (first, second), similarity in zip(pairs, cosine(vectors, pairs)):
+        if similarity >= threshold:
+            first, second = _root(parents, first), _root(parents, second)
+            # Rows arrive oldest first, so the lower index is the older row.
+            parents[max(first, second)] = min(first, second)
+    return [_root(parents, row) for row in range(len(rows))]
+
+
+def cluster_feedback(threshold=None):
+    """Recluster all feedback; returns ``(rows, clusters, rows reassigned)``."""
+    rows = list(ProductFeedback.objects.order_by('created_at', 'pk').values_list('pk', 'title', 'description', 'type'))
+    representatives = clusters(rows, threshold)
+    current = dict(ProductFeedback.objects.values_list('pk', 'cluster_id'))
+    changed = []
+    for (pk, *_), representative in zip(rows, representatives):
+        cluster = rows[representative][0]
+        if current.get(pk) != cluster:
+            changed.append(ProductFeedback(pk=pk, cluster_id=cluster))
+    with transaction.atomic():
+        ProductFeedback.objects.bulk_update(changed, ['cluster'], batch_size=1000)
+    if changed:
+        bump_tags([model_tag(ProductFeedback)])
+    return len(rows), len(set(representatives)), len(changed)
@@ -0,0 +1,95 @@
+"""
+Lexicon sentiment scoring, kept free of Django so pool workers import it cheaply.
+
+Texts are tokenized once; a token within three words after a negator is
+flipped (``not good`` counts as negative). A batch becomes one sparse
+document-term matrix over the lexicon, and its product with the weight
+vector gives every document's raw score. Raw scores are squashed into a
+compound in (-1, 1) the way VADER does. Keywords are each document's
+highest TF-IDF terms within its batch.
+"""
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+POSITIVE = {
+    'amazing': 3, 'awesome': 3, 'excellent': 3, 'fantastic': 3, 'love': 3, 'perfect': 3, 'outstanding': 3,
+    'great': 2, 'happy': 2, 'helpful': 2, 'pleased': 2, 'recommend': 2, 'satisfied': 2, 'wonderful': 2,
+    'thanks': 2, 'thank': 2, 'impressed': 2, 'friendly': 2, 'resolved': 2, 'glad': 2, 'best': 2,
+    'good': 1, 'nice': 1, 'fast': 1, 'quick': 1, 'easy': 1, 'fine': 1, 'works': 1, 'fixed': 1,
+    'smooth': 1, 'useful': 1, 'like': 1, 'appreciate': 2, 'reliable': 2, 'responsive': 1,
+}
+NEGATIVE = {
+    'awful': -3, 'terrible': -3, 'horrible': -3, 'hate': -3, 'worst': -3, 'useless': -3, 'furious': -3,
+    'angry': -2, 'bad': -2, 'broken': -2, 'disappointed': -2, 'frustrated': -2, 'frustrating': -2,
+    'poor': -2, 'refund': -1, 'cancel': -2, 'unhappy': -2, 'annoying': -2, 'rude': -2, 'fail': -2,
+    'failed': -2, 'failure': -2, 'crash': -2, 'crashes': -2, 'bug': -1, 'error': -1, 'issue': -1,
+    'problem': -1, 'slow': -1, 'confusing': -1, 'difficult': -1, 'delay': -1, 'late': -1, 'expensive': -1,
+    'missing': -1, 'wrong': -2, 'complaint': -2, 'unacceptable': -3,
+}
+NEGATORS = {'not', 'no', 'never', 'nothing', 'none', "don't", "doesn't", "didn't", "isn't", "wasn't", "can't", "won't"}
+NEGATION_SPAN = 3
+NEUTRAL_BAND = 0.05
+KEYWORDS = 5
+
+TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+LEXICON = {**POSITIVE, **NEGATIVE}
+VOCABULARY = sorted(LEXICON) + [f'not_{word}' for word in sorted(LEXICON)]
+WEIGHTS = np.array([LEXICON[word] for word in sorted(LEXICON)] + [-LEXICON[word] for word in sorted(LEXICON)], dtype=float)
+
+
+def tokens(text):
+    """Lowercase tokens with lexicon words after a negator prefixed ``not_``."""
+    words = TOKEN.findall(text.lower())
+    marked, remaining = [], 0
+    for word in words:
+        if word in NEGATORS:
+            remaining = NEGATION_SPAN
+            continue
+        if remaining and word in LEXICON:
+            marked.append(f'not_{word}')
+        else:
+            marked.append(word)
+        remaining = max(remaining - 1, 0)
+    return marked
+
+
+_counter = CountVectorizer(vocabulary=VOCABULARY, tokenizer=tokens, lowercase=False, token_pattern=None)
+
+
+def scores(texts):
+    """Compound score in (-1, 1) for every text."""
+    raw = _counter.transform(texts) @ WEIGHTS
+    return raw / np.sqrt(raw * raw + 15)
+
+
+def keywords(texts, top=KEYWORDS):
+    """Highest-weighted TF-IDF terms of each text, relative to the batch."""
+    vectorizer = TfidfVectorizer(stop_words='english', token_pattern=r'(?u)\b[a-zA-Z][a-zA-Z]{2,}\b')
+    try:
+        matrix = vectorizer.fit_transform(texts).tocsr()
+    except ValueError:  # Nothing but stop words in the whole batch
+        return [[] for _ in texts]
+    terms = vectorizer.get_feature_names_out()
+    found = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        weights = matrix.data[start:end]
+        if end - start > top:
+            best = np.argpartition(-weights, top - 1)[:top]
+        else:
+            best = np.arange(end - start)
+        best = best[np.argsort(-weights[best], kind='stable')]
+        found.append([str(terms[matrix.indices[start + index]]) for index in best])
+    return found
+
+
+def analyze(texts):
+    """``(sentiment, confidence, keywords)`` for every text."""
+    compound = scores(texts)
+    labels = np.where(compound >= NEUTRAL_BAND, 'positive', np.where(compound <= -NEUTRAL_BAND, 'negative', 'neutral'))
+    strength = np.abs(compound)
+    confidence = np.where(labels == 'neutral', 1 - strength / NEUTRAL_BAND / 2, 0.5 + strength / 2)
+    return list(zip(labels.tolist(), np.round(confidence, 2).tolist(), keywords(texts)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.analytics.sentiment import SOURCES, run
+
+
+class Command(BaseCommand):
+    help = 'Score the sentiment of text written since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', choices=sorted(SOURCES), help='Only this source (repeatable)')
+        parser.add_argument('--full', action='store_true', help='Ignore the watermarks and rescore everything')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--workers', type=int)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+        written = run(options['source'], options['full'], options['batch_size'], options['workers'])
+        for source, count in written.items():
+            self.stdout.write(f'{source}: {count} analyzed')
+        self.stdout.write(self.style.SUCCESS(f'Analyzed {sum(written.values())} text(s)'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.analytics.clustering import cluster_feedback
+
+
+class Command(BaseCommand):
+    help = 'Group near-duplicate product feedback into clusters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, help='Cosine similarity at which rows are merged')
+
+    def handle(self, *args, **options):
+        rows, clusters, changed = cluster_feedback(options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} feedback row(s) in {clusters} cluster(s); {changed} reassigned'
+        ))
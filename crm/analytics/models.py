@@ -68,16 +68,31 @@ class SentimentAnalysis(models.Model):
     confidence_score = models.DecimalField(max_digits=3, decimal_places=2)
     text_content = models.TextField()
     keywords = models.JSONField(default=list)
+    source_object_id = models.CharField(max_length=64, null=True, blank=True)  # Row analyzed by the batch pipeline
     date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'crm_sentiment_analysis'
         ordering = ['-date']
+        unique_together = ['source', 'source_object_id']
 
     def __str__(self):
         return f"{self.customer.full_name} - {self.sentiment} ({self.source})"
 
 
+class SentimentWatermark(models.Model):
+    """Newest row of each source the sentiment pipeline has analyzed."""
+    source = models.CharField(max_length=100, unique=True)
+    processed_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'crm_sentiment_watermarks'
+
+    def __str__(self):
+        return f"{self.source} until {self.processed_until}"
+
+
 class ProductFeedback(models.Model):
     """Model for tracking product feedback."""
     FEEDBACK_TYPES = [
@@ -104,6 +119,8 @@ class ProductFeedback(models.Model):
     rating = models.IntegerField(null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(5)])
     status = models.CharField(max_length=20, default='open')
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Oldest row of this row's near-duplicate cluster, set by analytics.clustering
+    cluster = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='cluster_members')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,113 @@
+"""
+Batch sentiment analysis.
+
+Text written to interactions, public ticket responses, customer feedback and
+survey answers is read in ``(created_at, pk)`` order from each source's
+``SentimentWatermark``, scored by ``lexicon.analyze`` in a process pool (or
+inline with ``SENTIMENT_WORKERS`` = 0) and upserted into
+``SentimentAnalysis`` keyed by ``(source, source_object_id)``. The watermark
+advances after every saved batch, so an interrupted run resumes where it
+stopped. Each run re-reads a few seconds before the watermark to catch rows
+committed late, and the upsert makes that overlap harmless.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+
+from crm.core.cache import bump_tags, model_tag
+from crm.core.models import Interaction
+from crm.support.models import CustomerFeedback, TicketResponse
+from crm.surveys.models import SurveyAnswer
+
+from . import lexicon
+from .models import SentimentAnalysis, SentimentWatermark
+
+
+OVERLAP = timedelta(seconds=5)
+
+# source: (rows, text field, customer field)
+SOURCES = {
+    'interaction': (Interaction.objects.all(), 'description', 'customer_id'),
+    'support': (TicketResponse.objects.filter(is_internal=False), 'message', 'ticket__customer_id'),
+    'feedback': (CustomerFeedback.objects.all(), 'comment', 'customer_id'),
+    'survey': (SurveyAnswer.objects.all(), 'answer_text', 'response__customer_id'),
+}
+
+
+def pages(source, since, size):
+    """``[(pk, created_at, customer_id, text)]`` pages after ``since``, oldest first."""
+    rows, text_field, customer_field = SOURCES[source]
+    rows = rows.exclude(**{text_field: ''}).filter(**{f'{customer_field}__isnull': False})
+    if since is not None:
+        rows = rows.filter(created_at__gte=since)
+    rows = rows.order_by('created_at', 'pk').values_list('pk', 'created_at', customer_field, text_field)
+    last = None
+    while True:
+        # Keyset pages keep no cursor open while results are written.
+        page = rows if last is None else rows.filter(
+            Q(created_at__gt=last[1]) | Q(created_at=last[1], pk__gt=last[0]),
+        )
+        page = list(page[:size])
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def _save(source, page, results):
+    SentimentAnalysis.objects.bulk_create(
+        [
+            SentimentAnalysis(
+                customer_id=customer_id, source=source, source_object_id=str(pk),
+                sentiment=sentiment, confidence_score=Decimal(str(confidence)),
+                text_content=text, keywords=keywords,
+            )
+            for (pk, _, customer_id, text), (sentiment, confidence, keywords) in zip(page, results)
+        ],
+        batch_size=1000, update_conflicts=True, unique_fields=['source', 'source_object_id'],
+        update_fields=['sentiment', 'confidence_score', 'text_content', 'keywords'],
+    )
+    SentimentWatermark.objects.update_or_create(source=source, defaults={'processed_until': page[-1][1]})
+    return len(page)
+
+
+def analyze_source(source, pool=None, workers=0, full=False, batch_size=None):
+    """Analyze a source's rows newer than its watermark; returns how many were written."""
+    batch_size = batch_size or settings.SENTIMENT_BATCH_SIZE
+    watermark = None if full else SentimentWatermark.objects.filter(source=source).first()
+    since = watermark.processed_until - OVERLAP if watermark else None
+    written = 0
+    if pool is None:
+        for page in pages(source, since, batch_size):
+            written += _save(source, page, lexicon.analyze([row[3] for row in page]))
+        return written
+    pending = []
+    for page in pages(source, since, batch_size):
+        # The next page is read while workers score earlier ones.
+        pending.append((page, pool.submit(lexicon.analyze, [row[3] for row in page])))
+        if len(pending) > workers:
+            page, future = pending.pop(0)
+            written += _save(source, page, future.result())
+    for page, future in pending:
+        written += _save(source, page, future.result())
+    return written
+
+
+def run(sources=None, full=False, batch_size=None, workers=None):
+    """Analyze every source (or ``sources``); returns rows written per source."""
+    workers = settings.SENTIMENT_WORKERS if workers is None else workers
+    written = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        for source in sources or SOURCES:
+            written[source] = analyze_source(source, pool, workers, full, batch_size)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if any(written.values()):
+        bump_tags([model_tag(SentimentAnalysis), model_tag(SentimentWatermark)])
+    return written
+
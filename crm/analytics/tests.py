@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from crm.core.models import Company, Customer, Interaction, User as CRMUser
+from crm.support.models import SupportTicket, TicketResponse
+
+from . import clustering, sentiment
+from .models import ProductFeedback, SentimentAnalysis, SentimentWatermark
+
+
+class SentimentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('analyst')
+        cls.author = CRMUser.objects.create(username='analyst')
+        cls.customer = Customer.objects.create(
+            company=Company.objects.create(name='Acme'), first_name='Ada', last_name='Byron',
+            email='ada@example.com',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def interaction(self, description, minutes_ago):
+        interaction = Interaction.objects.create(
+            customer=self.customer, user=self.author, type='call', subject='Call', description=description,
+        )
+        # Older than the re-read overlap, so a run after it leaves the row alone.
+        created_at = self.now - timedelta(minutes=minutes_ago)
+        Interaction.objects.filter(pk=interaction.pk).update(created_at=created_at)
+        return interaction.pk, created_at
+
+    def run_interactions(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            return sentiment.run(sources=['interaction'], workers=0, **options)['interaction']
+
+    def test_first_run_scores_every_row_and_sets_the_watermark(self):
+        first, _ = self.interaction('Great service, very helpful', 30)
+        second, last = self.interaction('Terrible delay, really frustrated', 20)
+        self.interaction('', 10)
+        self.assertEqual(self.run_interactions(), 2)
+        self.assertEqual(SentimentWatermark.objects.get(source='interaction').processed_until, last)
+        results = dict(SentimentAnalysis.objects.values_list('source_object_id', 'sentiment'))
+        self.assertEqual(results, {str(first): 'positive', str(second): 'negative'})
+
+    def test_next_run_only_reads_from_the_watermark(self):
+        self.interaction('Great service', 30)
+        self.interaction('Awful service', 20)
+        self.run_interactions()
+        newest, created_at = self.interaction('Nice and quick', 1)
+        # The watermark row is re-read; the older one is not.
+        self.assertEqual(self.run_interactions(), 2)
+        self.assertEqual(SentimentWatermark.objects.get(source='interaction').processed_until, created_at)
+        self.assertTrue(SentimentAnalysis.objects.filter(source_object_id=str(newest)).exists())
+        self.assertEqual(SentimentAnalysis.objects.count(), 3)
+
+    def test_rows_inside_the_overlap_are_read_again(self):
+        self.interaction('Great service', 30)
+        self.run_interactions()
+        late = Interaction.objects.create(
+            customer=self.customer, user=self.author, type='call', subject='Call', description='Broken again',
+        )
+        Interaction.objects.filter(pk=late.pk).update(
+            created_at=self.now - timedelta(minutes=30) - sentiment.OVERLAP / 2,
+        )
+        self.assertEqual(self.run_interactions(), 2)
+        self.assertEqual(SentimentAnalysis.objects.get(source_object_id=str(late.pk)).sentiment, 'negative')
+
+    def test_full_run_rescores_everything_in_place(self):
+        pk, _ = self.interaction('Great service', 30)
+        self.interaction('Awful service', 20)
+        self.run_interactions()
+        Interaction.objects.filter(pk=pk).update(description='Useless and broken')
+        self.assertEqual(self.run_interactions(full=True), 2)
+        self.assertEqual(SentimentAnalysis.objects.count(), 2)
+        self.assertEqual(SentimentAnalysis.objects.get(source_object_id=str(pk)).sentiment, 'negative')
+
+    def test_internal_ticket_notes_are_skipped(self):
+        ticket = SupportTicket.objects.create(
+            customer=self.customer, title='Login', description='Cannot log in', ticket_type='bug',
+        )
+        public = TicketResponse.objects.create(ticket=ticket, user=self.user, message='Glad it is fixed, thanks')
+        TicketResponse.objects.create(ticket=ticket, user=self.user, message='Customer is rude', is_internal=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            written = sentiment.run(sources=['support'], workers=0)
+        self.assertEqual(written, {'support': 1})
+        analysis = SentimentAnalysis.objects.get(source='support')
+        self.assertEqual((analysis.source_object_id, analysis.customer_id), (str(public.pk), self.customer.pk))
+
+
+class ClusteringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            company=Company.objects.create(name='Acme'), first_name='Ada', last_name='Byron',
+            email='ada@example.com',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def feedback(self, title, description, kind='bug', minutes_ago=0):
+        feedback = ProductFeedback.objects.create(
+            customer=self.customer, type=kind, title=title, description=description,
+        )
+        ProductFeedback.objects.filter(pk=feedback.pk).update(created_at=self.now - timedelta(minutes=minutes_ago))
+        return feedback.pk
+
+    def cluster(self, threshold=0.5):
+        with self.captureOnCommitCallbacks(execute=True):
+            return clustering.cluster_feedback(threshold)
+
+    def clusters(self):
+        return dict(ProductFeedback.objects.values_list('pk', 'cluster_id'))
+
+    def test_near_duplicates_point_at_the_oldest_row(self):
+        newer = self.feedback(
+            'Export to CSV crashes', 'The CSV export crashes on large reports every time', minutes_ago=5,
+        )
+        oldest = self.feedback('CSV export crashes', 'CSV export crashes on large reports every time', minutes_ago=10)
+        other = self.feedback('Dark mode', 'Please add a dark mode to the dashboard settings page', minutes_ago=1)
+        self.assertEqual(self.cluster(), (3, 2, 3))
+        self.assertEqual(self.clusters(), {oldest: oldest, newer: oldest, other: other})
+
+    def test_different_types_never_share_a_cluster(self):
+        bug = self.feedback('CSV export crashes', 'CSV export crashes on large reports every time', minutes_ago=10)
+        request = self.feedback(
+            'CSV export crashes', 'CSV export crashes on large reports every time', kind='feature', minutes_ago=5,
+        )
+        self.assertEqual(self.cluster(), (2, 2, 2))
+        self.assertEqual(self.clusters(), {bug: bug, request: request})
+
+    def test_threshold_keeps_loose_matches_apart(self):
+        first = self.feedback('Slow search', 'Search on the customer list is slow with many filters', minutes_ago=10)
+        second = self.feedback('Slow search', 'Search on the customer list is slow', minutes_ago=5)
+        self.assertEqual(self.cluster(threshold=1.0)[1], 2)
+        self.assertEqual(self.cluster(threshold=0.5)[1], 1)
+        self.assertEqual(self.clusters(), {first: first, second: first})
+
+    def test_unchanged_rows_are_not_rewritten(self):
+        self.feedback('CSV export crashes', 'CSV export crashes on large reports', minutes_ago=10)
+        self.feedback('CSV export crashes', 'CSV export crashes on large reports', minutes_ago=5)
+        self.assertEqual(self.cluster()[2], 2)
+        self.assertEqual(self.cluster()[2], 0)
+
+    def test_rows_without_words_stay_alone(self):
+        blank = [self.feedback('The', 'and the', minutes_ago=minutes) for minutes in (10, 5)]
+        self.assertEqual(clustering.clusters([(pk, 'The', 'and the', 'bug') for pk in blank]), [0, 1])
@@ -1,6 +1,13 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
 from . import views
 
+router = DefaultRouter()
+router.register(r'churn-risks', views.ChurnRiskViewSet)
+router.register(r'customer-metrics', views.CustomerMetricsViewSet)
+router.register(r'sentiment', views.SentimentAnalysisViewSet)
+router.register(r'product-feedback', views.ProductFeedbackViewSet)
+
 urlpatterns = [
-    # Analytics endpoints will be added here
+    path('', include(router.urls)),
 ]
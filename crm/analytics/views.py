@@ -4,17 +4,19 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Avg, Count, Sum
+from crm.core.conditional import ConditionalGetMixin
+from django.db.models import Avg, Count, Max, Sum
 from .models import (
     ChurnRisk, CustomerMetrics, SentimentAnalysis, ProductFeedback
 )
+from crm.core.cache import cache_response
 from .serializers import (
     ChurnRiskSerializer, CustomerMetricsSerializer, SentimentAnalysisSerializer,
     ProductFeedbackSerializer
 )
 
 
-class ChurnRiskViewSet(viewsets.ModelViewSet):
+class ChurnRiskViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ChurnRisk.objects.all()
     serializer_class = ChurnRiskSerializer
     permission_classes = [IsAuthenticated]
@@ -32,6 +34,7 @@ class ChurnRiskViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cache_response(ChurnRisk)
     def risk_distribution(self, request):
         """Get churn risk distribution"""
         distribution = self.get_queryset().values('risk_level').annotate(
@@ -40,7 +43,7 @@ class ChurnRiskViewSet(viewsets.ModelViewSet):
         return Response(distribution)
 
 
-class CustomerMetricsViewSet(viewsets.ModelViewSet):
+class CustomerMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerMetrics.objects.all()
     serializer_class = CustomerMetricsSerializer
     permission_classes = [IsAuthenticated]
@@ -68,7 +71,7 @@ class CustomerMetricsViewSet(viewsets.ModelViewSet):
         })
 
 
-class SentimentAnalysisViewSet(viewsets.ModelViewSet):
+class SentimentAnalysisViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SentimentAnalysis.objects.all()
     serializer_class = SentimentAnalysisSerializer
     permission_classes = [IsAuthenticated]
@@ -95,12 +98,12 @@ class SentimentAnalysisViewSet(viewsets.ModelViewSet):
         })
 
 
-class ProductFeedbackViewSet(viewsets.ModelViewSet):
+class ProductFeedbackViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ProductFeedback.objects.all()
     serializer_class = ProductFeedbackSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['customer', 'type', 'priority']
+    filterset_fields = ['customer', 'type', 'priority', 'cluster']
     search_fields = ['title', 'description', 'customer__full_name']
     ordering_fields = ['priority', 'rating', 'created_at']
     ordering = ['-priority', '-created_at']
@@ -120,8 +123,32 @@ class ProductFeedbackViewSet(viewsets.ModelViewSet):
             avg_rating=Avg('rating')
         )['avg_rating'] or 0
         
+        clusters = self.get_queryset().exclude(cluster=None).values('cluster').distinct().count()
+
         return Response({
             'feedback_by_type': feedback_counts,
             'feedback_by_priority': priority_counts,
-            'average_rating': avg_rating
+            'average_rating': avg_rating,
+            'clusters': clusters
+        })
+
+    @action(detail=False, methods=['get'])
+    @cache_response(ProductFeedback)
+    def clusters(self, request):
+        """Get one item per near-duplicate cluster with its size, largest first (?type=&limit=)"""
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        feedback = self.get_queryset().exclude(cluster=None)
+        if request.query_params.get('type'):
+            feedback = feedback.filter(type=request.query_params['type'])
+        clusters = feedback.values(
+            'cluster', 'cluster__title', 'cluster__type', 'cluster__priority',
+        ).annotate(
+            count=Count('id'), average_rating=Avg('rating'), latest=Max('created_at'),
+        ).order_by('-count', '-latest')[:max(limit, 0)]
+        return Response({
+            'clusters': list(clusters),
+            'unclustered': self.get_queryset().filter(cluster=None).count(),
         })
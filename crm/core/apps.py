@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.core'
+
+    def ready(self):
+        from . import checks  # noqa: F401  Registers the system checks
+        from . import dashboard, notifications, realtime
+        from .conditional import track_crm_models
+        track_crm_models()
+        realtime.connect_signals()
+        dashboard.connect_signals()
+        notifications.connect_signals()
@@ -0,0 +1,172 @@
+"""
+Response caching for read-heavy endpoints.
+
+Cached responses are keyed by endpoint, normalized query parameters and the
+current version of every dependency tag. A tag is a model label; saving or
+deleting a row of that model bumps its version, so stale entries simply stop
+being addressed and age out through the cache backend's LRU/TTL eviction.
+
+Versions move only once the writing transaction commits, so a reader can
+never cache uncommitted data under the new version. Every process must see
+the same counters and bump them atomically, which needs a shared cache with an
+atomic ``incr`` (redis or memcached). The file cache is shared but
+increments by reading and rewriting the entry, so concurrent bumps can be
+lost; the ``crm.E001`` system check refuses it, like the per-process locmem
+cache, when ``WEB_CONCURRENCY`` is above one.
+
+``QuerySet.update()`` and ``bulk_create()`` do not send model signals; code
+that writes that way must call ``bump_tags`` itself.
+"""
+import hashlib
+import json
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+
+TAG_VERSION_PREFIX = 'crm:tag-version:'
+RESPONSE_PREFIX = 'crm:response:'
+
+
+def model_tag(model):
+    """Dependency tag used for a model class."""
+    return model._meta.label_lower
+
+
+def _initial_version():
+    # Start from a clock value rather than 0 so an evicted counter can never
+    # come back at a value that old cache keys were built with.
+    return time.time_ns()
+
+
+def get_tag_versions(tags):
+    """Return the current version for each tag, initializing missing ones."""
+    keys = {TAG_VERSION_PREFIX + tag: tag for tag in tags}
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, tag in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def _bump(tags):
+    for tag in tags:
+        key = TAG_VERSION_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def bump_tags(tags):
+    """Invalidate everything cached under the given tags once the current transaction commits."""
+    tags = list(tags)
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def _bump_sender(sender, **kwargs):
+    bump_tags([model_tag(sender)])
+
+
+_tracked_models = set()
+_tracked_lock = threading.Lock()
+
+
+def track_models(*models):
+    """Bump a model's tag whenever one of its rows is saved or deleted."""
+    with _tracked_lock:
+        for model in models:
+            if model in _tracked_models:
+                continue
+            uid = f'crm.cache.{model_tag(model)}'
+            post_save.connect(_bump_sender, sender=model, weak=False, dispatch_uid=uid)
+            post_delete.connect(_bump_sender, sender=model, weak=False, dispatch_uid=uid)
+            _tracked_models.add(model)
+
+
+class CacheStats:
+    """Per-endpoint hit/miss counters for the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, endpoint, hit):
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            items = {endpoint: list(counts) for endpoint, counts in self._counts.items()}
+        stats = {}
+        for endpoint, (hits, misses) in sorted(items.items()):
+            total = hits + misses
+            stats[endpoint] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / total if total else 0,
+            }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def build_cache_key(endpoint, request, view_kwargs, versions, user=None):
+    """Key a response by endpoint, sorted query params, URL kwargs and tag versions."""
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    payload = json.dumps(
+        [endpoint, params, sorted(view_kwargs.items()), sorted(versions.items()), user],
+        default=str,
+    )
+    return RESPONSE_PREFIX + hashlib.sha1(payload.encode()).hexdigest()
+
+
+def cache_response(*models, timeout=None, vary_on_user=False):
+    """
+    Cache a ViewSet action's response until one of ``models`` changes.
+
+    ``timeout`` defaults to ``settings.RESPONSE_CACHE_TIMEOUT``. Set
+    ``vary_on_user`` for endpoints whose result depends on ``request.user``.
+    """
+    tags = [model_tag(model) for model in models]
+    track_models(*models)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            endpoint = f'{type(self).__name__}.{func.__name__}'
+            user = getattr(request.user, 'pk', None) if vary_on_user else None
+            key = build_cache_key(endpoint, request, kwargs, get_tag_versions(tags), user)
+            data = cache.get(key)
+            if data is not None:
+                stats.record(endpoint, hit=True)
+                return Response(data)
+
+            stats.record(endpoint, hit=False)
+            response = func(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                if isinstance(response.data, QuerySet):
+                    response.data = list(response.data)
+                cache.set(
+                    key, response.data,
+                    settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout,
+                )
+            return response
+        return wrapper
+    return decorator
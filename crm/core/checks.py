@@ -0,0 +1,44 @@
+"""
+System checks for settings the cache versioning depends on.
+
+Table versions (``crm.core.cache``) drive both response caching and ETags,
+so every worker must read the same counters and bump them atomically. A
+per-process locmem cache lets a worker that never saw a write keep answering
+304 with old data; the file cache is shared, but its ``incr`` is a read
+followed by a write, so two workers bumping at once can lose a version. The
+dummy cache stores no counters at all.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+ATOMIC_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+NULL_BACKENDS = ('django.core.cache.backends.dummy.DummyCache',)
+
+
+@register()
+def check_version_cache(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in NULL_BACKENDS:
+        return [Error(
+            'The default cache stores nothing, so table versions never change and ETags go stale.',
+            hint="Set CACHE_BACKEND to 'locmem' for a single worker, or 'redis'.",
+            id='crm.E002',
+        )]
+    if backend not in ATOMIC_BACKENDS and settings.WEB_CONCURRENCY > 1:
+        if backend in LOCAL_BACKENDS:
+            problem = 'workers would keep their own table versions'
+        else:
+            problem = 'its incr is not atomic, so concurrent bumps can lose a table version'
+        return [Error(
+            f'The default cache cannot share table versions between the {settings.WEB_CONCURRENCY} '
+            f'workers of WEB_CONCURRENCY: {problem} and serve stale responses and 304s.',
+            hint="Set CACHE_BACKEND to 'redis' (or use a memcached backend).",
+            id='crm.E001',
+        )]
+    return []
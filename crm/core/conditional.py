@@ -0,0 +1,99 @@
+"""
+Conditional GET support for ViewSets.
+
+Every model in the ``crm`` apps carries a table version counter (see
+``crm.core.cache``) that is bumped on each save or delete. ``list`` and
+``retrieve`` derive an ETag from the versions of the tables a response can
+read, so a matching ``If-None-Match`` is answered with ``304 Not Modified``
+before any query or serializer runs. The versions must come from a cache
+shared by all workers (system check ``crm.E001``), otherwise a worker that
+never saw a write would keep answering 304.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_tag_versions, model_tag, track_models
+
+
+def track_crm_models():
+    """Keep a version counter for every crm model and both user tables."""
+    models = [model for model in apps.get_models() if model.__module__.startswith('crm.')]
+    models.append(apps.get_model('auth', 'User'))
+    models.append(get_user_model())
+    track_models(*models)
+
+
+@lru_cache(maxsize=None)
+def table_dependencies(model):
+    """
+    Tables whose rows can appear in a serialized ``model`` instance.
+
+    Follows foreign keys transitively (nested serializers render related
+    objects) and adds reverse relations one level deep (counts and nested
+    child lists).
+    """
+    seen = {model}
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        for field in current._meta.get_fields():
+            related = field.related_model
+            if not field.is_relation or related is None or related in seen:
+                continue
+            if field.concrete:
+                seen.add(related)
+                pending.append(related)
+            elif current is model:
+                seen.add(related)
+    return tuple(sorted((model_tag(related) for related in seen)))
+
+
+class ConditionalGetMixin:
+    """Answer unchanged ``list``/``retrieve`` requests with 304 via table versions."""
+
+    # Extra models to include in the ETag when a serializer reads tables that
+    # are not reachable through the queryset model's relations.
+    etag_dependencies = ()
+
+    def get_etag_tags(self):
+        tags = set(table_dependencies(self.queryset.model))
+        tags.update(model_tag(model) for model in self.etag_dependencies)
+        return sorted(tags)
+
+    def get_etag(self, request):
+        versions = get_tag_versions(self.get_etag_tags())
+        params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        payload = json.dumps(
+            [request.path, params, getattr(request.user, 'pk', None), sorted(versions.items())],
+            default=str,
+        )
+        return quote_etag(hashlib.sha1(payload.encode()).hexdigest())
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        # Versions are read before the query runs so a concurrent write can
+        # only make the ETag older than the data, never newer.
+        etag = self.get_etag(request)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            client_etags = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+            if etag in client_etags or '*' in client_etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
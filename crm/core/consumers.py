@@ -3,16 +3,26 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from .models import Notification, Task, Interaction
+from .dashboard import state as dashboard_state
+from .realtime import DASHBOARD_GROUP, bind_event_loop, crm_user_id, notification_group
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time notifications."""
     
+    group_name = None
+
     async def connect(self):
         """Handle WebSocket connection."""
         if self.scope["user"].is_authenticated:
+            user_id = await database_sync_to_async(crm_user_id)(self.scope["user"])
+            if user_id is None:
+                await self.close()
+                return
+            bind_event_loop()
+            self.group_name = notification_group(user_id)
             await self.channel_layer.group_add(
-                f"user_{self.scope['user'].id}",
+                self.group_name,
                 self.channel_name
             )
             await self.accept()
@@ -21,9 +31,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
-        if self.scope["user"].is_authenticated:
+        if self.group_name:
             await self.channel_layer.group_discard(
-                f"user_{self.scope['user'].id}",
+                self.group_name,
                 self.channel_name
             )
 
@@ -32,24 +42,32 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         pass
 
     async def notification_message(self, event):
-        """Send notification to WebSocket."""
+        """Send the notifications coalesced in one publish window."""
         await self.send(text_data=json.dumps({
             'type': 'notification',
-            'message': event['message']
+            'messages': event['events']
         }))
 
 
 class DashboardConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for real-time dashboard updates."""
+    """
+    WebSocket consumer for real-time dashboard updates.
+
+    Clients receive a ``dashboard_snapshot`` on connect, then ``dashboard_patch``
+    messages whose JSON Patch ops apply in ``seq`` order. On a sequence gap a
+    client sends ``{"action": "resync"}`` to get a fresh snapshot.
+    """
     
     async def connect(self):
         """Handle WebSocket connection."""
         if self.scope["user"].is_authenticated:
+            bind_event_loop()
             await self.channel_layer.group_add(
-                "dashboard_updates",
+                DASHBOARD_GROUP,
                 self.channel_name
             )
             await self.accept()
+            await self.send_snapshot()
         else:
             await self.close()
 
@@ -57,17 +75,31 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         """Handle WebSocket disconnection."""
         if self.scope["user"].is_authenticated:
             await self.channel_layer.group_discard(
-                "dashboard_updates",
+                DASHBOARD_GROUP,
                 self.channel_name
             )
 
     async def receive(self, text_data):
         """Handle incoming WebSocket messages."""
-        pass
+        try:
+            message = json.loads(text_data)
+        except (TypeError, ValueError):
+            return
+        if isinstance(message, dict) and message.get('action') == 'resync':
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        """Send the full dashboard state and the sequence it reflects."""
+        snapshot = await database_sync_to_async(dashboard_state.snapshot)()
+        await self.send(text_data=json.dumps({
+            'type': 'dashboard_snapshot',
+            'seq': snapshot['seq'],
+            'data': snapshot['data']
+        }))
 
     async def dashboard_update(self, event):
-        """Send dashboard update to WebSocket."""
+        """Send the dashboard patches coalesced in one publish window."""
         await self.send(text_data=json.dumps({
-            'type': 'dashboard_update',
-            'data': event['data']
+            'type': 'dashboard_patch',
+            'patches': event['events']
         }))
@@ -0,0 +1,294 @@
+"""
+Incrementally maintained dashboard state.
+
+The payload served by ``DashboardViewSet.stats`` is kept in the cache and
+updated from model signals: counters move by the delta a single write causes,
+and the two top-10 lists are re-read only when the written row can enter,
+leave or move within them. Each change is pushed to dashboard subscribers as
+a JSON Patch (RFC 6902) tagged with a sequence number; a client that sees a
+gap asks for a resync and receives the full snapshot with its sequence.
+
+Counters are derived from single-row deltas, so writes that bypass signals
+(``update()``, ``bulk_create()``) and the sliding seven-day window are only
+picked up when the snapshot is rebuilt after ``DASHBOARD_SNAPSHOT_TTL``
+seconds. A rebuild is diffed against the previous snapshot and published
+like any other change.
+
+Every read-modify-write of the snapshot runs under a lock held in the same
+cache (``cache.add`` of ``LOCK_KEY``), so workers of a multi-process
+deployment serialize their updates as long as they share the cache, which
+the ``crm.E001`` check already requires.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Company, Customer, Interaction, Task
+from .realtime import DASHBOARD_GROUP, publisher
+
+
+SNAPSHOT_KEY = 'crm:dashboard:snapshot'
+SEQUENCE_KEY = 'crm:dashboard:seq'
+LOCK_KEY = 'crm:dashboard:lock'
+# A holder that dies keeps the lock at most this long.
+LOCK_TIMEOUT = 30
+LIST_SIZE = 10
+ACTIVE_TASK_STATUSES = ('pending', 'in_progress')
+PENDING_INTERACTION_DAYS = 7
+
+_datetime = serializers.DateTimeField()
+
+
+def _recent_cutoff():
+    return timezone.now() - timedelta(days=PENDING_INTERACTION_DAYS)
+
+
+# counter name -> (model, fields read, predicate over those fields)
+COUNTERS = {
+    'total_customers': (Customer, ('is_active',), lambda row: row['is_active']),
+    'total_companies': (Company, ('is_active',), lambda row: row['is_active']),
+    'active_tasks': (Task, ('status',), lambda row: row['status'] in ACTIVE_TASK_STATUSES),
+    'pending_interactions': (Interaction, ('date',), lambda row: row['date'] >= _recent_cutoff()),
+}
+
+TRACKED_FIELDS = {
+    Customer: ('is_active',),
+    Company: ('is_active',),
+    Task: ('status', 'due_date'),
+    Interaction: ('date',),
+}
+
+
+def count_customers():
+    return Customer.objects.filter(is_active=True).count()
+
+
+def count_companies():
+    return Company.objects.filter(is_active=True).count()
+
+
+def count_active_tasks():
+    return Task.objects.filter(status__in=ACTIVE_TASK_STATUSES).count()
+
+
+def count_pending_interactions():
+    return Interaction.objects.filter(date__gte=_recent_cutoff()).count()
+
+
+def recent_activities():
+    interactions = Interaction.objects.select_related('customer', 'user').order_by('-date')[:LIST_SIZE]
+    return [
+        {
+            'type': 'interaction',
+            'id': str(interaction.id),
+            'title': f"{interaction.type.title()} with {interaction.customer.full_name}",
+            'date': _datetime.to_representation(interaction.date),
+            'user': interaction.user.get_full_name(),
+        }
+        for interaction in interactions
+    ]
+
+
+def upcoming_deadlines():
+    tasks = Task.objects.select_related('assigned_to').filter(
+        due_date__gte=timezone.now(),
+        status__in=ACTIVE_TASK_STATUSES,
+    ).order_by('due_date')[:LIST_SIZE]
+    return [
+        {
+            'type': 'task',
+            'id': str(task.id),
+            'title': task.title,
+            'due_date': _datetime.to_representation(task.due_date),
+            'priority': task.priority,
+            'assigned_to': task.assigned_to.get_full_name(),
+        }
+        for task in tasks
+    ]
+
+
+def compute_stats():
+    """Full dashboard payload read straight from the database."""
+    return {
+        'total_customers': count_customers(),
+        'total_companies': count_companies(),
+        'active_tasks': count_active_tasks(),
+        'pending_interactions': count_pending_interactions(),
+        'recent_activities': recent_activities(),
+        'upcoming_deadlines': upcoming_deadlines(),
+    }
+
+
+def diff_list(path, old, new):
+    """JSON Patch ops turning ``old`` into ``new``; items are matched by ``id``."""
+    ops = []
+    work = list(old)
+    new_ids = {item['id'] for item in new}
+    for index in range(len(work) - 1, -1, -1):
+        if work[index]['id'] not in new_ids:
+            del work[index]
+            ops.append({'op': 'remove', 'path': f'{path}/{index}'})
+    for index, item in enumerate(new):
+        if index < len(work) and work[index]['id'] == item['id']:
+            if work[index] != item:
+                work[index] = item
+                ops.append({'op': 'replace', 'path': f'{path}/{index}', 'value': item})
+            continue
+        for current, existing in enumerate(work):
+            if existing['id'] == item['id']:
+                del work[current]
+                ops.append({'op': 'remove', 'path': f'{path}/{current}'})
+                break
+        work.insert(index, item)
+        ops.append({'op': 'add', 'path': f'{path}/{index}', 'value': item})
+    return ops
+
+
+def diff_stats(old, new):
+    ops = []
+    for name in COUNTERS:
+        if old[name] != new[name]:
+            ops.append({'op': 'replace', 'path': f'/{name}', 'value': new[name]})
+    for name in ('recent_activities', 'upcoming_deadlines'):
+        ops.extend(diff_list(f'/{name}', old[name], new[name]))
+    return ops
+
+
+def _parse(value):
+    return _datetime.to_internal_value(value)
+
+
+def _recent_activities_affected(items, row):
+    if any(item['id'] == row['id'] for item in items):
+        return True
+    return len(items) < LIST_SIZE or row['date'] >= _parse(items[-1]['date'])
+
+
+def _upcoming_deadlines_affected(items, row):
+    if any(item['id'] == row['id'] for item in items):
+        return True
+    if row['status'] not in ACTIVE_TASK_STATUSES or row['due_date'] < timezone.now():
+        return False
+    return len(items) < LIST_SIZE or row['due_date'] <= _parse(items[-1]['due_date'])
+
+
+LISTS = {
+    Interaction: ('recent_activities', recent_activities, _recent_activities_affected),
+    Task: ('upcoming_deadlines', upcoming_deadlines, _upcoming_deadlines_affected),
+}
+
+
+class DashboardState:
+    """Cached dashboard snapshot plus the sequence number of its last patch."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @contextmanager
+    def _lock(self):
+        token = uuid.uuid4().hex
+        while not cache.add(LOCK_KEY, token, timeout=LOCK_TIMEOUT):
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if cache.get(LOCK_KEY) == token:
+                cache.delete(LOCK_KEY)
+
+    def _next_sequence(self):
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        return cache.incr(SEQUENCE_KEY)
+
+    def _store(self, seq, data):
+        state = {'seq': seq, 'built_at': time.time(), 'data': data}
+        cache.set(SNAPSHOT_KEY, state, timeout=None)
+        return state
+
+    def _load(self):
+        """Return the current state and any ops produced by rebuilding it."""
+        state = cache.get(SNAPSHOT_KEY)
+        if state is not None and time.time() - state['built_at'] < self.ttl:
+            return state, []
+        data = compute_stats()
+        if state is None:
+            ops = [{'op': 'replace', 'path': '', 'value': data}]
+        else:
+            ops = diff_stats(state['data'], data)
+        return self._store(state['seq'] if state else 0, data), ops
+
+    def snapshot(self):
+        """Current payload and sequence number, for (re)syncing a client."""
+        with self._lock():
+            state, ops = self._load()
+            if ops:
+                state = self._commit(state, ops)
+        return {'seq': state['seq'], 'data': state['data']}
+
+    def _commit(self, state, ops):
+        state = self._store(self._next_sequence(), state['data'])
+        publisher.publish(DASHBOARD_GROUP, 'dashboard.update', {'seq': state['seq'], 'ops': ops})
+        return state
+
+    def apply(self, model, old, new):
+        """Fold one row change into the snapshot and publish the resulting patch."""
+        with self._lock():
+            state, ops = self._load()
+            data = dict(state['data'])
+            for name, (counter_model, fields, predicate) in COUNTERS.items():
+                if counter_model is not model:
+                    continue
+                delta = (1 if new and predicate(new) else 0) - (1 if old and predicate(old) else 0)
+                data[name] = max(0, data[name] + delta)
+            if model in LISTS:
+                name, reload, affected = LISTS[model]
+                if any(row and affected(data[name], row) for row in (old, new)):
+                    data[name] = reload()
+            ops.extend(diff_stats(state['data'], data))
+            if ops:
+                state['data'] = data
+                self._commit(state, ops)
+
+
+state = DashboardState(settings.DASHBOARD_SNAPSHOT_TTL)
+
+
+def _row(instance):
+    row = {field: getattr(instance, field) for field in TRACKED_FIELDS[type(instance)]}
+    row['id'] = str(instance.pk)
+    return row
+
+
+def remember_previous(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._dashboard_previous = None
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS[sender]).first()
+    if previous is not None:
+        previous['id'] = str(instance.pk)
+    instance._dashboard_previous = previous
+
+
+def record_save(sender, instance, **kwargs):
+    old, new = getattr(instance, '_dashboard_previous', None), _row(instance)
+    transaction.on_commit(lambda: state.apply(sender, old, new))
+
+
+def record_delete(sender, instance, **kwargs):
+    old = _row(instance)
+    transaction.on_commit(lambda: state.apply(sender, old, None))
+
+
+def connect_signals():
+    for model in TRACKED_FIELDS:
+        uid = f'crm.dashboard.{model._meta.label_lower}'
+        pre_save.connect(remember_previous, sender=model, dispatch_uid=uid)
+        post_save.connect(record_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(record_delete, sender=model, dispatch_uid=uid)
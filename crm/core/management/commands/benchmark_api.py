@@ -0,0 +1,182 @@
+import json
+import logging
+import math
+import re
+import subprocess
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+
+
+NAMED_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """
+    ``execute_wrapper`` that counts statements. Unlike ``connection.queries``
+    it does not depend on DEBUG or the capped query log, which stops growing
+    once a long run has logged 9000 queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def iter_router_endpoints(resolver=None, prefix=''):
+    """Yield (route, pattern) for every GET endpoint registered through a DRF router."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern).lstrip('^')
+        if isinstance(pattern, URLResolver):
+            yield from iter_router_endpoints(pattern, route)
+        elif isinstance(pattern, URLPattern):
+            view_class = getattr(pattern.callback, 'cls', None)
+            actions = getattr(pattern.callback, 'actions', None) or {}
+            if view_class is None or 'get' not in actions or '(?P<format>' in route:
+                continue
+            yield route.rstrip('$'), pattern
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every router GET endpoint with the Django test client and record a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint')
+        parser.add_argument('--filter', default='', help='Only benchmark routes containing this string')
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results')
+        parser.add_argument('--compare', help='Baseline JSON file to compare the new results against')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative p95 slowdown that counts as a regression (0.2 = 20%%)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when a regression is detected')
+
+    def handle(self, *args, **options):
+        # Failing endpoints are recorded by status code; their tracebacks would drown the report.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        client = Client(SERVER_NAME='localhost', raise_request_exception=False)
+        user, _ = AuthUser.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        client.force_login(user)
+
+        results = {}
+        for route, pattern in iter_router_endpoints():
+            if options['filter'] not in route:
+                continue
+            url = self.build_url(route, pattern)
+            if url is None:
+                results[route] = {'skipped': 'no rows to use as a detail key'}
+                continue
+            results[route] = self.measure(client, url, options['iterations'], options['warmup'])
+            stats = results[route]
+            self.stdout.write(
+                f"{stats['status']:>3} p50={stats['p50_ms']:>8.2f}ms p95={stats['p95_ms']:>8.2f}ms "
+                f"p99={stats['p99_ms']:>8.2f}ms queries={stats['queries']:>4}  {route}"
+            )
+
+        report = {
+            'meta': {
+                'commit': self.git_commit(),
+                'recorded_at': datetime.now(dt_timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} endpoints to {options['output']}"))
+
+        if options['compare']:
+            regressions = self.compare(options['compare'], results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} endpoint(s) regressed')
+
+    def build_url(self, route, pattern):
+        kwargs = {}
+        for name in NAMED_GROUP.findall(route):
+            if name != 'pk':
+                return None
+            model = pattern.callback.cls.queryset.model
+            pk = model.objects.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            kwargs[name] = str(pk)
+        return '/' + NAMED_GROUP.sub(lambda match: kwargs[match.group(1)], route)
+
+    def measure(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        timings, query_counts = [], []
+        status = None
+        for _ in range(iterations):
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(queries.count)
+            status = response.status_code
+        timings.sort()
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'p99_ms': percentile(timings, 99),
+            'mean_ms': sum(timings) / len(timings),
+            'queries': max(query_counts),
+        }
+
+    def compare(self, baseline_path, results, threshold):
+        try:
+            with open(baseline_path) as handle:
+                baseline = json.load(handle)['endpoints']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Could not read baseline {baseline_path}: {exc}')
+
+        regressions = []
+        for route, current in sorted(results.items()):
+            previous = baseline.get(route)
+            if not previous or 'p95_ms' not in previous or 'p95_ms' not in current:
+                continue
+            slowdown = (current['p95_ms'] - previous['p95_ms']) / max(previous['p95_ms'], 0.001)
+            extra_queries = current['queries'] - previous['queries']
+            if slowdown > threshold or extra_queries > 0:
+                regressions.append(route)
+                self.stdout.write(self.style.WARNING(
+                    f"REGRESSION {route}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f}ms "
+                    f"({slowdown:+.0%}), queries {previous['queries']} -> {current['queries']}"
+                ))
+            elif slowdown < -threshold or extra_queries < 0:
+                self.stdout.write(self.style.SUCCESS(
+                    f"IMPROVED {route}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f}ms "
+                    f"({slowdown:+.0%}), queries {previous['queries']} -> {current['queries']}"
+                ))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+        return regressions
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
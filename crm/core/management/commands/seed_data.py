@@ -0,0 +1,652 @@
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as AuthUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from crm.ai.models import (
+    AIModel, AIRecommendation, Chatbot, ChatbotConversation, ChatbotMessage, PredictiveScore
+)
+from crm.analytics.models import ChurnRisk, CustomerMetrics, ProductFeedback, SentimentAnalysis
+from crm.core.models import Company, Customer, Interaction, Notification, Task, User
+from crm.marketing.models import (
+    EmailCampaign, EmailSend, EmailSubscriber, MarketingCampaign, MarketingMetrics
+)
+from crm.sales.models import Deal, Lead, Opportunity, SalesActivity, SalesForecast, SalesPipeline
+from crm.support.models import (
+    CustomerFeedback, ServiceLevelAgreement, SupportMetrics, SupportTeam, SupportTicket, TicketResponse
+)
+from crm.support.numbering import ticket_number_batch
+from crm.surveys.models import NPSScore, Survey, SurveyAnswer, SurveyQuestion, SurveyResponse
+
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Priya', 'Wei',
+    'Ahmed', 'Fatima', 'Carlos', 'Sofia', 'Kenji', 'Yuki', 'Olga', 'Ivan', 'Amara', 'Kwame',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Patel', 'Chen', 'Khan', 'Silva', 'Tanaka', 'Petrov', 'Okafor', 'Mensah', 'Nguyen', 'Kim',
+]
+COMPANY_WORDS = [
+    'Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Vandelay', 'Soylent', 'Cyberdyne',
+    'Tyrell', 'Wonka', 'Aperture', 'Massive', 'Dynamic', 'Quantum', 'Blue', 'Summit', 'Vertex', 'Nimbus',
+]
+COMPANY_SUFFIXES = ['Inc', 'LLC', 'Group', 'Labs', 'Systems', 'Holdings', 'Partners', 'Solutions']
+INDUSTRIES = [
+    'Technology', 'Healthcare', 'Finance', 'Retail', 'Manufacturing', 'Education',
+    'Logistics', 'Energy', 'Media', 'Hospitality',
+]
+SIZES = ['1-10', '11-50', '51-200', '201-1000', '1000+']
+DEPARTMENTS = ['Sales', 'Support', 'Marketing', 'Success', 'Engineering', 'Finance']
+POSITIONS = ['Manager', 'Director', 'Analyst', 'Engineer', 'VP', 'Coordinator', 'Specialist']
+SOURCES = ['website', 'referral', 'social_media', 'cold_call', 'email_campaign', 'trade_show', 'advertising']
+PRODUCTS = ['Starter Plan', 'Growth Plan', 'Enterprise Plan', 'Analytics Add-on', 'Support Plus', 'Onboarding']
+SENTENCES = [
+    'Customer asked about pricing for the next renewal.',
+    'Great call, they are very happy with the onboarding experience.',
+    'Reported an issue with the export feature, frustrated with the delay.',
+    'Requested a demo of the analytics dashboard for their team.',
+    'Discussed integration options with their existing tools.',
+    'Complained that support response times were too slow.',
+    'Excellent feedback on the new reporting module.',
+    'Needs help configuring single sign-on for their users.',
+    'Asked for a discount on annual billing.',
+    'Interested in upgrading to the enterprise plan next quarter.',
+]
+
+# Root row counts at --scale 1.0; together with the fixed fan-outs below this
+# produces roughly three million rows.
+SCALE_COUNTS = {
+    'users': 200,
+    'companies': 10000,
+    'leads': 50000,
+    'email_campaigns': 200,
+    'surveys': 100,
+    'chatbot_conversations': 20000,
+}
+CUSTOMERS_PER_COMPANY = 10
+INTERACTIONS_PER_CUSTOMER = 5
+TASKS_PER_CUSTOMER = 2
+SENDS_PER_SUBSCRIBER = 5
+TICKETS_PER_CUSTOMER = 1
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, internally consistent synthetic dataset using bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplier applied to the default row counts (1.0 is about 3M rows)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk INSERT')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed so runs are reproducible')
+        parser.add_argument('--run-label', default=None,
+                            help='Suffix for unique names (usernames, emails, numbers); random by default so '
+                                 'the command can be run again on a seeded database')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.counts = {}
+        self.run = options['run_label'] or uuid.uuid4().hex[:6]
+        n = {key: max(1, int(value * options['scale'])) for key, value in SCALE_COUNTS.items()}
+
+        self.seed_users(n['users'])
+        self.seed_companies_and_customers(n['companies'], CUSTOMERS_PER_COMPANY)
+        self.seed_activity(INTERACTIONS_PER_CUSTOMER, TASKS_PER_CUSTOMER)
+        self.seed_sales(n['leads'])
+        self.seed_marketing(n['email_campaigns'], SENDS_PER_SUBSCRIBER)
+        self.seed_support(TICKETS_PER_CUSTOMER)
+        self.seed_analytics()
+        self.seed_surveys(n['surveys'])
+        self.seed_ai(n['chatbot_conversations'])
+
+        total = sum(self.counts.values())
+        for label, count in sorted(self.counts.items()):
+            self.stdout.write(f'{label:<24} {count:>10}')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {total} rows (run {self.run})'))
+
+    # Helpers
+
+    def bulk(self, model, rows, ignore_conflicts=False):
+        """
+        Insert an iterable of unsaved instances in batches. ``ignore_conflicts``
+        is for shared rows (pipeline, SLAs, daily metrics) an earlier run may
+        already have written.
+
+        ``bulk_create`` stamps ``auto_now_add``/``auto_now`` fields with the
+        current time, so values set on the instances for those fields are
+        written back with a ``bulk_update`` in the same transaction. Unset
+        ``auto_now`` fields take the row's latest preset timestamp.
+        """
+        stamped = [
+            field.attname for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False) or getattr(field, 'auto_now', False)
+        ]
+        rows = iter(rows)
+        inserted = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            # Shared rows may belong to an earlier run; their timestamps are left alone.
+            presets = [] if ignore_conflicts else [
+                {name: getattr(instance, name) for name in stamped if getattr(instance, name) is not None}
+                for instance in batch
+            ]
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size, ignore_conflicts=ignore_conflicts)
+                backdated = []
+                for instance, preset in zip(batch, presets):
+                    if preset and instance.pk is not None:
+                        latest = max(preset.values())
+                        for name in stamped:
+                            setattr(instance, name, preset.get(name, latest))
+                        backdated.append(instance)
+                if backdated:
+                    model.objects.bulk_update(backdated, stamped, batch_size=self.batch_size)
+            inserted += len(batch)
+        self.counts[model._meta.label] = self.counts.get(model._meta.label, 0) + inserted
+        return inserted
+
+    def past(self, days=365, since=0):
+        """A moment between ``since`` and ``days`` days ago."""
+        return self.now - timedelta(days=since + self.rng.random() * (days - since))
+
+    def before(self, moment, days):
+        """A moment up to ``days`` before ``moment`` (or before now, if ``moment`` is later)."""
+        return min(self.now, moment) - timedelta(days=self.rng.random() * days)
+
+    def after(self, moment, hours):
+        """A moment up to ``hours`` after ``moment``, but not in the future."""
+        return min(self.now, moment + timedelta(hours=self.rng.random() * hours))
+
+    def future(self, days=90):
+        return self.now + timedelta(days=self.rng.random() * days)
+
+    def name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def sentence(self):
+        return self.rng.choice(SENTENCES)
+
+    def money(self, low, high):
+        return Decimal(self.rng.randint(low, high))
+
+    # Generators
+
+    def seed_users(self, count):
+        password = make_password('password')
+        crm_users, auth_users = [], []
+        for i in range(count):
+            first, last = self.name()
+            username = f'seed_user_{self.run}_{i}'
+            joined = self.past(1460, 1095)
+            crm_users.append(User(
+                username=username, first_name=first, last_name=last, password=password,
+                email=f'{username}@example.com', department=self.rng.choice(DEPARTMENTS),
+                position=self.rng.choice(POSITIONS), created_at=joined,
+            ))
+            auth_users.append(AuthUser(
+                username=username, first_name=first, last_name=last, password=password,
+                email=f'{username}@example.com', date_joined=joined,
+            ))
+        self.bulk(User, crm_users)
+        self.bulk(AuthUser, auth_users)
+        self.crm_user_ids = [user.id for user in crm_users]
+        self.auth_user_ids = list(
+            AuthUser.objects.filter(username__startswith=f'seed_user_{self.run}_').values_list('id', flat=True)
+        )
+
+    def seed_companies_and_customers(self, company_count, per_company):
+        self.company_ids = [uuid.uuid4() for _ in range(company_count)]
+        self.customers = []  # (id, company_id, email, first, last)
+        self.bulk(Company, (
+            Company(
+                id=company_id,
+                name=f'{self.rng.choice(COMPANY_WORDS)} {self.rng.choice(COMPANY_SUFFIXES)} {i}',
+                industry=self.rng.choice(INDUSTRIES), size=self.rng.choice(SIZES),
+                website=f'https://company{i}.example.com', email=f'info@company{i}.example.com',
+                is_active=self.rng.random() > 0.05, created_at=self.past(1095, 730),
+            )
+            for i, company_id in enumerate(self.company_ids)
+        ))
+
+        statuses = [choice for choice, _ in Customer.CUSTOMER_STATUS]
+
+        def customers():
+            for company_index, company_id in enumerate(self.company_ids):
+                for j in range(per_company):
+                    first, last = self.name()
+                    customer_id = uuid.uuid4()
+                    email = f'{first}.{last}.{self.run}.{company_index}.{j}@customer.example.com'.lower()
+                    self.customers.append((customer_id, company_id, email, first, last))
+                    yield Customer(
+                        id=customer_id, company_id=company_id, first_name=first, last_name=last,
+                        email=email, phone=f'+1555{self.rng.randint(1000000, 9999999)}',
+                        position=self.rng.choice(POSITIONS), status=self.rng.choice(statuses),
+                        source=self.rng.choice(SOURCES), assigned_to_id=self.rng.choice(self.crm_user_ids),
+                        created_at=self.past(730, 365),
+                    )
+
+        self.bulk(Customer, customers())
+
+    def seed_activity(self, interactions_per_customer, tasks_per_customer):
+        interaction_types = [choice for choice, _ in Interaction.INTERACTION_TYPES]
+        priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+        task_statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+        notification_types = [choice for choice, _ in Notification.NOTIFICATION_TYPES]
+
+        def interactions():
+            for customer_id, _, _, first, last in self.customers:
+                for _ in range(interactions_per_customer):
+                    date = self.past()
+                    yield Interaction(
+                        customer_id=customer_id, user_id=self.rng.choice(self.crm_user_ids),
+                        type=self.rng.choice(interaction_types), subject=f'Follow-up with {first} {last}',
+                        description=self.sentence(), date=date, duration=self.rng.randint(5, 90), created_at=date,
+                    )
+
+        def tasks():
+            for customer_id, _, _, first, last in self.customers:
+                for _ in range(tasks_per_customer):
+                    due_date = self.future() if self.rng.random() > 0.3 else self.past(30)
+                    yield Task(
+                        title=f'Check in with {first} {last}', description=self.sentence(),
+                        assigned_to_id=self.rng.choice(self.crm_user_ids), customer_id=customer_id,
+                        priority=self.rng.choice(priorities), status=self.rng.choice(task_statuses),
+                        due_date=due_date, created_by_id=self.rng.choice(self.crm_user_ids),
+                        created_at=self.before(due_date, 30),
+                    )
+
+        self.bulk(Interaction, interactions())
+        self.bulk(Task, tasks())
+        self.bulk(Notification, (
+            Notification(
+                user_id=self.rng.choice(self.crm_user_ids), type=self.rng.choice(notification_types),
+                title=f'Update on {first} {last}', message=self.sentence(),
+                is_read=self.rng.random() > 0.4, created_at=self.past(30),
+            )
+            for _, _, _, first, last in self.customers
+        ))
+
+    def seed_sales(self, lead_count):
+        lead_statuses = [choice for choice, _ in Lead.LEAD_STATUS]
+        stages = [choice for choice, _ in Opportunity.OPPORTUNITY_STAGES]
+
+        self.bulk(SalesPipeline, [SalesPipeline(
+            name='Default Pipeline', description='Standard B2B pipeline',
+            stages=[stage for stage in stages if stage != 'closed_lost'],
+        )], ignore_conflicts=True)
+
+        lead_ids = [uuid.uuid4() for _ in range(lead_count)]
+
+        def leads():
+            for i, lead_id in enumerate(lead_ids):
+                first, last = self.name()
+                yield Lead(
+                    id=lead_id, first_name=first, last_name=last,
+                    company_name=f'{self.rng.choice(COMPANY_WORDS)} {self.rng.choice(COMPANY_SUFFIXES)}',
+                    email=f'{first}.{last}.{self.run}.{i}@lead.example.com'.lower(),
+                    phone=f'+1555{self.rng.randint(1000000, 9999999)}', industry=self.rng.choice(INDUSTRIES),
+                    company_size=self.rng.choice(SIZES), lead_source=self.rng.choice(SOURCES),
+                    status=self.rng.choice(lead_statuses), lead_score=self.rng.randint(0, 100),
+                    budget=self.money(1000, 200000), assigned_to_id=self.rng.choice(self.auth_user_ids),
+                    created_by_id=self.rng.choice(self.auth_user_ids), created_at=self.past(),
+                )
+
+        self.bulk(Lead, leads())
+
+        opportunities = []
+        closed_at = {}
+        for lead_id in lead_ids:
+            customer_id = self.rng.choice(self.customers)[0]
+            stage = self.rng.choice(stages)
+            created_at = self.past()
+            opportunity = Opportunity(
+                lead_id=lead_id, customer_id=customer_id, title=self.rng.choice(PRODUCTS),
+                stage=stage, probability=100 if stage == 'closed_won' else self.rng.randint(5, 90),
+                amount=self.money(1000, 250000), expected_close_date=self.future(180).date(),
+                assigned_to_id=self.rng.choice(self.auth_user_ids),
+                created_by_id=self.rng.choice(self.auth_user_ids), created_at=created_at,
+            )
+            if stage.startswith('closed'):
+                closed_at[opportunity.id] = self.after(created_at, 24 * 180)
+                opportunity.actual_close_date = closed_at[opportunity.id].date()
+                opportunity.updated_at = closed_at[opportunity.id]
+            opportunities.append(opportunity)
+        self.bulk(Opportunity, opportunities)
+
+        won = [opportunity for opportunity in opportunities if opportunity.stage == 'closed_won']
+        self.bulk(Deal, (
+            Deal(
+                opportunity_id=opportunity.id, deal_number=f'DEAL-{self.run}-{i:08d}', title=opportunity.title,
+                status=self.rng.choice(['active', 'completed']), total_amount=opportunity.amount,
+                start_date=opportunity.actual_close_date,
+                end_date=opportunity.actual_close_date + timedelta(days=365),
+                assigned_to_id=opportunity.assigned_to_id, created_at=closed_at[opportunity.id],
+            )
+            for i, opportunity in enumerate(won)
+        ))
+        activity_types = [choice for choice, _ in SalesActivity.ACTIVITY_TYPES]
+
+        def activities():
+            for opportunity in opportunities:
+                for _ in range(2):
+                    scheduled = self.after(opportunity.created_at, 24 * 90)
+                    yield SalesActivity(
+                        opportunity_id=opportunity.id, customer_id=opportunity.customer_id,
+                        activity_type=self.rng.choice(activity_types), subject=f'{opportunity.title} touchpoint',
+                        description=self.sentence(), scheduled_date=scheduled,
+                        assigned_to_id=opportunity.assigned_to_id,
+                        created_at=max(opportunity.created_at, self.before(scheduled, 14)),
+                    )
+
+        self.bulk(SalesActivity, activities())
+        month_start = self.now.date().replace(day=1)
+        self.bulk(SalesForecast, (
+            SalesForecast(
+                period='monthly', start_date=month_start + timedelta(days=31 * i),
+                end_date=month_start + timedelta(days=31 * i + 30),
+                projected_revenue=self.money(100000, 1000000), confidence_level=self.rng.randint(40, 90),
+                created_by_id=self.rng.choice(self.auth_user_ids),
+            )
+            for i in range(12)
+        ))
+
+    def seed_marketing(self, campaign_count, sends_per_subscriber):
+        campaigns = []
+        for i in range(max(1, campaign_count // 4)):
+            start_date = self.past(180)
+            campaigns.append(MarketingCampaign(
+                name=f'Campaign {i}', campaign_type='email', status='active',
+                start_date=start_date, end_date=self.future(180), budget=self.money(1000, 50000),
+                created_by_id=self.rng.choice(self.auth_user_ids), created_at=self.before(start_date, 30),
+            ))
+        self.bulk(MarketingCampaign, campaigns)
+        email_campaigns = []
+        for i in range(campaign_count):
+            campaign = self.rng.choice(campaigns)
+            sent_at = self.after(campaign.start_date, 24 * 180)
+            email_campaigns.append(EmailCampaign(
+                campaign_id=campaign.id, name=f'Email {i}', email_type='newsletter',
+                subject_line=f'News for you #{i}', html_content='<p>Hello</p>', sender_name='CRM Team',
+                sender_email='team@example.com', sent_at=sent_at, created_at=self.before(sent_at, 14),
+            ))
+        self.bulk(EmailCampaign, email_campaigns)
+
+        subscriber_ids = [uuid.uuid4() for _ in self.customers]
+        self.bulk(EmailSubscriber, (
+            EmailSubscriber(
+                id=subscriber_id, email=email, first_name=first, last_name=last, source='crm',
+                subscribed_at=self.past(730, 365),
+            )
+            for subscriber_id, (_, _, email, first, last) in zip(subscriber_ids, self.customers)
+        ))
+        sample_size = min(sends_per_subscriber, len(email_campaigns))
+
+        def sends():
+            for subscriber_id, customer in zip(subscriber_ids, self.customers):
+                for email_campaign in self.rng.sample(email_campaigns, sample_size):
+                    delivered_at = self.after(email_campaign.sent_at, 1)
+                    opened_at = self.after(delivered_at, 24 * 14) if self.rng.random() > 0.6 else None
+                    yield EmailSend(
+                        email_campaign_id=email_campaign.id, subscriber_id=subscriber_id,
+                        customer_id=customer[0], sent_at=email_campaign.sent_at, delivered_at=delivered_at,
+                        opened_at=opened_at,
+                        clicked_at=self.after(opened_at, 48) if opened_at and self.rng.random() > 0.7 else None,
+                        bounced=self.rng.random() < 0.02,
+                    )
+
+        self.bulk(EmailSend, sends())
+        self.bulk(MarketingMetrics, (
+            MarketingMetrics(
+                campaign_id=campaign.id, date=(self.now - timedelta(days=day)).date(),
+                impressions=self.rng.randint(1000, 50000), clicks=self.rng.randint(10, 2000),
+                conversions=self.rng.randint(0, 200), cost=self.money(100, 5000),
+                created_at=self.now - timedelta(days=day),
+            )
+            for campaign in campaigns
+            for day in range(30)
+        ))
+
+    def seed_support(self, tickets_per_customer):
+        priorities = [choice for choice, _ in SupportTicket.PRIORITY_LEVELS]
+        ticket_statuses = [choice for choice, _ in SupportTicket.TICKET_STATUS]
+        ticket_types = [choice for choice, _ in SupportTicket.TICKET_TYPES]
+
+        self.bulk(ServiceLevelAgreement, (
+            ServiceLevelAgreement(
+                name=f'{priority.title()} SLA', priority=priority, response_time=hours,
+                resolution_time=hours * 8,
+                business_hours={'mon': ['09:00', '17:00'], 'tue': ['09:00', '17:00'],
+                                'wed': ['09:00', '17:00'], 'thu': ['09:00', '17:00'],
+                                'fri': ['09:00', '17:00']},
+            )
+            for priority, hours in zip(priorities, [24, 8, 4, 2, 1])
+        ), ignore_conflicts=True)
+        self.bulk(SupportTeam, (
+            SupportTeam(
+                user_id=user_id, skills=self.rng.sample(ticket_types, 3),
+                specializations=self.rng.sample(INDUSTRIES, 2), max_tickets=self.rng.randint(5, 30),
+                created_at=self.past(730, 365),
+            )
+            for user_id in self.auth_user_ids[: len(self.auth_user_ids) // 2]
+        ))
+
+        tickets = []
+        replies = []
+        numbers = ticket_number_batch(len(self.customers) * tickets_per_customer)
+        for number, (customer_id, _, _, first, last) in zip(
+            numbers, (customer for customer in self.customers for _ in range(tickets_per_customer))
+        ):
+            status = self.rng.choice(ticket_statuses)
+            created_at = self.past()
+            resolved_at = self.after(created_at, 24 * 14) if status in ('resolved', 'closed') else None
+            closed_at = self.after(resolved_at, 72) if status == 'closed' else None
+            # Two replies each; the first public one is the ticket's first response.
+            ticket_replies = []
+            replied_at = created_at
+            for _ in range(2):
+                replied_at = self.after(replied_at, 24)
+                ticket_replies.append((replied_at, self.rng.random() < 0.2))
+            replies.append(ticket_replies)
+            tickets.append(SupportTicket(
+                ticket_number=number, customer_id=customer_id,
+                title=f'Issue reported by {first} {last}', description=self.sentence(),
+                ticket_type=self.rng.choice(ticket_types), priority=self.rng.choice(priorities),
+                status=status, assigned_to_id=self.rng.choice(self.auth_user_ids),
+                created_by_id=self.rng.choice(self.auth_user_ids), created_at=created_at,
+                due_date=created_at + timedelta(days=14), response_due_date=created_at + timedelta(days=1),
+                first_response_at=next((at for at, internal in ticket_replies if not internal), None),
+                resolved_at=resolved_at,
+                closed_at=closed_at, updated_at=closed_at or resolved_at or created_at,
+            ))
+        self.bulk(SupportTicket, tickets)
+
+        def responses():
+            for ticket, ticket_replies in zip(tickets, replies):
+                for replied_at, internal in ticket_replies:
+                    yield TicketResponse(
+                        ticket_id=ticket.id, user_id=ticket.assigned_to_id, message=self.sentence(),
+                        is_internal=internal, created_at=replied_at,
+                    )
+
+        self.bulk(TicketResponse, responses())
+        self.bulk(CustomerFeedback, (
+            CustomerFeedback(
+                customer_id=ticket.customer_id, feedback_type='ticket', rating=self.rng.randint(1, 5),
+                comment=self.sentence(), ticket_id=ticket.id, created_at=self.after(ticket.resolved_at, 72),
+            )
+            for ticket in tickets
+            if ticket.status in ('resolved', 'closed')
+        ))
+        self.bulk(SupportMetrics, (
+            SupportMetrics(
+                date=(self.now - timedelta(days=day)).date(), total_tickets=self.rng.randint(50, 500),
+                resolved_tickets=self.rng.randint(20, 400), avg_response_time=Decimal('2.50'),
+                avg_resolution_time=Decimal('18.00'), customer_satisfaction=Decimal('4.10'),
+            )
+            for day in range(365)
+        ), ignore_conflicts=True)
+
+    def seed_analytics(self):
+        risk_levels = [choice for choice, _ in ChurnRisk.RISK_LEVELS]
+        sentiments = [choice for choice, _ in SentimentAnalysis.SENTIMENT_TYPES]
+        feedback_types = [choice for choice, _ in ProductFeedback.FEEDBACK_TYPES]
+        today = self.now.date()
+
+        self.bulk(ChurnRisk, (
+            ChurnRisk(
+                customer_id=customer_id, risk_level=self.rng.choice(risk_levels),
+                risk_score=Decimal(self.rng.randint(0, 10000)) / 100,
+                factors={'inactivity_days': self.rng.randint(0, 120)}, created_at=self.past(30),
+            )
+            for customer_id, *_ in self.customers
+        ))
+        self.bulk(CustomerMetrics, (
+            CustomerMetrics(
+                customer_id=customer_id, date=today, login_frequency=self.rng.randint(0, 60),
+                support_tickets=self.rng.randint(0, 5),
+                satisfaction_score=Decimal(self.rng.randint(10, 50)) / 10,
+                revenue=self.money(0, 20000),
+            )
+            for customer_id, *_ in self.customers
+        ))
+        self.bulk(SentimentAnalysis, (
+            SentimentAnalysis(
+                customer_id=customer_id, source='email', sentiment=self.rng.choice(sentiments),
+                confidence_score=Decimal(self.rng.randint(50, 99)) / 100, text_content=self.sentence(),
+                keywords=['pricing', 'support'], date=self.past(),
+            )
+            for customer_id, *_ in self.customers
+        ))
+        self.bulk(ProductFeedback, (
+            ProductFeedback(
+                customer_id=customer_id, type=self.rng.choice(feedback_types),
+                title=f'{self.rng.choice(PRODUCTS)} feedback', description=self.sentence(),
+                rating=self.rng.randint(1, 5), created_at=self.past(),
+            )
+            for customer_id, *_ in self.customers[::5]
+        ))
+
+    def seed_surveys(self, survey_count):
+        survey_user = AuthUser.objects.get(pk=self.auth_user_ids[0])
+        surveys = [
+            Survey(
+                title=f'Quarterly NPS {self.run} {i}', survey_type='nps',
+                company_id=self.rng.choice(self.company_ids), created_by=survey_user,
+                created_at=self.past(365, 90),
+            )
+            for i in range(survey_count)
+        ]
+        self.bulk(Survey, surveys)
+        surveys = list(Survey.objects.filter(title__startswith=f'Quarterly NPS {self.run} ').order_by('id'))
+        questions = []
+        for survey in surveys:
+            questions.append(SurveyQuestion(
+                survey=survey, question_text='How likely are you to recommend us?',
+                question_type='nps', order=0, min_value=0, max_value=10,
+            ))
+            questions.append(SurveyQuestion(
+                survey=survey, question_text='What could we improve?', question_type='textarea', order=1,
+            ))
+        self.bulk(SurveyQuestion, questions)
+        questions_by_survey = {}
+        for question in SurveyQuestion.objects.filter(survey__in=surveys).order_by('order'):
+            questions_by_survey.setdefault(question.survey_id, []).append(question)
+
+        responses = []
+        for customer_id, company_id, email, first, last in self.customers[::2]:
+            completed_at = self.past(90)
+            responses.append(SurveyResponse(
+                survey=self.rng.choice(surveys), customer_id=customer_id, respondent_email=email,
+                respondent_name=f'{first} {last}', completed_at=completed_at, is_completed=True,
+                started_at=completed_at - timedelta(minutes=self.rng.randint(1, 30)),
+            ))
+        self.bulk(SurveyResponse, responses)
+
+        responses = SurveyResponse.objects.filter(survey__in=surveys).select_related('customer')
+        answers, scores = [], []
+        for response in responses.iterator(chunk_size=self.batch_size):
+            score = self.rng.randint(0, 10)
+            nps_question, text_question = questions_by_survey[response.survey_id]
+            answered_at = response.completed_at
+            answers.append(SurveyAnswer(
+                response=response, question=nps_question, answer_value=score, created_at=answered_at,
+            ))
+            answers.append(SurveyAnswer(
+                response=response, question=text_question, answer_text=self.sentence(), created_at=answered_at,
+            ))
+            scores.append(NPSScore(
+                customer_id=response.customer_id, company_id=response.customer.company_id,
+                score=score, survey_response=response, created_at=answered_at,
+            ))
+        self.bulk(SurveyAnswer, answers)
+        self.bulk(NPSScore, scores)
+
+    def seed_ai(self, conversation_count):
+        ai_model, created = AIModel.objects.get_or_create(
+            name='Seed churn model', version='1.0.0',
+            defaults={'model_type': 'churn_prediction', 'status': 'active', 'created_by_id': self.auth_user_ids[0]},
+        )
+        self.counts[AIModel._meta.label] = int(created)
+        chatbots = [
+            Chatbot(
+                name=f'Support bot {i}', bot_type='customer_support', platform='website',
+                training_data=[
+                    {'intent': 'pricing', 'examples': ['how much does it cost', 'pricing plans']},
+                    {'intent': 'support', 'examples': ['i need help', 'something is broken']},
+                ],
+                created_by_id=self.auth_user_ids[0], created_at=self.past(365, 180),
+            )
+            for i in range(10)
+        ]
+        self.bulk(Chatbot, chatbots)
+        conversations = []
+        for i in range(conversation_count):
+            started = self.past(90)
+            closed = self.rng.random() > 0.3
+            conversations.append(ChatbotConversation(
+                chatbot=self.rng.choice(chatbots), customer_id=self.rng.choice(self.customers)[0],
+                session_id=f'seed-session-{self.run}-{i}', status='completed' if closed else 'active',
+                started_at=started, ended_at=started + timedelta(minutes=15) if closed else None,
+            ))
+        self.bulk(ChatbotConversation, conversations)
+        self.bulk(ChatbotMessage, (
+            ChatbotMessage(
+                conversation=conversation, message_type='user' if j % 2 == 0 else 'bot',
+                content=self.sentence(), timestamp=conversation.started_at + timedelta(minutes=j),
+            )
+            for conversation in conversations
+            for j in range(10)
+        ))
+        self.bulk(PredictiveScore, (
+            PredictiveScore(
+                customer_id=customer_id, score_type='churn_risk',
+                score_value=Decimal(self.rng.randint(0, 10000)) / 100,
+                confidence_level=Decimal(self.rng.randint(5000, 9900)) / 100, ai_model=ai_model,
+                calculated_at=self.past(7), expires_at=self.future(30),
+            )
+            for customer_id, *_ in self.customers
+        ))
+        self.bulk(AIRecommendation, (
+            AIRecommendation(
+                customer_id=customer_id, recommendation_type='upsell',
+                title=f'Offer {self.rng.choice(PRODUCTS)}', description=self.sentence(),
+                confidence_score=Decimal(self.rng.randint(1000, 9999)) / 10000, ai_model=ai_model,
+                created_at=self.past(30),
+            )
+            for customer_id, *_ in self.customers
+        ))
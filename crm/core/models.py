@@ -187,6 +187,9 @@ class Notification(models.Model):
     class Meta:
         db_table = 'crm_notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read'], name='crm_notif_user_read_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} for {self.user.username}"
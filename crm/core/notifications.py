@@ -0,0 +1,120 @@
+"""
+Notification fan-out and per-user unread counters.
+
+``notify`` creates one notification per recipient with ``bulk_create`` and
+pushes them to connected clients. Each user's unread count is kept in the
+cache and adjusted as notifications are created or read; a missing or
+expired counter is recounted from the ``(user, is_read)`` index, which also
+reconciles any drift every ``NOTIFICATION_UNREAD_TTL`` seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .cache import bump_tags, model_tag
+from .models import Notification
+from .realtime import notification_group, notification_payload, publish_on_commit
+
+
+UNREAD_PREFIX = 'crm:notifications:unread:'
+BATCH_SIZE = 1000
+
+
+def _unread_key(user_id):
+    return f'{UNREAD_PREFIX}{user_id}'
+
+
+def unread_count(user_id):
+    """Unread notifications for a CRM user, from the cache when possible."""
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(key, count, settings.NOTIFICATION_UNREAD_TTL)
+    return count
+
+
+def _adjust_unread(user_id, delta):
+    key = _unread_key(user_id)
+    try:
+        if cache.incr(key, delta) < 0:
+            cache.delete(key)
+    except ValueError:
+        # Not cached; the next read recounts.
+        pass
+
+
+def adjust_unread_on_commit(user_id, delta):
+    transaction.on_commit(lambda: _adjust_unread(user_id, delta))
+
+
+def forget_unread(user_id):
+    """Drop a cached counter so the next read recounts it."""
+    transaction.on_commit(lambda: cache.delete(_unread_key(user_id)))
+
+
+def send(notifications):
+    """Save prebuilt ``Notification`` instances in bulk and push them after commit."""
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+        for notification in notifications:
+            adjust_unread_on_commit(notification.user_id, 1)
+            publish_on_commit(
+                notification_group(notification.user_id), 'notification.message',
+                notification_payload(notification),
+            )
+        bump_tags([model_tag(Notification)])
+    return notifications
+
+
+def notify(users, type, title, message, related_url=''):
+    """
+    Create the same notification for many users.
+
+    ``users`` may be CRM ``User`` instances or their ids. Returns the created
+    notifications.
+    """
+    user_ids = dict.fromkeys(getattr(user, 'pk', user) for user in users)
+    return send([
+        Notification(user_id=user_id, type=type, title=title, message=message, related_url=related_url)
+        for user_id in user_ids
+    ])
+
+
+def mark_read(notification):
+    """Mark one notification read; returns whether it was unread."""
+    updated = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+    notification.is_read = True
+    if updated:
+        adjust_unread_on_commit(notification.user_id, -1)
+        bump_tags([model_tag(Notification)])
+    return bool(updated)
+
+
+def mark_all_read(user_id):
+    """Mark every notification of a user read; returns how many changed."""
+    updated = Notification.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+    transaction.on_commit(lambda: cache.set(_unread_key(user_id), 0, settings.NOTIFICATION_UNREAD_TTL))
+    if updated:
+        bump_tags([model_tag(Notification)])
+    return updated
+
+
+def count_saved(sender, instance, created, **kwargs):
+    if created:
+        if not instance.is_read:
+            adjust_unread_on_commit(instance.user_id, 1)
+    else:
+        # The previous read state is unknown here; recount on next read.
+        forget_unread(instance.user_id)
+
+
+def count_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_on_commit(instance.user_id, -1)
+
+
+def connect_signals():
+    post_save.connect(count_saved, sender=Notification, dispatch_uid='crm.notifications.unread')
+    post_delete.connect(count_deleted, sender=Notification, dispatch_uid='crm.notifications.unread')
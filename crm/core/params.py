@@ -0,0 +1,52 @@
+"""
+Query parameter parsing for custom actions.
+
+Each helper returns ``None`` for a missing or empty parameter and raises
+``ValidationError`` (a 400 naming the parameter) for a malformed one, so
+bad input never reaches an ORM filter or ``int()`` inside a view.
+"""
+import uuid
+
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def _raw(params, name):
+    value = params.get(name)
+    return value.strip() if value and value.strip() else None
+
+
+def date_param(params, name):
+    value = _raw(params, name)
+    if value is None:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Enter a valid date (YYYY-MM-DD).'})
+    return parsed
+
+
+def int_param(params, name, default=None, minimum=None, maximum=None):
+    value = _raw(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Enter a whole number.'})
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValidationError({name: f'Must be between {minimum} and {maximum}.'})
+    return number
+
+
+def uuid_param(params, name):
+    value = _raw(params, name)
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({name: 'Enter a valid UUID.'})
@@ -0,0 +1,110 @@
+"""
+Realtime push over channels.
+
+Model signals publish small events to channel-layer groups. Events are held
+for ``REALTIME_COALESCE_WINDOW`` seconds and flushed as one message per group,
+so a burst of writes reaches each connected client as a single frame.
+"""
+import asyncio
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .models import Notification, User
+
+
+DASHBOARD_GROUP = 'dashboard_updates'
+
+
+def notification_group(user_id):
+    """Channel-layer group for one CRM user's notifications."""
+    return f'user_{user_id}'
+
+
+def crm_user_id(account):
+    """CRM profile id for an authenticated account, matched by username."""
+    return User.objects.filter(username=account.get_username()).values_list('id', flat=True).first()
+
+
+class CoalescingPublisher:
+    """Buffer events per (group, handler) and send one message per window."""
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._armed = False
+        self._loop = None
+
+    def bind_loop(self, loop):
+        """Flush on the ASGI server's event loop once a consumer has connected."""
+        self._loop = loop
+
+    def publish(self, group, handler, payload):
+        with self._lock:
+            self._pending.setdefault((group, handler), []).append(payload)
+            if self._armed:
+                return
+            self._armed = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(
+                loop.call_later, self.window, lambda: loop.create_task(self.flush())
+            )
+        else:
+            # No consumers in this process (e.g. a WSGI worker publishing to Redis).
+            timer = threading.Timer(self.window, async_to_sync(self.flush))
+            timer.daemon = True
+            timer.start()
+
+    async def flush(self):
+        from channels.layers import get_channel_layer
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._armed = False
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for (group, handler), payloads in pending.items():
+            await channel_layer.group_send(group, {'type': handler, 'events': payloads})
+
+
+publisher = CoalescingPublisher(settings.REALTIME_COALESCE_WINDOW)
+
+
+def bind_event_loop():
+    publisher.bind_loop(asyncio.get_running_loop())
+
+
+def publish_on_commit(group, handler, payload):
+    transaction.on_commit(lambda: publisher.publish(group, handler, payload))
+
+
+def notification_payload(notification):
+    return {
+        'id': str(notification.id),
+        'type': notification.type,
+        'title': notification.title,
+        'message': notification.message,
+        'related_url': notification.related_url,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def publish_notification(sender, instance, created, **kwargs):
+    if created:
+        publish_on_commit(
+            notification_group(instance.user_id), 'notification.message', notification_payload(instance)
+        )
+
+
+def connect_signals():
+    post_save.connect(publish_notification, sender=Notification, dispatch_uid='crm.realtime.notification')
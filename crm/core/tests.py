@@ -0,0 +1,138 @@
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+
+from . import dashboard
+from .cache import bump_tags, get_tag_versions, model_tag
+from .checks import check_version_cache
+from .models import Company, Customer
+from .params import date_param, int_param, uuid_param
+
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FILE = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/crm-check'}}
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1'}}
+
+
+class TagVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_waits_for_commit(self):
+        tag = model_tag(Company)
+        before = get_tag_versions([tag])[tag]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bump_tags([tag])
+            self.assertEqual(get_tag_versions([tag])[tag], before)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_tag_versions([tag])[tag], before)
+
+    def test_save_bumps_the_model_tag(self):
+        tag = model_tag(Company)
+        before = get_tag_versions([tag])[tag]
+        with self.captureOnCommitCallbacks(execute=True):
+            Company.objects.create(name='Acme')
+        self.assertNotEqual(get_tag_versions([tag])[tag], before)
+
+
+class ConditionalGetTests(TestCase):
+    url = '/api/companies/'
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company = Company.objects.create(name='Acme')
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.name = 'Acme Ltd'
+            self.company.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['name'], 'Acme Ltd')
+
+    def test_etag_holds_until_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=False):
+            Company.objects.create(name='Globex')
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class DashboardStatsTests(TestCase):
+    url = '/api/dashboard/stats/'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_served_from_the_snapshot(self):
+        self.assertEqual(self.client.get(self.url).json()['total_customers'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_writes_update_the_snapshot(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            company = Company.objects.create(name='Acme')
+            Customer.objects.create(first_name='Ada', last_name='Byron', email='ada@acme.com', company=company)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['total_customers'], 1)
+        self.assertEqual(data['total_companies'], 1)
+        self.assertIsNone(cache.get(dashboard.LOCK_KEY))
+
+
+class ParamTests(SimpleTestCase):
+    def test_missing_and_blank_values(self):
+        params = QueryDict('start=&months=%20')
+        self.assertIsNone(date_param(params, 'start'))
+        self.assertEqual(int_param(params, 'months', default=12), 12)
+        self.assertIsNone(uuid_param(params, 'company'))
+
+    def test_valid_values(self):
+        params = QueryDict('start=2024-02-29&months=6&company=4b0c2e9e-2f0a-4a8e-9a7a-6d0b6c1f3e21')
+        self.assertEqual(str(date_param(params, 'start')), '2024-02-29')
+        self.assertEqual(int_param(params, 'months', minimum=1, maximum=120), 6)
+        self.assertEqual(str(uuid_param(params, 'company')), '4b0c2e9e-2f0a-4a8e-9a7a-6d0b6c1f3e21')
+
+    def test_malformed_values_name_the_parameter(self):
+        cases = [
+            (date_param, 'start=2024-13-01', 'start', {}),
+            (date_param, 'start=yesterday', 'start', {}),
+            (int_param, 'months=abc', 'months', {}),
+            (int_param, 'months=0', 'months', {'minimum': 1, 'maximum': 120}),
+            (uuid_param, 'company=42', 'company', {}),
+        ]
+        for parse, query, name, options in cases:
+            with self.subTest(query=query), self.assertRaises(ValidationError) as raised:
+                parse(QueryDict(query), name, **options)
+            self.assertIn(name, raised.exception.detail)
+
+
+class VersionCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES=LOCMEM, WEB_CONCURRENCY=4)
+    def test_locmem_with_several_workers(self):
+        self.assertEqual([error.id for error in check_version_cache(None)], ['crm.E001'])
+
+    @override_settings(CACHES=FILE, WEB_CONCURRENCY=4)
+    def test_file_cache_with_several_workers(self):
+        self.assertEqual([error.id for error in check_version_cache(None)], ['crm.E001'])
+
+    @override_settings(CACHES=REDIS, WEB_CONCURRENCY=4)
+    def test_redis_with_several_workers(self):
+        self.assertEqual(check_version_cache(None), [])
+
+    @override_settings(CACHES=LOCMEM, WEB_CONCURRENCY=1)
+    def test_locmem_with_one_worker(self):
+        self.assertEqual(check_version_cache(None), [])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_dummy_cache(self):
+        self.assertEqual([error.id for error in check_version_cache(None)], ['crm.E002'])
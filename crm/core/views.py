@@ -8,6 +8,11 @@ from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from .models import User, Company, Customer, Interaction, Task, Notification
+from . import cache as response_cache
+from . import dashboard, notifications
+from .cache import cache_response
+from .conditional import ConditionalGetMixin
+from .realtime import crm_user_id
 from .serializers import (
     UserSerializer, CompanySerializer, CustomerSerializer,
     InteractionSerializer, TaskSerializer, NotificationSerializer,
@@ -20,7 +25,7 @@ def root_view(request):
     return render(request, 'index.html')
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for User model."""
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
@@ -36,6 +41,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cache_response(User)
     def departments(self, request):
         """Get list of departments."""
         departments = User.objects.filter(
@@ -44,7 +50,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(list(departments))
 
 
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Company model."""
     queryset = Company.objects.filter(is_active=True)
     serializer_class = CompanySerializer
@@ -62,6 +68,7 @@ class CompanyViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cache_response(Company)
     def industries(self, request):
         """Get list of industries."""
         industries = Company.objects.filter(
@@ -70,7 +77,7 @@ class CompanyViewSet(viewsets.ModelViewSet):
         return Response(list(industries))
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Customer model."""
     queryset = Customer.objects.filter(is_active=True)
     serializer_class = CustomerSerializer
@@ -136,6 +143,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return Response(timeline)
 
     @action(detail=False, methods=['get'])
+    @cache_response(Customer)
     def status_counts(self, request):
         """Get customer counts by status."""
         status_counts = Customer.objects.filter(
@@ -144,7 +152,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return Response(status_counts)
 
 
-class InteractionViewSet(viewsets.ModelViewSet):
+class InteractionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Interaction model."""
     queryset = Interaction.objects.all()
     serializer_class = InteractionSerializer
@@ -157,7 +165,7 @@ class InteractionViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Task model."""
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
@@ -198,30 +206,36 @@ class TaskViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Notification model."""
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = []  # Temporarily allow all access for development
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        return Notification.objects.filter(user_id=crm_user_id(self.request.user))
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark notification as read."""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        notifications.mark_read(notification)
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read."""
-        self.get_queryset().update(is_read=True)
+        notifications.mark_all_read(crm_user_id(request.user))
         return Response({'status': 'success'})
 
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Get the number of unread notifications."""
+        user_id = crm_user_id(request.user)
+        count = notifications.unread_count(user_id) if user_id else 0
+        return Response({'unread_count': count})
+
 
 class DashboardViewSet(viewsets.ViewSet):
     """ViewSet for dashboard data."""
@@ -230,54 +244,10 @@ class DashboardViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get dashboard statistics."""
-        # Get basic counts
-        total_customers = Customer.objects.filter(is_active=True).count()
-        total_companies = Company.objects.filter(is_active=True).count()
-        active_tasks = Task.objects.filter(status__in=['pending', 'in_progress']).count()
-        pending_interactions = Interaction.objects.filter(
-            date__gte=timezone.now() - timedelta(days=7)
-        ).count()
-
-        # Get recent activities
-        recent_interactions = Interaction.objects.select_related(
-            'customer', 'user'
-        ).order_by('-date')[:10]
-        
-        recent_activities = []
-        for interaction in recent_interactions:
-            recent_activities.append({
-                'type': 'interaction',
-                'id': interaction.id,
-                'title': f"{interaction.type.title()} with {interaction.customer.full_name}",
-                'date': interaction.date,
-                'user': interaction.user.get_full_name()
-            })
-
-        # Get upcoming deadlines
-        upcoming_tasks = Task.objects.filter(
-            due_date__gte=timezone.now(),
-            status__in=['pending', 'in_progress']
-        ).order_by('due_date')[:10]
-        
-        upcoming_deadlines = []
-        for task in upcoming_tasks:
-            upcoming_deadlines.append({
-                'type': 'task',
-                'id': task.id,
-                'title': task.title,
-                'due_date': task.due_date,
-                'priority': task.priority,
-                'assigned_to': task.assigned_to.get_full_name()
-            })
-
-        data = {
-            'total_customers': total_customers,
-            'total_companies': total_companies,
-            'active_tasks': active_tasks,
-            'pending_interactions': pending_interactions,
-            'recent_activities': recent_activities,
-            'upcoming_deadlines': upcoming_deadlines
-        }
-
-        serializer = DashboardStatsSerializer(data)
+        serializer = DashboardStatsSerializer(dashboard.state.snapshot()['data'])
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Get response cache hit rates for this process."""
+        return Response(response_cache.stats.snapshot())
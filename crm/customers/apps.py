@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.customers'
+
+    def ready(self):
+        from . import dedupe
+        dedupe.connect_signals()
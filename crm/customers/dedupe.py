@@ -0,0 +1,377 @@
+"""
+Duplicate detection for customers and leads.
+
+Every customer and lead gets a few blocking keys in ``DedupeKey``:
+
+* ``email:`` the normalized address (lowercase, ``+tags`` dropped, dots
+  dropped for Gmail);
+* ``phone:`` the last ten digits of the phone number;
+* ``name:`` Soundex codes of the first and last name;
+* ``domain:`` a company email domain (not a free-mail one) with the last
+  name's Soundex code;
+* ``company:`` the normalized company name with the last name's Soundex code.
+
+A key longer than the column keeps its prefix and replaces the rest with a
+SHA-1 digest. Only records sharing a key are ever compared, and blocks larger than
+``DEDUPE_MAX_BLOCK`` (a very common name, a switchboard number) are skipped.
+A compared pair is scored by combining its pieces of evidence (a noisy-or,
+so independent matches reinforce each other). Pairs reaching
+``DEDUPE_THRESHOLD`` are stored as ``DuplicateCandidate`` rows.
+
+New and edited records are indexed and matched on commit (``connect_signals``);
+``rebuild`` re-indexes each record type in one transaction from keyset
+pages, scores the blocks the database reports as shared a page of blocks at
+a time, and drops open candidates it did not rescore.
+"""
+import hashlib
+import re
+from difflib import SequenceMatcher
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+from crm.core.models import Customer
+from crm.sales.models import Lead
+
+from .models import DedupeKey, DuplicateCandidate
+
+
+FREE_EMAIL_DOMAINS = frozenset({
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'hotmail.com', 'outlook.com', 'live.com',
+    'icloud.com', 'me.com', 'aol.com', 'protonmail.com', 'proton.me', 'mail.com', 'gmx.com', 'yandex.com',
+})
+COMPANY_SUFFIXES = re.compile(r'\b(inc|llc|ltd|limited|corp|corporation|co|company|gmbh|plc|group)\b')
+
+# Evidence weights combined as 1 - prod(1 - weight)
+EMAIL_WEIGHT = 0.95
+PHONE_WEIGHT = 0.7
+NAME_WEIGHT = 0.6
+COMPANY_WEIGHT = 0.4
+DOMAIN_WEIGHT = 0.3
+SIMILAR = 0.85  # Name or company similarity that counts as a match
+
+FIELDS = ('first_name', 'last_name', 'email', 'phone')
+MODELS = {'customer': Customer, 'lead': Lead}
+WATCHED = FIELDS + ('company_id', 'company_name')
+KEY_LENGTH = DedupeKey._meta.get_field('key').max_length
+
+
+def normalize_email(email):
+    local, _, domain = (email or '').strip().lower().partition('@')
+    if not local or not domain:
+        return '', ''
+    local = local.split('+', 1)[0]
+    if domain in ('gmail.com', 'googlemail.com'):
+        local, domain = local.replace('.', ''), 'gmail.com'
+    return f'{local}@{domain}', domain
+
+
+def normalize_phone(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 7 else ''
+
+
+def normalize_company(name):
+    name = COMPANY_SUFFIXES.sub(' ', re.sub(r'[^a-z0-9 ]', ' ', (name or '').lower()))
+    return ' '.join(name.split())
+
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+
+
+def soundex(name):
+    letters = [letter for letter in (name or '').lower() if 'a' <= letter <= 'z']
+    if not letters:
+        return ''
+    code, previous = [letters[0].upper()], SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code.append(digit)
+        if letter not in 'hw':
+            previous = digit
+        if len(code) == 4:
+            break
+    return ''.join(code).ljust(4, '0')
+
+
+def rows(record_type):
+    """Record dicts of one type: id, first_name, last_name, email, phone and company_name."""
+    if record_type == 'lead':
+        return Lead.objects.values('id', *FIELDS, 'company_name')
+    return Customer.objects.values('id', *FIELDS, company_name=F('company__name'))
+
+
+def prepare(record):
+    """Add normalized fields to a record dict (first_name, last_name, email, phone, company_name)."""
+    email, domain = normalize_email(record['email'])
+    record.update(
+        norm_email=email, domain=domain, norm_phone=normalize_phone(record['phone']),
+        norm_name=' '.join(f"{record['first_name']} {record['last_name']}".lower().split()),
+        norm_company=normalize_company(record['company_name']),
+        first_code=soundex(record['first_name']), last_code=soundex(record['last_name']),
+    )
+    return record
+
+
+def _key(kind, value):
+    key = f'{kind}:{value}'
+    if len(key) <= KEY_LENGTH:
+        return key
+    return f"{kind}:#{hashlib.sha1(value.encode()).hexdigest()}"
+
+
+def blocking_keys(record):
+    keys = set()
+    if record['norm_email']:
+        keys.add(_key('email', record['norm_email']))
+    if record['norm_phone']:
+        keys.add(_key('phone', record['norm_phone']))
+    if record['first_code'] and record['last_code']:
+        keys.add(_key('name', f"{record['first_code']}{record['last_code']}"))
+    if record['last_code'] and record['domain'] and record['domain'] not in FREE_EMAIL_DOMAINS:
+        keys.add(_key('domain', f"{record['domain']}:{record['last_code']}"))
+    if record['last_code'] and record['norm_company']:
+        keys.add(_key('company', f"{record['norm_company']}:{record['last_code']}"))
+    return keys
+
+
+def _similarity(first, second):
+    if not first or not second:
+        return 0.0
+    return 1.0 if first == second else SequenceMatcher(None, first, second).ratio()
+
+
+def score(first, second):
+    """``(score, reasons)`` for two prepared records."""
+    evidence, reasons = [], []
+    if first['norm_email'] and first['norm_email'] == second['norm_email']:
+        evidence.append(EMAIL_WEIGHT)
+        reasons.append('email')
+    if first['norm_phone'] and first['norm_phone'] == second['norm_phone']:
+        evidence.append(PHONE_WEIGHT)
+        reasons.append('phone')
+    name = _similarity(first['norm_name'], second['norm_name'])
+    if name >= SIMILAR:
+        evidence.append(NAME_WEIGHT * name)
+        reasons.append('name')
+    company = _similarity(first['norm_company'], second['norm_company'])
+    if company >= SIMILAR:
+        evidence.append(COMPANY_WEIGHT * company)
+        reasons.append('company')
+    if first['domain'] and first['domain'] == second['domain'] and first['domain'] not in FREE_EMAIL_DOMAINS:
+        evidence.append(DOMAIN_WEIGHT)
+        reasons.append('email_domain')
+    remaining = 1.0
+    for weight in evidence:
+        remaining *= 1 - weight
+    return 1 - remaining, reasons
+
+
+def load(record_type, ids):
+    """Prepared record dicts keyed by id."""
+    return {row['id']: prepare(dict(row, type=record_type)) for row in rows(record_type).filter(pk__in=ids)}
+
+
+def _candidate(first, second, value, reasons):
+    (first_type, first_id), (second_type, second_id) = sorted([
+        (first['type'], first['id']), (second['type'], second['id']),
+    ], key=lambda pair: (pair[0], str(pair[1])))
+    return DuplicateCandidate(
+        first_type=first_type, first_id=first_id, second_type=second_type, second_id=second_id,
+        score=Decimal(str(round(value, 4))), reasons=reasons,
+    )
+
+
+def save_candidates(candidates):
+    DuplicateCandidate.objects.bulk_create(
+        candidates, batch_size=1000, update_conflicts=True,
+        unique_fields=['first_type', 'first_id', 'second_type', 'second_id'],
+        update_fields=['score', 'reasons', 'updated_at'],
+    )
+
+
+def _oversized(keys):
+    return set(
+        DedupeKey.objects.filter(key__in=keys).values('key').annotate(
+            members=Count('id'),
+        ).filter(members__gt=settings.DEDUPE_MAX_BLOCK).values_list('key', flat=True)
+    )
+
+
+def find_duplicates(record, record_types=('customer', 'lead')):
+    """``[(other record, score, reasons)]`` above the threshold for one prepared record, best first."""
+    keys = blocking_keys(record)
+    keys -= _oversized(keys)
+    others = {}
+    for record_type, record_id in DedupeKey.objects.filter(
+        key__in=keys, record_type__in=record_types,
+    ).values_list('record_type', 'record_id').distinct():
+        if (record_type, record_id) != (record['type'], record['id']):
+            others.setdefault(record_type, set()).add(record_id)
+    found = []
+    for record_type, ids in others.items():
+        for other in load(record_type, ids).values():
+            value, reasons = score(record, other)
+            if value >= settings.DEDUPE_THRESHOLD:
+                found.append((other, value, reasons))
+    return sorted(found, key=lambda match: -match[1])
+
+
+def index_record(record_type, record_id):
+    """Refresh one record's keys and candidates; returns the duplicates found."""
+    record = load(record_type, [record_id]).get(record_id)
+    with transaction.atomic():
+        DedupeKey.objects.filter(record_type=record_type, record_id=record_id).delete()
+        if record is None:
+            forget(record_type, record_id)
+            return []
+        DedupeKey.objects.bulk_create([
+            DedupeKey(record_type=record_type, record_id=record_id, key=key) for key in blocking_keys(record)
+        ])
+        found = find_duplicates(record)
+        save_candidates([_candidate(record, other, value, reasons) for other, value, reasons in found])
+    bump_tags([model_tag(DedupeKey), model_tag(DuplicateCandidate)])
+    return found
+
+
+def forget(record_type, record_id):
+    DedupeKey.objects.filter(record_type=record_type, record_id=record_id).delete()
+    DuplicateCandidate.objects.filter(
+        Q(first_type=record_type, first_id=record_id) | Q(second_type=record_type, second_id=record_id),
+    ).delete()
+
+
+def candidates_for(record_type, record_id, other_type=None, status='open'):
+    """Stored candidate pairs involving a record."""
+    involving = Q(first_type=record_type, first_id=record_id) | Q(second_type=record_type, second_id=record_id)
+    candidates = DuplicateCandidate.objects.filter(involving, status=status)
+    if other_type:
+        candidates = candidates.filter(
+            Q(first_type=other_type) & ~Q(first_id=record_id) | Q(second_type=other_type) & ~Q(second_id=record_id),
+        )
+    return candidates
+
+
+def _pages(record_type, size):
+    records = rows(record_type).order_by('pk')
+    last = None
+    while True:
+        page = list((records if last is None else records.filter(pk__gt=last))[:size])
+        if not page:
+            return
+        yield page
+        last = page[-1]['id']
+
+
+def rebuild_index(batch_size=5000):
+    """
+    Recompute every blocking key; returns how many keys were written. Each
+    record type is replaced in one transaction, so concurrent matching never
+    sees its keys half rebuilt and a failed rebuild leaves them as they were.
+    """
+    written = 0
+    for record_type in MODELS:
+        with transaction.atomic():
+            DedupeKey.objects.filter(record_type=record_type).delete()
+            for page in _pages(record_type, batch_size):
+                keys = [
+                    DedupeKey(record_type=record_type, record_id=record['id'], key=key)
+                    for record in page for key in blocking_keys(prepare(dict(record, type=record_type)))
+                ]
+                DedupeKey.objects.bulk_create(keys, batch_size=5000)
+                written += len(keys)
+    return written
+
+
+def shared_blocks(batch_size):
+    """Pages of keys held by more than one and at most ``DEDUPE_MAX_BLOCK`` records."""
+    blocks = DedupeKey.objects.values('key').annotate(members=Count('id')).filter(
+        members__gt=1, members__lte=settings.DEDUPE_MAX_BLOCK,
+    ).order_by('key').values_list('key', flat=True)
+    last = None
+    while True:
+        page = list((blocks if last is None else blocks.filter(key__gt=last))[:batch_size])
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+
+def rebuild(batch_size=5000, block_batch=1000):
+    """Re-index every customer and lead and rescore all blocks; returns ``(keys, candidates, removed)``."""
+    started = timezone.now()
+    keys = rebuild_index(batch_size)
+    stored = 0
+    for blocks in shared_blocks(block_batch):
+        members = {}
+        for key, record_type, record_id in DedupeKey.objects.filter(key__in=blocks).values_list(
+            'key', 'record_type', 'record_id',
+        ):
+            members.setdefault(key, []).append((record_type, record_id))
+        pairs = set()
+        for block in members.values():
+            block.sort(key=lambda member: (member[0], str(member[1])))
+            pairs.update(
+                (first, second) for position, first in enumerate(block) for second in block[position + 1:]
+            )
+        wanted = {}
+        for pair in pairs:
+            for record_type, record_id in pair:
+                wanted.setdefault(record_type, set()).add(record_id)
+        records = {
+            (record_type, record_id): record
+            for record_type, ids in wanted.items() for record_id, record in load(record_type, ids).items()
+        }
+        candidates = []
+        for first, second in pairs:
+            if first in records and second in records:
+                value, reasons = score(records[first], records[second])
+                if value >= settings.DEDUPE_THRESHOLD:
+                    candidates.append(_candidate(records[first], records[second], value, reasons))
+        save_candidates(candidates)
+        stored += len(candidates)
+    # Open pairs that no longer share a block or reach the threshold; reviewed ones keep their status.
+    removed, _ = DuplicateCandidate.objects.filter(status='open', updated_at__lt=started).delete()
+    bump_tags([model_tag(DedupeKey), model_tag(DuplicateCandidate)])
+    return keys, stored, removed
+
+
+def _record_type(sender):
+    return 'customer' if sender is Customer else 'lead'
+
+
+def remember_fields(sender, instance, **kwargs):
+    instance._dedupe_state = tuple(instance.__dict__.get(field) for field in WATCHED)
+
+
+def track_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    state = tuple(instance.__dict__.get(field) for field in WATCHED)
+    if not created and state == getattr(instance, '_dedupe_state', None):
+        return
+    instance._dedupe_state = state
+    record_type, record_id = _record_type(sender), instance.pk
+    transaction.on_commit(lambda: index_record(record_type, record_id))
+
+
+def track_deleted(sender, instance, **kwargs):
+    record_type, record_id = _record_type(sender), instance.pk
+    transaction.on_commit(lambda: forget(record_type, record_id))
+
+
+def connect_signals():
+    for model in (Customer, Lead):
+        name = model._meta.label_lower
+        post_init.connect(remember_fields, sender=model, dispatch_uid=f'dedupe_remember_{name}')
+        post_save.connect(track_saved, sender=model, dispatch_uid=f'dedupe_saved_{name}')
+        post_delete.connect(track_deleted, sender=model, dispatch_uid=f'dedupe_deleted_{name}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from crm.customers.dedupe import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the duplicate blocking index over all customers and leads and rescore every block'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Records read per page')
+        parser.add_argument('--block-batch', type=int, default=1000, help='Blocking keys scored per batch')
+
+    def handle(self, *args, **options):
+        keys, candidates, removed = rebuild(options['batch_size'], options['block_batch'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{keys} blocking key(s) indexed; {candidates} candidate pair(s) stored, {removed} stale removed'
+        ))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DedupeKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('customer', 'Customer'), ('lead', 'Lead')], max_length=10)),
+                ('record_id', models.UUIDField()),
+                ('key', models.CharField(db_index=True, max_length=150)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['record_type', 'record_id'], name='customers_dedupe_record_idx')],
+                'unique_together': {('record_type', 'record_id', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_type', models.CharField(choices=[('customer', 'Customer'), ('lead', 'Lead')], max_length=10)),
+                ('first_id', models.UUIDField()),
+                ('second_type', models.CharField(choices=[('customer', 'Customer'), ('lead', 'Lead')], max_length=10)),
+                ('second_id', models.UUIDField()),
+                ('score', models.DecimalField(decimal_places=4, max_digits=5)),
+                ('reasons', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('merged', 'Merged'), ('dismissed', 'Dismissed')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-score', '-created_at'],
+                'indexes': [models.Index(fields=['second_type', 'second_id'], name='customers_dup_second_idx')],
+                'unique_together': {('first_type', 'first_id', 'second_type', 'second_id')},
+            },
+        ),
+    ]
@@ -139,3 +139,51 @@ class CustomerDocument(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.customer.name}"
+
+class DedupeKey(models.Model):
+    """Blocking index: one row per blocking key of a customer or lead (see customers.dedupe)"""
+    RECORD_TYPES = [
+        ('customer', 'Customer'),
+        ('lead', 'Lead'),
+    ]
+    
+    record_type = models.CharField(max_length=10, choices=RECORD_TYPES)
+    record_id = models.UUIDField()
+    key = models.CharField(max_length=150, db_index=True)  # e.g. "phone:5551234567"
+    
+    class Meta:
+        unique_together = ['record_type', 'record_id', 'key']
+        indexes = [
+            models.Index(fields=['record_type', 'record_id'], name='customers_dedupe_record_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.record_type} {self.record_id}: {self.key}"
+
+class DuplicateCandidate(models.Model):
+    """A pair of customers/leads that probably describe the same person"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('merged', 'Merged'),
+        ('dismissed', 'Dismissed'),
+    ]
+    
+    first_type = models.CharField(max_length=10, choices=DedupeKey.RECORD_TYPES)
+    first_id = models.UUIDField()
+    second_type = models.CharField(max_length=10, choices=DedupeKey.RECORD_TYPES)
+    second_id = models.UUIDField()
+    score = models.DecimalField(max_digits=5, decimal_places=4)
+    reasons = models.JSONField(default=list)  # Fields that matched
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-score', '-created_at']
+        unique_together = ['first_type', 'first_id', 'second_type', 'second_id']
+        indexes = [
+            models.Index(fields=['second_type', 'second_id'], name='customers_dup_second_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.first_type} {self.first_id} ~ {self.second_type} {self.second_id} ({self.score})"
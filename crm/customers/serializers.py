@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Contact, CustomerSegment, CustomerTag, CustomerActivity,
-    CustomerPreference, CustomerDocument
+    CustomerPreference, CustomerDocument, DuplicateCandidate
 )
 from crm.core.serializers import CustomerSerializer, CompanySerializer
 
@@ -62,3 +62,11 @@ class CustomerDocumentSerializer(serializers.ModelSerializer):
         model = CustomerDocument
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class DuplicateCandidateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DuplicateCandidate
+        fields = '__all__'
+        read_only_fields = ['id', 'first_type', 'first_id', 'second_type', 'second_id', 'score', 'reasons',
+                            'created_at', 'updated_at']
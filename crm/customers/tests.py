@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from crm.core.models import Company, Customer
+from crm.sales.models import Lead
+
+from . import dedupe
+from .models import DedupeKey, DuplicateCandidate
+
+
+class DedupeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme Inc')
+
+    def customer(self, **fields):
+        fields = dict({'first_name': 'Ada', 'last_name': 'Byron', 'email': 'ada@acme.com'}, **fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Customer.objects.create(company=self.company, **fields)
+
+    def lead(self, **fields):
+        fields = dict(
+            {'first_name': 'Ada', 'last_name': 'Byron', 'email': 'ada@acme.com', 'company_name': 'Acme'}, **fields,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            return Lead.objects.create(lead_source='website', **fields)
+
+    def test_saves_generate_candidates(self):
+        customer = self.customer()
+        lead = self.lead(email='ADA@acme.com ')
+        candidate = DuplicateCandidate.objects.get()
+        self.assertEqual(
+            {(candidate.first_type, candidate.first_id), (candidate.second_type, candidate.second_id)},
+            {('customer', customer.pk), ('lead', lead.pk)},
+        )
+        self.assertIn('email', candidate.reasons)
+
+    def test_unrelated_records_are_not_candidates(self):
+        self.customer()
+        self.customer(first_name='Grace', last_name='Hopper', email='grace@navy.mil')
+        self.assertFalse(DuplicateCandidate.objects.exists())
+
+    def test_edit_and_delete_follow_the_record(self):
+        self.customer()
+        other = self.customer(first_name='Grace', last_name='Hopper', email='grace@navy.mil')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.first_name, other.last_name, other.email = 'Ada', 'Byron', 'ada.byron@acme.com'
+            other.save()
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(DuplicateCandidate.objects.exists())
+        self.assertFalse(DedupeKey.objects.filter(record_id=other.pk).exists())
+
+    def test_long_values_fit_the_key_column(self):
+        email = f"{'a' * 200}@{'b' * 50}.com"
+        first = self.customer(email=email)
+        second = self.customer(first_name='Bea', last_name='Smith', email=email.upper())
+        self.assertTrue(all(len(key) <= dedupe.KEY_LENGTH for key in DedupeKey.objects.values_list('key', flat=True)))
+        self.assertEqual(
+            dedupe.candidates_for('customer', first.pk).get(), dedupe.candidates_for('customer', second.pk).get(),
+        )
+
+    def test_rebuild_removes_stale_open_candidates(self):
+        self.customer()
+        lead, twin = self.lead(), self.customer(email='ada.byron@acme.com')
+        dismissed = dedupe.candidates_for('customer', twin.pk, other_type='customer').get()
+        dismissed.status = 'dismissed'
+        dismissed.save()
+        # Bulk updates send no signal, so only a rebuild notices the pairs no longer match.
+        Lead.objects.filter(pk=lead.pk).update(first_name='Grace', last_name='Hopper', email='grace@navy.mil')
+        Customer.objects.filter(pk=twin.pk).update(first_name='Zed', last_name='Quinn', email='zed@quinn.io', phone='')
+        keys, stored, removed = dedupe.rebuild()
+        self.assertGreater(keys, 0)
+        self.assertEqual((stored, removed), (0, 2))
+        self.assertEqual(list(DuplicateCandidate.objects.all()), [dismissed])
+
+    def test_failed_rebuild_keeps_the_index(self):
+        self.customer()
+        self.lead()
+        before = sorted(DedupeKey.objects.values_list('record_type', 'record_id', 'key'))
+        prepare = dedupe.prepare
+
+        def fail_on_leads(record):
+            if record['type'] == 'lead':
+                raise RuntimeError('lost the database')
+            return prepare(record)
+
+        with mock.patch.object(dedupe, 'prepare', fail_on_leads), self.assertRaises(RuntimeError):
+            dedupe.rebuild_index()
+        self.assertEqual(sorted(DedupeKey.objects.values_list('record_type', 'record_id', 'key')), before)
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+
+
+class DuplicateEndpointTests(TestCase):
+    url = '/api/customers/duplicates/'
+
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name='Acme Inc')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = Customer.objects.create(
+                company=company, first_name='Ada', last_name='Byron', email='ada@acme.com',
+            )
+            self.lead = Lead.objects.create(
+                first_name='Ada', last_name='Byron', email='ada@acme.com', company_name='Acme', lead_source='website',
+            )
+
+    def test_list_and_for_record(self):
+        self.assertEqual(self.client.get(self.url).json()['count'], 1)
+        response = self.client.get(f'{self.url}for-record/?type=customer&id={self.customer.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        response = self.client.get(f'{self.url}for-record/?type=lead&id={self.lead.pk}&other_type=lead')
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_list_follows_new_candidates(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.create(
+                first_name='Ada', last_name='Byron', email='ada@acme.com', company_name='Acme', lead_source='website',
+            )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_malformed_parameters_are_bad_requests(self):
+        for query in ('', 'type=contact&id={id}', 'type=customer&id=abc', 'type=customer&id={id}&other_type=contact'):
+            with self.subTest(query=query):
+                response = self.client.get(f'{self.url}for-record/?{query.format(id=self.customer.pk)}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_customer_routes_are_reachable(self):
+        for url in ('/api/customers/', '/api/customers/contacts/', '/api/customers/segments/', '/api/customers/tags/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
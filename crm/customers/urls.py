@@ -3,12 +3,15 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
+# api/customers/ itself is core's customer list
+router.include_root_view = False
 router.register(r'contacts', views.ContactViewSet)
 router.register(r'segments', views.CustomerSegmentViewSet)
 router.register(r'tags', views.CustomerTagViewSet)
 router.register(r'activities', views.CustomerActivityViewSet)
 router.register(r'preferences', views.CustomerPreferenceViewSet)
 router.register(r'documents', views.CustomerDocumentViewSet)
+router.register(r'duplicates', views.DuplicateCandidateViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -4,36 +4,39 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
+from crm.core.params import uuid_param
 from django.db.models import Avg, Count, Sum
 from .models import (
     Contact, CustomerSegment, CustomerTag, CustomerActivity,
-    CustomerPreference, CustomerDocument
+    CustomerPreference, CustomerDocument, DuplicateCandidate
 )
 from .serializers import (
     ContactSerializer, CustomerSegmentSerializer, CustomerTagSerializer,
-    CustomerActivitySerializer, CustomerPreferenceSerializer, CustomerDocumentSerializer
+    CustomerActivitySerializer, CustomerPreferenceSerializer, CustomerDocumentSerializer,
+    DuplicateCandidateSerializer
 )
 
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['customer', 'contact_type', 'is_primary']
+    filterset_fields = ['customer', 'is_primary', 'is_decision_maker']
     search_fields = ['first_name', 'last_name', 'email', 'phone']
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
 
 
-class CustomerSegmentViewSet(viewsets.ModelViewSet):
+class CustomerSegmentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerSegment.objects.all()
     serializer_class = CustomerSegmentSerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['company', 'is_active']
+    filterset_fields = ['segment_type']
     search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'updated_at']
+    ordering_fields = ['name', 'created_at']
     ordering = ['-created_at']
 
     @action(detail=True, methods=['get'])
@@ -46,48 +49,48 @@ class CustomerSegmentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class CustomerTagViewSet(viewsets.ModelViewSet):
+class CustomerTagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerTag.objects.all()
     serializer_class = CustomerTagSerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['company', 'color']
+    filterset_fields = ['color']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
 
-class CustomerActivityViewSet(viewsets.ModelViewSet):
+class CustomerActivityViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerActivity.objects.all()
     serializer_class = CustomerActivitySerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['customer', 'activity_type', 'company']
-    search_fields = ['description', 'customer__name']
-    ordering_fields = ['timestamp', 'created_at']
+    filterset_fields = ['customer', 'activity_type', 'user']
+    search_fields = ['title', 'description', 'customer__first_name', 'customer__last_name']
+    ordering_fields = ['timestamp']
     ordering = ['-timestamp']
 
 
-class CustomerPreferenceViewSet(viewsets.ModelViewSet):
+class CustomerPreferenceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerPreference.objects.all()
     serializer_class = CustomerPreferenceSerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['customer', 'preference_type', 'company']
-    search_fields = ['customer__name', 'value']
+    filterset_fields = ['customer', 'language', 'currency']
+    search_fields = ['customer__first_name', 'customer__last_name']
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
 
 
-class CustomerDocumentViewSet(viewsets.ModelViewSet):
+class CustomerDocumentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerDocument.objects.all()
     serializer_class = CustomerDocumentSerializer
     permission_classes = []  # Temporarily allow all access for development
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['customer', 'document_type', 'company']
-    search_fields = ['title', 'description', 'customer__name']
-    ordering_fields = ['created_at', 'updated_at']
-    ordering = ['-created_at']
+    filterset_fields = ['customer', 'document_type', 'uploaded_by']
+    search_fields = ['title', 'description', 'customer__first_name', 'customer__last_name']
+    ordering_fields = ['uploaded_at']
+    ordering = ['-uploaded_at']
 
     @action(detail=True, methods=['post'])
     def download(self, request, pk=None):
@@ -95,3 +98,56 @@ class CustomerDocumentViewSet(viewsets.ModelViewSet):
         document = self.get_object()
         # Here you would implement actual file download logic
         return Response({'status': f'Downloading {document.title}'})
+
+
+class DuplicateCandidateViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = DuplicateCandidate.objects.all()
+    serializer_class = DuplicateCandidateSerializer
+    permission_classes = []  # Temporarily allow all access for development
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['status', 'first_type', 'first_id', 'second_type', 'second_id']
+    ordering_fields = ['score', 'created_at']
+    ordering = ['-score', '-created_at']
+
+    @action(detail=True, methods=['post'])
+    def dismiss(self, request, pk=None):
+        """Mark a pair as not being duplicates; rescoring keeps the status"""
+        candidate = self.get_object()
+        candidate.status = 'dismissed'
+        candidate.save(update_fields=['status', 'updated_at'])
+        return Response({'status': 'Candidate dismissed'})
+
+    @action(detail=False, methods=['get'], url_path='for-record')
+    def for_record(self, request):
+        """Candidate pairs involving one record (type, id; optional other_type and status, default open)"""
+        from .dedupe import MODELS, candidates_for
+
+        params = request.query_params
+        record_type, other_type = params.get('type'), params.get('other_type')
+        record_id = uuid_param(params, 'id')
+        if record_type not in MODELS or record_id is None:
+            return Response({'error': 'type (customer or lead) and id are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if other_type and other_type not in MODELS:
+            return Response({'error': 'other_type must be customer or lead'}, status=status.HTTP_400_BAD_REQUEST)
+        candidates = self.filter_queryset(
+            candidates_for(record_type, record_id, other_type, params.get('status', 'open'))
+        )
+        page = self.paginate_queryset(candidates)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(candidates, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def check(self, request):
+        """Duplicates of an unsaved customer or lead (first_name, last_name, email, phone, company_name)"""
+        from .dedupe import find_duplicates, prepare
+        record = {
+            field: str(request.data.get(field) or '')
+            for field in ('first_name', 'last_name', 'email', 'phone', 'company_name')
+        }
+        found = find_duplicates(prepare(dict(record, type=request.data.get('type', 'customer'), id=None)))
+        return Response([
+            {'type': other['type'], 'id': str(other['id']), 'first_name': other['first_name'],
+             'last_name': other['last_name'], 'email': other['email'], 'score': round(value, 4), 'reasons': reasons}
+            for other, value, reasons in found
+        ])
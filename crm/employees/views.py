@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     Employee, EmployeePerformance, EmployeeActivity, EmployeeGoal,
     EmployeeTraining, EmployeeSchedule, EmployeeMetrics
@@ -16,7 +17,7 @@ from .serializers import (
 from django.db.models import Avg
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated]
@@ -41,7 +42,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Employee deactivated'})
 
 
-class EmployeePerformanceViewSet(viewsets.ModelViewSet):
+class EmployeePerformanceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeePerformance.objects.all()
     serializer_class = EmployeePerformanceSerializer
     permission_classes = [IsAuthenticated]
@@ -52,7 +53,7 @@ class EmployeePerformanceViewSet(viewsets.ModelViewSet):
     ordering = ['-period_end']
 
 
-class EmployeeActivityViewSet(viewsets.ModelViewSet):
+class EmployeeActivityViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeeActivity.objects.all()
     serializer_class = EmployeeActivitySerializer
     permission_classes = [IsAuthenticated]
@@ -63,7 +64,7 @@ class EmployeeActivityViewSet(viewsets.ModelViewSet):
     ordering = ['-timestamp']
 
 
-class EmployeeGoalViewSet(viewsets.ModelViewSet):
+class EmployeeGoalViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeeGoal.objects.all()
     serializer_class = EmployeeGoalSerializer
     permission_classes = [IsAuthenticated]
@@ -88,7 +89,7 @@ class EmployeeGoalViewSet(viewsets.ModelViewSet):
         return Response({'error': 'Progress value required'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EmployeeTrainingViewSet(viewsets.ModelViewSet):
+class EmployeeTrainingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeeTraining.objects.all()
     serializer_class = EmployeeTrainingSerializer
     permission_classes = [IsAuthenticated]
@@ -109,7 +110,7 @@ class EmployeeTrainingViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Training completed'})
 
 
-class EmployeeScheduleViewSet(viewsets.ModelViewSet):
+class EmployeeScheduleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeeSchedule.objects.all()
     serializer_class = EmployeeScheduleSerializer
     permission_classes = [IsAuthenticated]
@@ -120,7 +121,7 @@ class EmployeeScheduleViewSet(viewsets.ModelViewSet):
     ordering = ['date', 'start_time']
 
 
-class EmployeeMetricsViewSet(viewsets.ModelViewSet):
+class EmployeeMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmployeeMetrics.objects.all()
     serializer_class = EmployeeMetricsSerializer
     permission_classes = [IsAuthenticated]
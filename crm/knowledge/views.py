@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     KnowledgeCategory, KnowledgeArticle, KnowledgeTag, KnowledgeComment,
     KnowledgeFeedback, KnowledgeSearch, KnowledgeTemplate, KnowledgeAnalytics,
@@ -17,7 +18,7 @@ from .serializers import (
 from django.utils import timezone
 
 
-class KnowledgeCategoryViewSet(viewsets.ModelViewSet):
+class KnowledgeCategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeCategory.objects.all()
     serializer_class = KnowledgeCategorySerializer
     permission_classes = [IsAuthenticated]
@@ -28,7 +29,7 @@ class KnowledgeCategoryViewSet(viewsets.ModelViewSet):
     ordering = ['order', 'name']
 
 
-class KnowledgeTagViewSet(viewsets.ModelViewSet):
+class KnowledgeTagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeTag.objects.all()
     serializer_class = KnowledgeTagSerializer
     permission_classes = [IsAuthenticated]
@@ -39,7 +40,7 @@ class KnowledgeTagViewSet(viewsets.ModelViewSet):
     ordering = ['name']
 
 
-class KnowledgeArticleViewSet(viewsets.ModelViewSet):
+class KnowledgeArticleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeArticle.objects.all()
     serializer_class = KnowledgeArticleSerializer
     permission_classes = [IsAuthenticated]
@@ -65,7 +66,7 @@ class KnowledgeArticleViewSet(viewsets.ModelViewSet):
         return Response({'status': 'View count incremented'})
 
 
-class KnowledgeCommentViewSet(viewsets.ModelViewSet):
+class KnowledgeCommentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeComment.objects.all()
     serializer_class = KnowledgeCommentSerializer
     permission_classes = [IsAuthenticated]
@@ -83,7 +84,7 @@ class KnowledgeCommentViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Comment approved'})
 
 
-class KnowledgeFeedbackViewSet(viewsets.ModelViewSet):
+class KnowledgeFeedbackViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeFeedback.objects.all()
     serializer_class = KnowledgeFeedbackSerializer
     permission_classes = [IsAuthenticated]
@@ -94,7 +95,7 @@ class KnowledgeFeedbackViewSet(viewsets.ModelViewSet):
     ordering = ['-rating', '-created_at']
 
 
-class KnowledgeSearchViewSet(viewsets.ModelViewSet):
+class KnowledgeSearchViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeSearch.objects.all()
     serializer_class = KnowledgeSearchSerializer
     permission_classes = [IsAuthenticated]
@@ -105,7 +106,7 @@ class KnowledgeSearchViewSet(viewsets.ModelViewSet):
     ordering = ['-search_time']
 
 
-class KnowledgeTemplateViewSet(viewsets.ModelViewSet):
+class KnowledgeTemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeTemplate.objects.all()
     serializer_class = KnowledgeTemplateSerializer
     permission_classes = [IsAuthenticated]
@@ -116,7 +117,7 @@ class KnowledgeTemplateViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class KnowledgeAnalyticsViewSet(viewsets.ModelViewSet):
+class KnowledgeAnalyticsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeAnalytics.objects.all()
     serializer_class = KnowledgeAnalyticsSerializer
     permission_classes = [IsAuthenticated]
@@ -127,7 +128,7 @@ class KnowledgeAnalyticsViewSet(viewsets.ModelViewSet):
     ordering = ['-date']
 
 
-class KnowledgeVersionViewSet(viewsets.ModelViewSet):
+class KnowledgeVersionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeVersion.objects.all()
     serializer_class = KnowledgeVersionSerializer
     permission_classes = [IsAuthenticated]
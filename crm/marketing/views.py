@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     MarketingCampaign, EmailCampaign, EmailTemplate, EmailSubscriber,
     EmailSend, SocialMediaCampaign, MarketingAutomation, MarketingMetrics
@@ -16,7 +17,7 @@ from .serializers import (
 from django.utils import timezone
 
 
-class MarketingCampaignViewSet(viewsets.ModelViewSet):
+class MarketingCampaignViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = MarketingCampaign.objects.all()
     serializer_class = MarketingCampaignSerializer
     permission_classes = [IsAuthenticated]
@@ -41,7 +42,7 @@ class MarketingCampaignViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Campaign paused'})
 
 
-class EmailCampaignViewSet(viewsets.ModelViewSet):
+class EmailCampaignViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmailCampaign.objects.all()
     serializer_class = EmailCampaignSerializer
     permission_classes = [IsAuthenticated]
@@ -60,7 +61,7 @@ class EmailCampaignViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Email campaign sent'})
 
 
-class EmailTemplateViewSet(viewsets.ModelViewSet):
+class EmailTemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmailTemplate.objects.all()
     serializer_class = EmailTemplateSerializer
     permission_classes = [IsAuthenticated]
@@ -71,7 +72,7 @@ class EmailTemplateViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class EmailSubscriberViewSet(viewsets.ModelViewSet):
+class EmailSubscriberViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmailSubscriber.objects.all()
     serializer_class = EmailSubscriberSerializer
     permission_classes = [IsAuthenticated]
@@ -89,7 +90,7 @@ class EmailSubscriberViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Subscriber unsubscribed'})
 
 
-class EmailSendViewSet(viewsets.ModelViewSet):
+class EmailSendViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = EmailSend.objects.all()
     serializer_class = EmailSendSerializer
     permission_classes = [IsAuthenticated]
@@ -100,7 +101,7 @@ class EmailSendViewSet(viewsets.ModelViewSet):
     ordering = ['-sent_at']
 
 
-class SocialMediaCampaignViewSet(viewsets.ModelViewSet):
+class SocialMediaCampaignViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SocialMediaCampaign.objects.all()
     serializer_class = SocialMediaCampaignSerializer
     permission_classes = [IsAuthenticated]
@@ -111,7 +112,7 @@ class SocialMediaCampaignViewSet(viewsets.ModelViewSet):
     ordering = ['-start_date', '-created_at']
 
 
-class MarketingAutomationViewSet(viewsets.ModelViewSet):
+class MarketingAutomationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = MarketingAutomation.objects.all()
     serializer_class = MarketingAutomationSerializer
     permission_classes = [IsAuthenticated]
@@ -129,7 +130,7 @@ class MarketingAutomationViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Automation activated'})
 
 
-class MarketingMetricsViewSet(viewsets.ModelViewSet):
+class MarketingMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = MarketingMetrics.objects.all()
     serializer_class = MarketingMetricsSerializer
     permission_classes = [IsAuthenticated]
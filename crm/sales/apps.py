@@ -4,3 +4,7 @@ class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.sales'
     verbose_name = 'Sales Management'
+
+    def ready(self):
+        from . import pipeline
+        pipeline.connect_signals()
@@ -0,0 +1,211 @@
+"""
+Sales forecasting.
+
+Open opportunities and historical deal closes are loaded into pandas once,
+then every rep's forecast for every upcoming period is computed with array
+operations:
+
+* weighted pipeline - ``amount * probability`` of open opportunities,
+  bucketed by expected close period (overdue ones count in the current
+  period);
+* trend - a least-squares line through each rep's closed revenue over the
+  previous ``history`` periods, solved for all reps in one matrix product.
+
+The projection is the larger of the two: committed pipeline is a floor and
+the trend fills in business not yet in the pipeline. Confidence blends how
+much of the projection is backed by pipeline with the trend's fit (R^2).
+``save_forecasts`` upserts the generated ``SalesForecast`` rows, one per rep
+and period plus a team total with no ``assigned_to``, and removes generated
+rows of reps who no longer have a forecast for those periods.
+"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import Deal, Opportunity, SalesForecast
+from .pipeline import CLOSED
+
+
+PERIOD_FREQ = {'monthly': 'M', 'quarterly': 'Q', 'yearly': 'Y'}
+UNASSIGNED = -1
+HORIZON_RANGE = (1, 24)
+HISTORY_RANGE = (2, 60)
+
+
+def check_window(horizon, history):
+    """Raise ``ValueError`` unless ``horizon`` and ``history`` are within the supported ranges."""
+    if not HORIZON_RANGE[0] <= horizon <= HORIZON_RANGE[1] or not HISTORY_RANGE[0] <= history <= HISTORY_RANGE[1]:
+        raise ValueError(
+            f'horizon must be {HORIZON_RANGE[0]}-{HORIZON_RANGE[1]} and '
+            f'history {HISTORY_RANGE[0]}-{HISTORY_RANGE[1]} periods'
+        )
+
+
+def load_pipeline():
+    rows = Opportunity.objects.exclude(stage__in=CLOSED).values_list(
+        'assigned_to_id', 'amount', 'probability', 'expected_close_date',
+    )
+    return pd.DataFrame.from_records(rows.iterator(), columns=['rep', 'amount', 'probability', 'closes_on'])
+
+
+def load_closes(since):
+    rows = (
+        Deal.objects.exclude(status='cancelled')
+        .annotate(
+            rep=Coalesce('assigned_to', 'opportunity__assigned_to'),
+            closed_on=Coalesce('opportunity__actual_close_date', 'start_date'),
+        )
+        .filter(closed_on__gte=since)
+        .values_list('rep', 'total_amount', 'closed_on')
+    )
+    return pd.DataFrame.from_records(rows.iterator(), columns=['rep', 'amount', 'closes_on'])
+
+
+def _offsets(frame, current):
+    """Periods between each row's date and the current period (0 = current)."""
+    periods = pd.PeriodIndex(pd.to_datetime(frame['closes_on']), freq=current.freq)
+    return periods.asi8 - current.ordinal
+
+
+def _matrix(frame, values, columns):
+    if frame.empty:
+        return pd.DataFrame(columns=columns, dtype=float)
+    table = frame.pivot_table(index='rep', columns='offset', values=values, aggfunc='sum')
+    return table.reindex(columns=columns, fill_value=0).fillna(0)
+
+
+def _trend(history, horizon):
+    """Per-row linear fit of ``history`` extrapolated ``horizon`` steps, and its R^2."""
+    steps = history.shape[1]
+    x = np.arange(steps, dtype=float)
+    centred = x - x.mean()
+    means = history.mean(axis=1, keepdims=True)
+    slope = (history - means) @ centred / max((centred ** 2).sum(), 1)
+    intercept = means[:, 0] - slope * x.mean()
+    fitted = intercept[:, None] + slope[:, None] * x
+    residual = ((history - fitted) ** 2).sum(axis=1)
+    total = ((history - means) ** 2).sum(axis=1)
+    r2 = np.divide(total - residual, total, out=np.zeros_like(total), where=total > 0)
+    future = steps + np.arange(horizon, dtype=float)
+    return np.clip(intercept[:, None] + slope[:, None] * future, 0, None), np.clip(r2, 0, 1)
+
+
+def forecast(period='monthly', horizon=3, history=12, today=None):
+    """
+    Forecast ``horizon`` periods from the current one. Returns a DataFrame
+    with one row per rep and period plus team totals (``rep`` is None).
+    """
+    current = pd.Period(today or timezone.localdate(), freq=PERIOD_FREQ[period])
+    future_columns, past_columns = list(range(horizon)), list(range(-history, 1))
+
+    pipeline = load_pipeline()
+    if not pipeline.empty:
+        pipeline['rep'] = pipeline['rep'].fillna(UNASSIGNED).astype('int64')
+        pipeline['weighted'] = pipeline['amount'].astype(float) * pipeline['probability'].astype(float) / 100
+        pipeline['offset'] = np.maximum(_offsets(pipeline, current), 0)
+    closes = load_closes((current - history).start_time.date())
+    if not closes.empty:
+        closes['rep'] = closes['rep'].fillna(UNASSIGNED).astype('int64')
+        closes['amount'] = closes['amount'].astype(float)
+        closes['offset'] = _offsets(closes, current)
+
+    weighted = _matrix(pipeline, 'weighted', future_columns)
+    closed = _matrix(closes, 'amount', past_columns)
+    reps = weighted.index.union(closed.index)
+    weighted = weighted.reindex(reps, fill_value=0).to_numpy(dtype=float)
+    closed = closed.reindex(reps, fill_value=0).to_numpy(dtype=float)
+
+    trend, r2 = _trend(closed[:, :-1], horizon)
+    projected = np.maximum(weighted, trend)
+    coverage = np.divide(weighted, projected, out=np.zeros_like(projected), where=projected > 0)
+    confidence = np.rint(100 * (coverage + r2[:, None]) / 2)
+    actual = np.full_like(projected, np.nan)
+    actual[:, 0] = closed[:, -1]
+
+    team_projected = projected.sum(axis=0)
+    team_confidence = np.divide(
+        (confidence * projected).sum(axis=0), team_projected,
+        out=np.zeros_like(team_projected), where=team_projected > 0,
+    )
+    team_actual = np.full(horizon, np.nan)
+    team_actual[0] = closed[:, -1].sum()
+
+    periods = pd.period_range(current, periods=horizon)
+    rows = pd.DataFrame({
+        'rep': np.repeat(np.asarray(reps, dtype=object), horizon),
+        'offset': np.tile(future_columns, len(reps)),
+        'pipeline': weighted.ravel(),
+        'trend': trend.ravel(),
+        'projected': projected.ravel(),
+        'actual': actual.ravel(),
+        'confidence': confidence.ravel(),
+    })
+    rows = rows[(rows['rep'] != UNASSIGNED) & ((rows['projected'] > 0) | (rows['actual'] > 0))]
+    team = pd.DataFrame({
+        'rep': [None] * horizon,
+        'offset': future_columns,
+        'pipeline': weighted.sum(axis=0),
+        'trend': trend.sum(axis=0),
+        'projected': team_projected,
+        'actual': team_actual,
+        'confidence': np.rint(team_confidence),
+    })
+    frame = pd.concat([team, rows], ignore_index=True)
+    frame['start_date'] = [periods[offset].start_time.date() for offset in frame['offset']]
+    frame['end_date'] = [periods[offset].end_time.date() for offset in frame['offset']]
+    return frame.drop(columns='offset')
+
+
+def _money(value):
+    return Decimal(str(round(float(value), 2)))
+
+
+def save_forecasts(frame, period, created_by=None):
+    """Insert, refresh or remove generated forecasts for the frame's periods; returns (created, updated, removed)."""
+    now = timezone.now()
+    existing = {
+        (forecast.start_date, forecast.assigned_to_id): forecast
+        for forecast in SalesForecast.objects.filter(
+            is_generated=True, period=period, start_date__in=set(frame['start_date']),
+        )
+    }
+    created, updated = [], []
+    for row in frame.itertuples(index=False):
+        rep = None if row.rep is None else int(row.rep)
+        forecast = existing.pop((row.start_date, rep), None)
+        if forecast is None:
+            forecast = SalesForecast(
+                period=period, start_date=row.start_date, assigned_to_id=rep,
+                is_generated=True, created_by=created_by,
+            )
+            created.append(forecast)
+        else:
+            updated.append(forecast)
+        forecast.end_date = row.end_date
+        forecast.projected_revenue = _money(row.projected)
+        forecast.actual_revenue = None if pd.isna(row.actual) else _money(row.actual)
+        forecast.confidence_level = int(row.confidence)
+        forecast.notes = f'Weighted pipeline {row.pipeline:.2f}; trend {row.trend:.2f}'
+        forecast.updated_at = now
+    with transaction.atomic():
+        SalesForecast.objects.bulk_create(created, batch_size=500)
+        SalesForecast.objects.bulk_update(
+            updated,
+            ['end_date', 'projected_revenue', 'actual_revenue', 'confidence_level', 'notes', 'updated_at'],
+            batch_size=500,
+        )
+        # Whatever is left was generated for a rep who dropped out of the period.
+        SalesForecast.objects.filter(pk__in=[forecast.pk for forecast in existing.values()]).delete()
+    bump_tags([model_tag(SalesForecast)])
+    return len(created), len(updated), len(existing)
+
+
+def generate(period='monthly', horizon=3, history=12, created_by=None):
+    check_window(horizon, history)
+    return save_forecasts(forecast(period, horizon, history), period, created_by=created_by)
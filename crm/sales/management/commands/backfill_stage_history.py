@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from crm.core.cache import bump_tags, model_tag
+from crm.sales.models import Opportunity, OpportunityStageHistory
+
+
+class Command(BaseCommand):
+    help = 'Record the current stage of opportunities that have no stage history yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        missing = (
+            Opportunity.objects.filter(stage_history__isnull=True)
+            .values_list('id', 'stage', 'amount', 'created_at')
+        )
+        batch, written = [], 0
+        for opportunity_id, stage, amount, created_at in missing.iterator(chunk_size=options['batch_size']):
+            batch.append(OpportunityStageHistory(
+                opportunity_id=opportunity_id, to_stage=stage, amount=amount, changed_at=created_at,
+            ))
+            if len(batch) >= options['batch_size']:
+                written += len(OpportunityStageHistory.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            written += len(OpportunityStageHistory.objects.bulk_create(batch))
+        bump_tags([model_tag(OpportunityStageHistory)])
+        self.stdout.write(self.style.SUCCESS(f'Recorded {written} initial stage(s)'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.sales.forecasting import PERIOD_FREQ, check_window, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate per-rep and team sales forecasts from the open pipeline and closed deals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=list(PERIOD_FREQ), default='monthly')
+        parser.add_argument('--horizon', type=int, default=3, help='Periods to forecast, from the current one (1-24)')
+        parser.add_argument('--history', type=int, default=12, help='Past periods used for the trend (2-60)')
+
+    def handle(self, *args, **options):
+        try:
+            check_window(options['horizon'], options['history'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        created, updated, removed = generate(options['period'], options['horizon'], options['history'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created}, updated {updated} and removed {removed} forecast(s)'
+        ))
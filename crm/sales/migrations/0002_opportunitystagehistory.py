@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpportunityStageHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_stage', models.CharField(blank=True, max_length=50)),
+                ('to_stage', models.CharField(max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('seconds_in_stage', models.FloatField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stage_changes', to=settings.AUTH_USER_MODEL)),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_history', to='sales.opportunity')),
+            ],
+            options={
+                'verbose_name_plural': 'Opportunity stage history',
+                'ordering': ['-changed_at'],
+                'indexes': [models.Index(fields=['opportunity', 'changed_at'], name='sales_stage_hist_opp_idx'), models.Index(fields=['to_stage', 'changed_at'], name='sales_stage_hist_to_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_opportunitystagehistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesforecast',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='assigned_forecasts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='salesforecast',
+            name='is_generated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='salesforecast',
+            index=models.Index(fields=['period', 'start_date'], name='sales_forecast_period_idx'),
+        ),
+    ]
@@ -93,6 +93,27 @@ class Opportunity(models.Model):
     def __str__(self):
         return f"{self.title} - {self.customer.name}"
 
+class OpportunityStageHistory(models.Model):
+    """Append-only log of opportunity stage transitions"""
+    opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE, related_name='stage_history')
+    from_stage = models.CharField(max_length=50, blank=True)  # Empty when the opportunity was created
+    to_stage = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    seconds_in_stage = models.FloatField(null=True, blank=True)  # Time spent in from_stage
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='stage_changes')
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-changed_at']
+        verbose_name_plural = 'Opportunity stage history'
+        indexes = [
+            models.Index(fields=['opportunity', 'changed_at'], name='sales_stage_hist_opp_idx'),
+            models.Index(fields=['to_stage', 'changed_at'], name='sales_stage_hist_to_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.opportunity_id}: {self.from_stage or '-'} -> {self.to_stage}"
+
 class Deal(models.Model):
     """Closed deals with revenue tracking"""
     DEAL_STATUS = [
@@ -187,12 +208,17 @@ class SalesForecast(models.Model):
     actual_revenue = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     confidence_level = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(100)])
     notes = models.TextField(blank=True)
+    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='assigned_forecasts')  # Empty for team totals
+    is_generated = models.BooleanField(default=False)  # Written by the forecasting engine
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='sales_forecasts')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['period', 'start_date'], name='sales_forecast_period_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_period_display()} Forecast - {self.start_date} to {self.end_date}"
@@ -0,0 +1,286 @@
+"""
+Pipeline analytics.
+
+Stage order and default probabilities come from the active ``SalesPipeline``
+(its ``stages`` JSON is a list of stage keys or ``{"key", "label",
+"probability"}`` objects), falling back to ``Opportunity.OPPORTUNITY_STAGES``.
+
+Every stage change is appended to ``OpportunityStageHistory`` with the time
+spent in the stage being left, so funnels, conversion rates, time in stage
+and velocity are grouped queries over the history and opportunity tables
+rather than loops over opportunities.
+"""
+import threading
+from datetime import datetime, time
+
+from django.db.models import (
+    Avg, Case, Count, DecimalField, DurationField, ExpressionWrapper, F, IntegerField, Max, Q, Sum, Value, When,
+)
+from django.db.models.signals import post_init, post_save
+from django.utils import timezone
+
+from crm.core.cache import get_tag_versions, model_tag
+
+from .models import Opportunity, OpportunityStageHistory, SalesPipeline
+
+
+WON = 'closed_won'
+LOST = 'closed_lost'
+CLOSED = (WON, LOST)
+
+
+class Stage:
+    __slots__ = ('key', 'label', 'probability')
+
+    def __init__(self, key, label=None, probability=None):
+        self.key = key
+        self.label = label or key.replace('_', ' ').title()
+        self.probability = probability
+
+    def as_dict(self):
+        return {'key': self.key, 'label': self.label, 'probability': self.probability}
+
+
+def parse_stages(config):
+    """``Stage`` objects from a ``SalesPipeline.stages`` value; unusable entries are skipped."""
+    stages = []
+    for entry in config or []:
+        if isinstance(entry, str):
+            stages.append(Stage(entry))
+        elif isinstance(entry, dict):
+            key = entry.get('key') or entry.get('name') or entry.get('id')
+            if key:
+                stages.append(Stage(str(key), entry.get('label'), entry.get('probability')))
+    return stages
+
+
+DEFAULT_STAGES = [Stage(key, label) for key, label in Opportunity.OPPORTUNITY_STAGES]
+
+_stages = {'version': None, 'stages': DEFAULT_STAGES}
+_stages_lock = threading.Lock()
+
+
+def configured_stages():
+    """Stages of the active pipeline, re-read only when a pipeline row changes."""
+    tag = model_tag(SalesPipeline)
+    version = get_tag_versions([tag])[tag]
+    with _stages_lock:
+        if _stages['version'] != version:
+            pipeline = SalesPipeline.objects.filter(is_active=True).order_by('created_at').first()
+            _stages['stages'] = (pipeline and parse_stages(pipeline.stages)) or DEFAULT_STAGES
+            _stages['version'] = version
+        return _stages['stages']
+
+
+def stage_order():
+    return [stage.key for stage in configured_stages()]
+
+
+def progression():
+    """Stages an opportunity advances through, ending at the won stage."""
+    return [key for key in stage_order() if key != LOST]
+
+
+def next_stage(current):
+    """The stage after ``current``, or None at the end; raises ``ValueError`` for unknown stages."""
+    order = progression()
+    index = order.index(current)
+    return order[index + 1] if index + 1 < len(order) else None
+
+
+def stage_probability(key):
+    for stage in configured_stages():
+        if stage.key == key:
+            return stage.probability
+    return None
+
+
+def _moment(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def history(start=None, end=None, assigned_to=None):
+    """Stage transitions in ``[start, end)``, optionally for one owner."""
+    queryset = OpportunityStageHistory.objects.all()
+    if start:
+        queryset = queryset.filter(changed_at__gte=_moment(start))
+    if end:
+        queryset = queryset.filter(changed_at__lt=_moment(end))
+    if assigned_to:
+        queryset = queryset.filter(opportunity__assigned_to=assigned_to)
+    return queryset
+
+
+def _hours(seconds):
+    return round(seconds / 3600, 2) if seconds is not None else None
+
+
+def funnel(assigned_to=None):
+    """Open pipeline by current stage: count, value and probability-weighted value."""
+    queryset = Opportunity.objects.all()
+    if assigned_to:
+        queryset = queryset.filter(assigned_to=assigned_to)
+    weighted = ExpressionWrapper(
+        F('amount') * F('probability') / Value(100),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    rows = {
+        row['stage']: row
+        for row in queryset.values('stage').annotate(
+            count=Count('id'), value=Sum('amount'), weighted_value=Sum(weighted),
+        ).order_by()
+    }
+    stages = []
+    for stage in configured_stages():
+        row = rows.pop(stage.key, {})
+        stages.append({
+            **stage.as_dict(),
+            'count': row.get('count', 0),
+            'value': row.get('value') or 0,
+            'weighted_value': row.get('weighted_value') or 0,
+        })
+    # Stages no longer in the configuration still hold opportunities.
+    for key, row in rows.items():
+        stages.append({
+            **Stage(key).as_dict(),
+            'count': row['count'], 'value': row['value'] or 0, 'weighted_value': row['weighted_value'] or 0,
+        })
+    open_stages = [stage for stage in stages if stage['key'] not in CLOSED]
+    return {
+        'stages': stages,
+        'open_count': sum(stage['count'] for stage in open_stages),
+        'pipeline_value': sum(stage['value'] for stage in open_stages),
+        'weighted_pipeline_value': sum(stage['weighted_value'] for stage in open_stages),
+    }
+
+
+def conversion(start=None, end=None, assigned_to=None):
+    """
+    How many opportunities reached each stage and how many of those went on
+    to the next one. Skipped stages count as passed.
+    """
+    order = progression()
+    rank = Case(
+        *[When(to_stage=key, then=Value(index)) for index, key in enumerate(order)],
+        default=None, output_field=IntegerField(),
+    )
+    furthest = (
+        history(start, end, assigned_to).values('opportunity')
+        .annotate(furthest=Max(rank)).order_by()
+    )
+    reached = furthest.aggregate(**{
+        f'stage_{index}': Count('opportunity', filter=Q(furthest__gte=index))
+        for index in range(len(order))
+    })
+    transitions = history(start, end, assigned_to).aggregate(
+        won=Count('opportunity', filter=Q(to_stage=WON), distinct=True),
+        lost=Count('opportunity', filter=Q(to_stage=LOST), distinct=True),
+    )
+    stages = []
+    for index, key in enumerate(order):
+        count = reached[f'stage_{index}'] or 0
+        following = reached.get(f'stage_{index + 1}')
+        stages.append({
+            'key': key,
+            'reached': count,
+            'advanced': following,
+            'conversion_rate': round(following / count * 100, 2) if count and following is not None else None,
+        })
+    closed = transitions['won'] + transitions['lost']
+    return {
+        'stages': stages,
+        'won': transitions['won'],
+        'lost': transitions['lost'],
+        'win_rate': round(transitions['won'] / closed * 100, 2) if closed else None,
+    }
+
+
+def time_in_stage(start=None, end=None, assigned_to=None):
+    """Average and longest time spent in each stage, from completed stays."""
+    rows = {
+        row['from_stage']: row
+        for row in history(start, end, assigned_to)
+        .filter(seconds_in_stage__isnull=False).exclude(from_stage='')
+        .values('from_stage').annotate(
+            stays=Count('id'), average=Avg('seconds_in_stage'), longest=Max('seconds_in_stage'),
+        ).order_by()
+    }
+    return [
+        {
+            'key': key,
+            'stays': rows.get(key, {}).get('stays', 0),
+            'average_hours': _hours(rows.get(key, {}).get('average')),
+            'longest_hours': _hours(rows.get(key, {}).get('longest')),
+        }
+        for key in stage_order() if key not in CLOSED
+    ]
+
+
+def velocity(start=None, end=None, assigned_to=None):
+    """
+    Sales velocity: open opportunities x average won amount x win rate,
+    divided by the average days from creation to a win.
+    """
+    won = history(start, end, assigned_to).filter(to_stage=WON).aggregate(
+        count=Count('id'),
+        average_amount=Avg('amount'),
+        cycle=Avg(ExpressionWrapper(F('changed_at') - F('opportunity__created_at'), output_field=DurationField())),
+    )
+    rates = conversion(start, end, assigned_to)
+    open_count = Opportunity.objects.exclude(stage__in=CLOSED)
+    if assigned_to:
+        open_count = open_count.filter(assigned_to=assigned_to)
+    open_count = open_count.count()
+    cycle_days = won['cycle'].total_seconds() / 86400 if won['cycle'] else None
+    win_rate = rates['win_rate']
+    per_day = None
+    if cycle_days and win_rate is not None and won['average_amount'] is not None:
+        per_day = round(float(won['average_amount']) * open_count * win_rate / 100 / cycle_days, 2)
+    return {
+        'open_opportunities': open_count,
+        'won': won['count'],
+        'average_won_amount': won['average_amount'],
+        'win_rate': win_rate,
+        'average_cycle_days': round(cycle_days, 2) if cycle_days is not None else None,
+        'velocity_per_day': per_day,
+    }
+
+
+def record_transition(opportunity, from_stage, to_stage, changed_by=None, now=None):
+    """Append one stage change, timing the stay in ``from_stage`` from the previous entry."""
+    now = now or timezone.now()
+    seconds = None
+    if from_stage:
+        entered = (
+            OpportunityStageHistory.objects.filter(opportunity=opportunity)
+            .order_by('-changed_at').values_list('changed_at', flat=True).first()
+        ) or opportunity.created_at
+        seconds = max((now - entered).total_seconds(), 0)
+    return OpportunityStageHistory.objects.create(
+        opportunity=opportunity, from_stage=from_stage, to_stage=to_stage,
+        amount=opportunity.amount, seconds_in_stage=seconds,
+        changed_by=changed_by, changed_at=now,
+    )
+
+
+def remember_stage(instance, **kwargs):
+    # Loaded values only; reading a deferred field would query per row.
+    instance._pipeline_stage = instance.__dict__.get('stage')
+
+
+def track_stage(sender, instance, created, **kwargs):
+    previous, current = getattr(instance, '_pipeline_stage', None), instance.__dict__.get('stage')
+    if current and (created or (previous and previous != current)):
+        record_transition(
+            instance, '' if created else previous, current,
+            changed_by=getattr(instance, '_stage_changed_by', None),
+            now=instance.created_at if created else None,
+        )
+    instance._pipeline_stage = current
+
+
+def connect_signals():
+    post_init.connect(remember_stage, sender=Opportunity, dispatch_uid='crm.pipeline.stage')
+    post_save.connect(track_stage, sender=Opportunity, dispatch_uid='crm.pipeline.stage')
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from crm.core.models import Company, Customer
+
+from .forecasting import check_window, save_forecasts
+from .models import Opportunity, SalesForecast
+
+
+class PipelineAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller')
+        company = Company.objects.create(name='Acme')
+        cls.customer = Customer.objects.create(company=company, first_name='Ada', last_name='Byron', email='ada@example.com')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def open_opportunity(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            Opportunity.objects.create(
+                customer=self.customer, title='Licences', stage='proposal', probability=50,
+                amount=amount, expected_close_date=date(2030, 1, 1), assigned_to=self.user,
+            )
+
+    def test_malformed_parameters_are_bad_requests(self):
+        cases = [
+            ('conversion', 'start=last-week', 'start'),
+            ('time-in-stage', 'end=2024-02-30', 'end'),
+            ('velocity', 'assigned_to=me', 'assigned_to'),
+            ('funnel', 'assigned_to=1.5', 'assigned_to'),
+        ]
+        for action, query, name in cases:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/sales/opportunities/{action}/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(name, response.json())
+
+    def test_cached_funnel_follows_new_opportunities(self):
+        self.open_opportunity(1000)
+        first = self.client.get('/api/sales/opportunities/funnel/').json()
+        self.assertEqual(self.client.get('/api/sales/opportunities/funnel/').json(), first)
+        self.open_opportunity(500)
+        self.assertNotEqual(self.client.get('/api/sales/opportunities/funnel/').json(), first)
+
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first, cls.second = User.objects.create_user('first'), User.objects.create_user('second')
+
+    def frame(self, *reps):
+        return pd.DataFrame([
+            {
+                'start_date': date(2030, 1, 1), 'end_date': date(2030, 1, 31), 'rep': rep,
+                'projected': 1000.0, 'actual': float('nan'), 'confidence': 70, 'pipeline': 800.0, 'trend': 200.0,
+            }
+            for rep in reps
+        ])
+
+    def test_rerun_updates_and_drops_stale_rows(self):
+        self.assertEqual(save_forecasts(self.frame(self.first.pk, self.second.pk), 'monthly'), (2, 0, 0))
+        self.assertEqual(save_forecasts(self.frame(self.first.pk), 'monthly'), (0, 1, 1))
+        self.assertEqual(
+            list(SalesForecast.objects.filter(is_generated=True).values_list('assigned_to', flat=True)),
+            [self.first.pk],
+        )
+
+    def test_window_outside_the_ranges_is_a_bad_request(self):
+        self.client.force_login(self.first)
+        for body in ({'horizon': 0}, {'history': 1000}, {'horizon': 'soon'}, {'period': 'hourly'}):
+            with self.subTest(body=body):
+                response = self.client.post('/api/sales/forecasts/generate/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+class WindowTests(SimpleTestCase):
+    def test_bounds(self):
+        check_window(1, 2)
+        check_window(24, 60)
+        for horizon, history in ((0, 12), (25, 12), (3, 1), (3, 61)):
+            with self.subTest(horizon=horizon, history=history), self.assertRaises(ValueError):
+                check_window(horizon, history)
@@ -4,14 +4,19 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .models import Lead, Opportunity, Deal, SalesActivity, SalesPipeline, SalesForecast
+from crm.core.conditional import ConditionalGetMixin
+from crm.core.cache import cache_response
+from django.db.models import Avg, Count, Sum
+from crm.core.params import date_param, int_param
+from .models import Lead, Opportunity, Deal, SalesActivity, SalesPipeline, SalesForecast, OpportunityStageHistory
+from . import pipeline
 from .serializers import (
     LeadSerializer, OpportunitySerializer, DealSerializer,
     SalesActivitySerializer, SalesPipelineSerializer, SalesForecastSerializer
 )
 
 
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Lead.objects.all()
     serializer_class = LeadSerializer
     permission_classes = [IsAuthenticated]
@@ -31,12 +36,26 @@ class LeadViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def convert(self, request, pk=None):
         lead = self.get_object()
+        if not request.data.get('force'):
+            from crm.customers.dedupe import find_duplicates, load
+            record = load('lead', [lead.pk]).get(lead.pk)
+            duplicates = find_duplicates(record, record_types=('customer',)) if record else []
+            if duplicates:
+                return Response({
+                    'error': 'Lead matches existing customers; resend with force to convert anyway',
+                    'duplicates': [
+                        {'id': str(customer['id']), 'first_name': customer['first_name'],
+                         'last_name': customer['last_name'], 'email': customer['email'],
+                         'score': round(value, 4), 'reasons': reasons}
+                        for customer, value, reasons in duplicates
+                    ],
+                }, status=status.HTTP_409_CONFLICT)
         lead.status = 'converted'
         lead.save()
         return Response({'status': 'Lead converted'})
 
 
-class OpportunityViewSet(viewsets.ModelViewSet):
+class OpportunityViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Opportunity.objects.all()
     serializer_class = OpportunitySerializer
     permission_classes = [IsAuthenticated]
@@ -46,25 +65,70 @@ class OpportunityViewSet(viewsets.ModelViewSet):
     ordering_fields = ['amount', 'expected_close_date', 'probability']
     ordering = ['-expected_close_date', '-amount']
 
+    def perform_update(self, serializer):
+        serializer.instance._stage_changed_by = self.request.user
+        serializer.save()
+
+    def _analytics_params(self, request):
+        params = request.query_params
+        return {
+            'start': date_param(params, 'start'),
+            'end': date_param(params, 'end'),
+            'assigned_to': int_param(params, 'assigned_to'),
+        }
+
     @action(detail=True, methods=['post'])
     def advance_stage(self, request, pk=None):
         opportunity = self.get_object()
-        current_stage = opportunity.stage
-        stages = ['prospecting', 'qualification', 'needs_analysis', 'proposal', 'negotiation', 'closed_won']
-        
         try:
-            current_index = stages.index(current_stage)
-            if current_index < len(stages) - 1:
-                opportunity.stage = stages[current_index + 1]
-                opportunity.save()
-                return Response({'status': f'Advanced to {opportunity.stage}'})
-            else:
-                return Response({'error': 'Already at final stage'}, status=status.HTTP_400_BAD_REQUEST)
+            stage = pipeline.next_stage(opportunity.stage)
         except ValueError:
             return Response({'error': 'Invalid stage'}, status=status.HTTP_400_BAD_REQUEST)
+        if stage is None:
+            return Response({'error': 'Already at final stage'}, status=status.HTTP_400_BAD_REQUEST)
+        opportunity.stage = stage
+        probability = pipeline.stage_probability(stage)
+        if probability is not None:
+            opportunity.probability = probability
+        opportunity._stage_changed_by = request.user
+        opportunity.save()
+        return Response({'status': f'Advanced to {opportunity.stage}'})
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get the stage transitions of an opportunity"""
+        opportunity = self.get_object()
+        transitions = opportunity.stage_history.values(
+            'from_stage', 'to_stage', 'amount', 'seconds_in_stage', 'changed_by', 'changed_at',
+        )
+        return Response(list(transitions))
+
+    @action(detail=False, methods=['get'])
+    @cache_response(Opportunity, SalesPipeline)
+    def funnel(self, request):
+        """Get open pipeline count, value and weighted value per stage"""
+        return Response(pipeline.funnel(assigned_to=int_param(request.query_params, 'assigned_to')))
+
+    @action(detail=False, methods=['get'])
+    @cache_response(OpportunityStageHistory, SalesPipeline)
+    def conversion(self, request):
+        """Get stage-to-stage conversion and win rates, optionally scoped by start, end and assigned_to"""
+        return Response(pipeline.conversion(**self._analytics_params(request)))
 
+    @action(detail=False, methods=['get'], url_path='time-in-stage')
+    @cache_response(OpportunityStageHistory, SalesPipeline)
+    def time_in_stage(self, request):
+        """Get average and longest time spent in each stage"""
+        return Response(pipeline.time_in_stage(**self._analytics_params(request)))
 
-class DealViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    @cache_response(Opportunity, OpportunityStageHistory, SalesPipeline)
+    def velocity(self, request):
+        """Get sales velocity from open opportunities, win rate and cycle length"""
+        return Response(pipeline.velocity(**self._analytics_params(request)))
+
+
+class DealViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Deal.objects.all()
     serializer_class = DealSerializer
     permission_classes = [IsAuthenticated]
@@ -82,7 +146,7 @@ class DealViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Deal closed'})
 
 
-class SalesActivityViewSet(viewsets.ModelViewSet):
+class SalesActivityViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SalesActivity.objects.all()
     serializer_class = SalesActivitySerializer
     permission_classes = [IsAuthenticated]
@@ -100,7 +164,7 @@ class SalesActivityViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Activity completed'})
 
 
-class SalesPipelineViewSet(viewsets.ModelViewSet):
+class SalesPipelineViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SalesPipeline.objects.all()
     serializer_class = SalesPipelineSerializer
     permission_classes = [IsAuthenticated]
@@ -111,21 +175,46 @@ class SalesPipelineViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class SalesForecastViewSet(viewsets.ModelViewSet):
+class SalesForecastViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SalesForecast.objects.all()
     serializer_class = SalesForecastSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['forecast_period', 'forecast_type', 'assigned_to']
-    search_fields = ['title', 'description']
-    ordering_fields = ['forecast_date', 'created_at']
-    ordering = ['-forecast_date', '-created_at']
+    filterset_fields = ['period', 'assigned_to', 'is_generated', 'start_date']
+    search_fields = ['notes']
+    ordering_fields = ['start_date', 'projected_revenue', 'created_at']
+    ordering = ['-start_date', '-created_at']
 
     @action(detail=False, methods=['get'])
+    @cache_response(SalesForecast)
     def summary(self, request):
         """Get sales forecast summary"""
-        total_forecast = sum(forecast.forecasted_amount for forecast in self.get_queryset())
-        return Response({
-            'total_forecasted_amount': total_forecast,
-            'forecast_count': self.get_queryset().count()
-        })
+        totals = self.filter_queryset(self.get_queryset()).aggregate(
+            total_projected_revenue=Sum('projected_revenue'),
+            total_actual_revenue=Sum('actual_revenue'),
+            average_confidence=Avg('confidence_level'),
+            forecast_count=Count('id'),
+        )
+        return Response(totals)
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Generate per-rep and team forecasts from the pipeline and closed deals"""
+        from .forecasting import PERIOD_FREQ, check_window, generate
+
+        period = request.data.get('period', 'monthly')
+        if period not in PERIOD_FREQ:
+            return Response({'error': f"period must be one of: {', '.join(PERIOD_FREQ)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            horizon = int(request.data.get('horizon', 3))
+            history = int(request.data.get('history', 12))
+        except (TypeError, ValueError):
+            return Response({'error': 'horizon and history must be whole numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            check_window(horizon, history)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        created, updated, removed = generate(period, horizon, history, created_by=request.user)
+        return Response({'created': created, 'updated': updated, 'removed': removed})
@@ -5,3 +5,8 @@ class SupportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.support'
     verbose_name = 'Customer Support'
+
+    def ready(self):
+        from . import metrics, routing
+        routing.connect_signals()
+        metrics.connect_signals()
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from crm.support.metrics import rebuild
+from crm.support.models import SupportTicket
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily SupportMetrics ticket counts and averages from ticket history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First day to rebuild (YYYY-MM-DD); defaults to the oldest ticket')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to rebuild; defaults to today')
+        parser.add_argument('--chunk-days', type=int, default=366, help='Days rebuilt per aggregate pass')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            oldest = SupportTicket.objects.aggregate(oldest=Min('created_at'))['oldest']
+            start = timezone.localdate(oldest) if oldest else end
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        written = 0
+        while start <= end:
+            chunk_end = min(end, start + timedelta(days=options['chunk_days'] - 1))
+            written += rebuild(start, chunk_end)
+            start = chunk_end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} day(s) of support metrics'))
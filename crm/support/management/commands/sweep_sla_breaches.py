@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.support.sla import sweep_breaches
+
+
+class Command(BaseCommand):
+    help = 'Flag open support tickets that missed their SLA response or resolution deadline and notify their owners'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Tickets flagged per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat the sweep every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            responses, resolutions = sweep_breaches(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Flagged {responses} response and {resolutions} resolution breach(es)'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,149 @@
+"""
+Daily support metrics maintained from ticket events.
+
+Each ticket transition updates its day's ``SupportMetrics`` row with a single
+``UPDATE`` built from ``F()`` expressions:
+
+* creation adds to ``total_tickets`` on the day the ticket was opened;
+* the first public reply (``first_response_at``) adds to
+  ``responded_tickets`` and folds the wait into ``avg_response_time``;
+* resolution adds to ``resolved_tickets`` and folds the ticket's age into
+  ``avg_resolution_time``.
+
+Averages are kept as running means, in hours. ``rebuild`` recomputes a date
+range from grouped aggregates and is what the backfill command uses.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_init, post_save
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import SupportMetrics, SupportTicket, TicketResponse
+
+
+def _hours(duration):
+    return max(duration.total_seconds(), 0) / 3600
+
+
+def _update_day(day, **changes):
+    if not SupportMetrics.objects.filter(date=day).update(**changes):
+        SupportMetrics.objects.get_or_create(date=day)
+        SupportMetrics.objects.filter(date=day).update(**changes)
+    bump_tags([model_tag(SupportMetrics)])
+
+
+def _running_average(average_field, count_field, hours):
+    return ExpressionWrapper(
+        (F(average_field) * F(count_field) + Value(float(hours))) / (F(count_field) + Value(1.0)),
+        output_field=FloatField(),
+    )
+
+
+def record_created(created_at):
+    _update_day(timezone.localdate(created_at), total_tickets=F('total_tickets') + 1)
+
+
+def record_response(created_at, responded_at):
+    _update_day(
+        timezone.localdate(responded_at),
+        avg_response_time=_running_average(
+            'avg_response_time', 'responded_tickets', _hours(responded_at - created_at)
+        ),
+        responded_tickets=F('responded_tickets') + 1,
+    )
+
+
+def record_resolved(created_at, resolved_at):
+    _update_day(
+        timezone.localdate(resolved_at),
+        avg_resolution_time=_running_average(
+            'avg_resolution_time', 'resolved_tickets', _hours(resolved_at - created_at)
+        ),
+        resolved_tickets=F('resolved_tickets') + 1,
+    )
+
+
+def _state(ticket):
+    # Loaded values only; reading a deferred field would query per row.
+    values = ticket.__dict__
+    return values.get('first_response_at'), values.get('resolved_at')
+
+
+def remember_state(instance, **kwargs):
+    instance._metrics_state = _state(instance)
+
+
+def track_ticket(sender, instance, created, **kwargs):
+    responded_before, resolved_before = getattr(instance, '_metrics_state', (None, None))
+    responded_at, resolved_at = _state(instance)
+    created_at = instance.created_at
+    if created:
+        transaction.on_commit(lambda: record_created(created_at))
+    if responded_at and not responded_before:
+        transaction.on_commit(lambda: record_response(created_at, responded_at))
+    if resolved_at and not resolved_before:
+        transaction.on_commit(lambda: record_resolved(created_at, resolved_at))
+    remember_state(instance)
+
+
+def track_reply(sender, instance, created, **kwargs):
+    """A ticket's first public reply counts as its first response."""
+    if not created or instance.is_internal:
+        return
+    updated = SupportTicket.objects.filter(
+        pk=instance.ticket_id, first_response_at__isnull=True,
+    ).update(first_response_at=instance.created_at)
+    if updated:
+        created_at = SupportTicket.objects.values_list('created_at', flat=True).get(pk=instance.ticket_id)
+        responded_at = instance.created_at
+        transaction.on_commit(lambda: record_response(created_at, responded_at))
+        bump_tags([model_tag(SupportTicket)])
+
+
+def rebuild(start, end):
+    """Recompute the event-driven columns for every day in ``[start, end]``; returns rows written."""
+    tz = timezone.get_current_timezone()
+    since = timezone.make_aware(datetime.combine(start, datetime.min.time()), tz)
+    until = since + timedelta(days=(end - start).days + 1)
+    days = {
+        start + timedelta(days=offset): {
+            'total_tickets': 0, 'responded_tickets': 0, 'resolved_tickets': 0,
+            'avg_response_time': 0, 'avg_resolution_time': 0,
+        }
+        for offset in range((end - start).days + 1)
+    }
+
+    def grouped(field, **aggregates):
+        return (
+            SupportTicket.objects.filter(**{f'{field}__gte': since, f'{field}__lt': until})
+            .annotate(day=TruncDate(field, tzinfo=tz)).values('day').annotate(**aggregates).order_by()
+        )
+
+    def age(field):
+        return Avg(ExpressionWrapper(F(field) - F('created_at'), output_field=DurationField()))
+
+    for row in grouped('created_at', count=Count('id')):
+        days[row['day']]['total_tickets'] = row['count']
+    for row in grouped('first_response_at', count=Count('id'), wait=age('first_response_at')):
+        days[row['day']].update(responded_tickets=row['count'], avg_response_time=round(_hours(row['wait']), 2))
+    for row in grouped('resolved_at', count=Count('id'), wait=age('resolved_at')):
+        days[row['day']].update(resolved_tickets=row['count'], avg_resolution_time=round(_hours(row['wait']), 2))
+
+    fields = list(next(iter(days.values())))
+    SupportMetrics.objects.bulk_create(
+        [SupportMetrics(date=day, **values) for day, values in days.items()],
+        batch_size=500, update_conflicts=True, unique_fields=['date'], update_fields=fields,
+    )
+    bump_tags([model_tag(SupportMetrics)])
+    return len(days)
+
+
+def connect_signals():
+    post_init.connect(remember_state, sender=SupportTicket, dispatch_uid='crm.metrics.ticket')
+    post_save.connect(track_ticket, sender=SupportTicket, dispatch_uid='crm.metrics.ticket')
+    post_save.connect(track_reply, sender=TicketResponse, dispatch_uid='crm.metrics.reply')
@@ -50,21 +50,46 @@ class SupportTicket(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
     closed_at = models.DateTimeField(null=True, blank=True)
     due_date = models.DateTimeField(null=True, blank=True)
+    response_due_date = models.DateTimeField(null=True, blank=True)
+    first_response_at = models.DateTimeField(null=True, blank=True)
+    sla_breached = models.BooleanField(default=False)
+    response_breached = models.BooleanField(default=False)
     tags = models.JSONField(default=list)
     
     class Meta:
         ordering = ['-priority', '-created_at']
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='support_ticket_status_due_idx'),
+            models.Index(fields=['status', 'response_due_date'], name='support_ticket_response_idx'),
+        ]
     
     def __str__(self):
         return f"{self.ticket_number} - {self.title}"
     
     def save(self, *args, **kwargs):
+        if self._state.adding and not self.ticket_number:
+            from .numbering import next_ticket_number
+            self.ticket_number = next_ticket_number()
+        if self._state.adding and self.due_date is None:
+            from .sla import resolution_due
+            self.due_date = resolution_due(self.priority)
+        if self._state.adding and self.response_due_date is None:
+            from .sla import response_due
+            self.response_due_date = response_due(self.priority)
         if self.status in ['resolved', 'closed'] and not self.resolved_at:
             self.resolved_at = timezone.now()
         if self.status == 'closed' and not self.closed_at:
             self.closed_at = timezone.now()
         super().save(*args, **kwargs)
 
+class TicketSequence(models.Model):
+    """Counter behind generated ticket numbers, leased in blocks"""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.name} at {self.next_value}"
+
 class TicketResponse(models.Model):
     """Ticket responses and communication history"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -188,6 +213,7 @@ class SupportMetrics(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     date = models.DateField()
     total_tickets = models.IntegerField(default=0)
+    responded_tickets = models.IntegerField(default=0)
     resolved_tickets = models.IntegerField(default=0)
     avg_response_time = models.DecimalField(max_digits=8, decimal_places=2, default=0)  # In hours
     avg_resolution_time = models.DecimalField(max_digits=8, decimal_places=2, default=0)  # In hours
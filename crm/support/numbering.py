@@ -0,0 +1,136 @@
+"""
+Ticket number allocation.
+
+Each process leases a block of ``TICKET_NUMBER_BLOCK_SIZE`` numbers from a
+``TicketSequence`` row with a single atomic increment and hands them out from
+memory, so creating a ticket normally costs no extra round-trip. Numbers are
+unique across workers and increase within each worker; blocks leased by
+different workers interleave.
+
+A lease is committed independently of the caller's transaction so that a
+rollback cannot return a block another worker may then lease again. Leases
+requested inside a transaction go through one connection owned by the
+allocator, used under its lock and replaced when the database drops it. On
+SQLite, whose single writer rules out a second connection while a
+transaction is open, a lease made inside a transaction takes only the
+number it needs and shares the caller's fate.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, InterfaceError, OperationalError, connections
+
+from .models import TicketSequence
+
+
+SEQUENCE_NAME = 'support_ticket'
+TICKET_NUMBER_FORMAT = 'TKT-{:08d}'
+
+
+def _lease(connection, name, size):
+    """Reserve ``size`` numbers on ``connection``; returns the first one."""
+    table = connection.ops.quote_name(TicketSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET next_value = next_value + %s WHERE name = %s', [size, name]
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                f'INSERT INTO {table} (name, next_value) VALUES (%s, %s)', [name, 1 + size]
+            )
+            return 1
+        cursor.execute(f'SELECT next_value FROM {table} WHERE name = %s', [name])
+        return cursor.fetchone()[0] - size
+
+
+def _lease_committed(connection, name, size):
+    """Lease in a transaction of its own on a connection outside any atomic block."""
+    autocommit = connection.get_autocommit()
+    connection.set_autocommit(False)
+    try:
+        try:
+            start = _lease(connection, name, size)
+        except IntegrityError:
+            # Another worker created the row first.
+            connection.rollback()
+            start = _lease(connection, name, size)
+        connection.commit()
+        return start
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_autocommit(autocommit)
+
+
+class BlockAllocator:
+    """Hand out numbers from leased blocks of a named ``TicketSequence``."""
+
+    def __init__(self, name, block_size, using=DEFAULT_DB_ALIAS):
+        self.name = name
+        self.block_size = block_size
+        self.using = using
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._connection = None
+
+    def _own_connection(self):
+        """The allocator's connection; callers hold ``_lock``, so threads take turns on it."""
+        if self._connection is None:
+            self._connection = connections.create_connection(self.using)
+            self._connection.inc_thread_sharing()
+        else:
+            self._connection.close_if_unusable_or_obsolete()
+        return self._connection
+
+    def _drop_connection(self):
+        connection, self._connection = self._connection, None
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+
+    def _lease_block(self, size):
+        connection = connections[self.using]
+        if not connection.in_atomic_block:
+            return _lease_committed(connection, self.name, size)
+        # The caller's transaction must not own the lease.
+        try:
+            return _lease_committed(self._own_connection(), self.name, size)
+        except (OperationalError, InterfaceError):
+            # The server closed an idle connection; retry once on a new one.
+            self._drop_connection()
+            return _lease_committed(self._own_connection(), self.name, size)
+
+    def allocate(self, count=1):
+        """Return ``count`` numbers that no other caller will ever receive."""
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                needed = count - len(numbers)
+                if self._next >= self._end:
+                    connection = connections[self.using]
+                    if connection.in_atomic_block and connection.vendor == 'sqlite':
+                        start = _lease(connection, self.name, needed)
+                        numbers.extend(range(start, start + needed))
+                        break
+                    size = max(self.block_size, needed)
+                    self._next = self._lease_block(size)
+                    self._end = self._next + size
+                take = min(needed, self._end - self._next)
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+        return numbers
+
+
+ticket_numbers = BlockAllocator(SEQUENCE_NAME, settings.TICKET_NUMBER_BLOCK_SIZE)
+
+
+def next_ticket_number():
+    return TICKET_NUMBER_FORMAT.format(ticket_numbers.allocate()[0])
+
+
+def ticket_number_batch(count):
+    """Ticket numbers for a bulk insert."""
+    return [TICKET_NUMBER_FORMAT.format(number) for number in ticket_numbers.allocate(count)]
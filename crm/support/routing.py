@@ -0,0 +1,240 @@
+"""
+Skills-based ticket routing.
+
+The router keeps every ``SupportTeam`` agent in memory with their skills,
+availability, shift calendar and current open-ticket load, and one min-heap
+per skill ordered by utilization (``load / max_tickets``). Picking an agent
+pops the heap until it finds a current, on-shift entry with spare capacity;
+entries made stale by a load change are skipped and discarded (lazy
+deletion), so a decision costs O(log n) and never queries tickets.
+
+Loads follow ticket saves through signals. The index is rebuilt from
+``SupportTeam`` plus one grouped count of open tickets whenever the team
+table changes or ``SUPPORT_ROUTING_REFRESH`` seconds pass, which also folds
+in assignments made by other workers.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, get_tag_versions, model_tag
+
+from .models import SupportTeam, SupportTicket
+from .sla import OPEN_STATUSES, BusinessCalendar
+
+
+ANY_SKILL = '*'
+UNKNOWN = object()
+
+
+class Agent:
+    __slots__ = ('user_id', 'skills', 'max_tickets', 'available', 'calendar', 'load', 'version')
+
+    def __init__(self, profile, load):
+        self.user_id = profile.user_id
+        self.skills = {str(skill).lower() for skill in [*profile.skills, *profile.specializations]}
+        self.max_tickets = max(profile.max_tickets, 1)
+        self.available = profile.is_available
+        self.calendar = BusinessCalendar(profile.working_hours)
+        self.load = load
+        self.version = 0
+
+    def utilization(self):
+        return self.load / self.max_tickets
+
+
+class TicketRouter:
+    """In-memory agent index answering "who takes this ticket" from per-skill heaps."""
+
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._agents = {}
+        self._heaps = {}
+        self._counter = itertools.count()
+        self._team_version = None
+        self._loaded_at = 0
+
+    def _push(self, agent):
+        entry = (agent.utilization(), agent.load, next(self._counter), agent.user_id, agent.version)
+        for skill in (*agent.skills, ANY_SKILL):
+            heapq.heappush(self._heaps.setdefault(skill, []), entry)
+
+    def _touch(self, agent):
+        """Record a state change: older heap entries for the agent become stale."""
+        agent.version += 1
+        if agent.available:
+            self._push(agent)
+
+    def _ensure_loaded(self):
+        tag = model_tag(SupportTeam)
+        version = get_tag_versions([tag])[tag]
+        if version == self._team_version and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        loads = dict(
+            SupportTicket.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+            .values_list('assigned_to').annotate(open_tickets=Count('id')).order_by()
+        )
+        self._agents = {
+            profile.user_id: Agent(profile, loads.get(profile.user_id, 0))
+            for profile in SupportTeam.objects.all()
+        }
+        self._heaps = {}
+        for agent in self._agents.values():
+            if agent.available:
+                self._push(agent)
+        self._team_version = version
+        self._loaded_at = time.monotonic()
+
+    def _compact(self, skill):
+        heap = self._heaps[skill]
+        if len(heap) > 4 * max(len(self._agents), 16):
+            heap[:] = [entry for entry in heap if self._is_current(entry)]
+            heapq.heapify(heap)
+
+    def _is_current(self, entry):
+        agent = self._agents.get(entry[3])
+        return agent is not None and agent.available and agent.version == entry[4]
+
+    def _pick(self, skill, now, exclude=()):
+        heap = self._heaps.get(skill)
+        if not heap:
+            return None
+        off_shift = []
+        chosen = None
+        while heap:
+            entry = heap[0]
+            if not self._is_current(entry):
+                heapq.heappop(heap)
+                continue
+            if entry[0] >= 1:
+                # Lowest utilization is already at capacity.
+                break
+            agent = self._agents[entry[3]]
+            if agent.user_id in exclude or not agent.calendar.is_open(now):
+                off_shift.append(heapq.heappop(heap))
+                continue
+            chosen = agent
+            break
+        for entry in off_shift:
+            heapq.heappush(heap, entry)
+        self._compact(skill)
+        return chosen
+
+    def choose(self, ticket_type, now=None, exclude=()):
+        """Agent user id for a ticket of ``ticket_type``, or None when nobody can take it."""
+        now = now or timezone.now()
+        with self._lock:
+            self._ensure_loaded()
+            agent = self._pick(str(ticket_type).lower(), now, exclude) or self._pick(ANY_SKILL, now, exclude)
+            if agent is None:
+                return None
+            agent.load += 1
+            self._touch(agent)
+            return agent.user_id
+
+    def adjust(self, user_id, delta):
+        with self._lock:
+            agent = self._agents.get(user_id)
+            if agent is not None:
+                agent.load = max(0, agent.load + delta)
+                self._touch(agent)
+
+    def assign(self, ticket):
+        """Route one ticket and persist the assignment; returns the agent id or None."""
+        user_id = self.choose(ticket.ticket_type)
+        if user_id is None:
+            return None
+        now = timezone.now()
+        ticket.assigned_to_id = user_id
+        ticket.updated_at = now
+        # save() would count the new assignment against the agent a second time.
+        SupportTicket.objects.filter(pk=ticket.pk).update(assigned_to_id=user_id, updated_at=now)
+        remember_assignment(ticket)
+        bump_tags([model_tag(SupportTicket)])
+        return user_id
+
+    def reassign_from(self, user_id):
+        """Move every open ticket of an agent to other agents; returns how many moved."""
+        tickets = list(
+            SupportTicket.objects.filter(assigned_to_id=user_id, status__in=OPEN_STATUSES)
+            .only('id', 'ticket_type', 'assigned_to', 'status')
+        )
+        moved = []
+        for ticket in tickets:
+            target = self.choose(ticket.ticket_type, exclude={user_id})
+            if target is None:
+                break
+            ticket.assigned_to_id = target
+            moved.append(ticket)
+        if not moved:
+            return 0
+        with transaction.atomic():
+            SupportTicket.objects.bulk_update(moved, ['assigned_to'], batch_size=500)
+        self.adjust(user_id, -len(moved))
+        for ticket in moved:
+            remember_assignment(ticket)
+        bump_tags([model_tag(SupportTicket)])
+        return len(moved)
+
+
+router = TicketRouter(settings.SUPPORT_ROUTING_REFRESH)
+
+
+def _counted(ticket):
+    """The agent a ticket counts against, if it is open and assigned."""
+    # Read loaded values only; touching a deferred field would query per row.
+    values = ticket.__dict__
+    if 'status' not in values or 'assigned_to_id' not in values:
+        return UNKNOWN
+    return values['assigned_to_id'] if values['status'] in OPEN_STATUSES else None
+
+
+def remember_assignment(instance, **kwargs):
+    instance._routing_agent = _counted(instance)
+
+
+def track_ticket_load(sender, instance, created, **kwargs):
+    previous, current = getattr(instance, '_routing_agent', UNKNOWN), _counted(instance)
+    if UNKNOWN not in (previous, current) and previous != current:
+        if previous is not None:
+            transaction.on_commit(lambda: router.adjust(previous, -1))
+        if current is not None:
+            transaction.on_commit(lambda: router.adjust(current, 1))
+    remember_assignment(instance)
+
+
+def release_ticket_load(sender, instance, **kwargs):
+    previous = getattr(instance, '_routing_agent', UNKNOWN)
+    if previous is not None and previous is not UNKNOWN:
+        transaction.on_commit(lambda: router.adjust(previous, -1))
+
+
+def remember_availability(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._was_available = False
+        return
+    instance._was_available = (
+        SupportTeam.objects.filter(pk=instance.pk).values_list('is_available', flat=True).first()
+    )
+
+
+def reassign_when_offline(sender, instance, **kwargs):
+    if getattr(instance, '_was_available', False) and not instance.is_available:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: router.reassign_from(user_id))
+
+
+def connect_signals():
+    post_init.connect(remember_assignment, sender=SupportTicket, dispatch_uid='crm.routing.ticket')
+    post_save.connect(track_ticket_load, sender=SupportTicket, dispatch_uid='crm.routing.ticket')
+    post_delete.connect(release_ticket_load, sender=SupportTicket, dispatch_uid='crm.routing.ticket')
+    pre_save.connect(remember_availability, sender=SupportTeam, dispatch_uid='crm.routing.team')
+    post_save.connect(reassign_when_offline, sender=SupportTeam, dispatch_uid='crm.routing.team')
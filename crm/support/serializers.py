@@ -14,7 +14,7 @@ class SupportTicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = SupportTicket
         fields = '__all__'
-        read_only_fields = ['id', 'ticket_number', 'created_at', 'updated_at', 'resolved_at', 'closed_at']
+        read_only_fields = ['id', 'ticket_number', 'created_at', 'updated_at', 'resolved_at', 'closed_at', 'first_response_at', 'sla_breached', 'response_breached']
 
 
 class TicketResponseSerializer(serializers.ModelSerializer):
@@ -33,6 +33,15 @@ class ServiceLevelAgreementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_business_hours(self, value):
+        from .sla import validate_business_hours
+
+        try:
+            validate_business_hours(value)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+        return value
+
 
 class KnowledgeBaseSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
@@ -0,0 +1,247 @@
+"""
+SLA due dates and breach detection.
+
+``ServiceLevelAgreement.business_hours`` maps weekdays to opening hours::
+
+    {'mon': ['09:00', '17:00'], 'tue': ['09:00', '17:00'], 'timezone': 'Europe/Berlin'}
+
+Days that are missing are closed; an empty mapping means 24x7. Each calendar
+is compiled once into week offsets so adding N business hours is a fixed
+amount of arithmetic regardless of N. Compiled policies are reloaded when the
+SLA table version changes.
+"""
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, get_tag_versions, model_tag
+from crm.core.models import Notification, User as CRMUser
+from crm.core.notifications import send
+
+from .models import ServiceLevelAgreement, SupportTicket
+
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+OPEN_STATUSES = ('open', 'in_progress', 'waiting_customer', 'waiting_third_party')
+
+
+def _seconds(clock):
+    hours, minutes = clock.split(':')
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+def _interval(day, hours):
+    """``(open, close)`` seconds from Monday 00:00 for one entry; raises ``ValueError`` if malformed."""
+    if not isinstance(day, str) or day[:3].lower() not in WEEKDAYS:
+        raise ValueError(f'Unknown day {day!r}; use one of {", ".join(WEEKDAYS)} or timezone')
+    index = WEEKDAYS.index(day[:3].lower())
+    try:
+        if isinstance(hours, dict):
+            hours = [hours['start'], hours['end']]
+        start, end = (_seconds(clock) for clock in hours)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError(f'Hours for {day} must be ["HH:MM", "HH:MM"] or {{"start": ..., "end": ...}}')
+    if end <= start:
+        raise ValueError(f'Hours for {day} must end after they start')
+    return index * 86400 + start, index * 86400 + end
+
+
+def validate_business_hours(business_hours):
+    """Raise ``ValueError`` for an unknown day, malformed or empty hours or an unknown timezone."""
+    if not isinstance(business_hours, dict):
+        raise ValueError('Business hours must be an object')
+    business_hours = dict(business_hours)
+    zone = business_hours.pop('timezone', None)
+    if zone:
+        try:
+            ZoneInfo(zone)
+        except (ZoneInfoNotFoundError, ValueError, TypeError):
+            raise ValueError(f'Unknown timezone {zone!r}')
+    for day, hours in business_hours.items():
+        _interval(day, hours)
+
+
+class BusinessCalendar:
+    """
+    Business hours of one week, compiled to ``(open, close)`` second offsets
+    from Monday 00:00. Entries that do not validate (rows written before
+    validation, or around the serializer) are skipped rather than breaking
+    ticket saves.
+    """
+
+    def __init__(self, business_hours=None):
+        business_hours = dict(business_hours or {})
+        try:
+            self.tz = ZoneInfo(business_hours.pop('timezone', None) or settings.TIME_ZONE)
+        except (ZoneInfoNotFoundError, ValueError, TypeError):
+            self.tz = ZoneInfo(settings.TIME_ZONE)
+        self.intervals = []
+        for day, hours in business_hours.items():
+            try:
+                self.intervals.append(_interval(day, hours))
+            except ValueError:
+                continue
+        self.intervals.sort()
+        self.always_open = not self.intervals
+        # Business seconds that precede each interval within the week.
+        self.before = []
+        total = 0
+        for start, end in self.intervals:
+            self.before.append(total)
+            total += end - start
+        self.week_total = total
+
+    def _offset(self, moment):
+        local = moment.astimezone(self.tz).replace(tzinfo=None)
+        week_start = datetime.combine(local.date() - timedelta(days=local.weekday()), datetime.min.time())
+        return week_start, (local - week_start).total_seconds()
+
+    def is_open(self, moment):
+        """Whether ``moment`` falls inside business hours."""
+        if self.always_open:
+            return True
+        _, offset = self._offset(moment)
+        return any(start <= offset < end for start, end in self.intervals)
+
+    def _elapsed(self, offset):
+        """Business seconds between Monday 00:00 and ``offset``."""
+        for (start, end), before in zip(self.intervals, self.before):
+            if offset < end:
+                return before + max(0, offset - start)
+        return self.week_total
+
+    def _position(self, elapsed):
+        """Week offset at which ``elapsed`` (0 < elapsed <= week_total) business seconds are used up."""
+        for (start, end), before in zip(self.intervals, self.before):
+            if elapsed <= before + end - start:
+                return start + elapsed - before
+        return self.intervals[-1][1]
+
+    def add_hours(self, start, hours):
+        """The moment ``hours`` business hours after ``start``."""
+        if self.always_open or hours <= 0:
+            return start + timedelta(hours=hours)
+        week_start, offset = self._offset(start)
+        weeks, remainder = divmod(self._elapsed(offset) + hours * 3600, self.week_total)
+        if remainder == 0:
+            weeks, remainder = weeks - 1, self.week_total
+        due = week_start + timedelta(weeks=weeks, seconds=self._position(remainder))
+        return due.replace(tzinfo=self.tz)
+
+
+class SLAPolicy:
+    """An active SLA with its calendar compiled."""
+
+    def __init__(self, sla):
+        self.sla_id = sla.id
+        self.response_time = sla.response_time
+        self.resolution_time = sla.resolution_time
+        self.calendar = BusinessCalendar(sla.business_hours)
+
+    def response_due(self, start):
+        return self.calendar.add_hours(start, self.response_time)
+
+    def resolution_due(self, start):
+        return self.calendar.add_hours(start, self.resolution_time)
+
+
+_policies = {'version': None, 'by_priority': {}}
+_policies_lock = threading.Lock()
+
+
+def active_policies():
+    """Compiled active SLAs by priority, rebuilt only when an SLA row changes."""
+    tag = model_tag(ServiceLevelAgreement)
+    version = get_tag_versions([tag])[tag]
+    with _policies_lock:
+        if _policies['version'] != version:
+            _policies['by_priority'] = {
+                sla.priority: SLAPolicy(sla)
+                for sla in ServiceLevelAgreement.objects.filter(is_active=True)
+            }
+            _policies['version'] = version
+        return _policies['by_priority']
+
+
+def response_due(priority, start=None):
+    """First-response deadline for a ticket of ``priority`` opened at ``start``, or None without an SLA."""
+    policy = active_policies().get(priority)
+    if policy is None:
+        return None
+    return policy.response_due(start or timezone.now())
+
+
+def resolution_due(priority, start=None):
+    """Due date for a ticket of ``priority`` opened at ``start``, or None without an SLA."""
+    policy = active_policies().get(priority)
+    if policy is None:
+        return None
+    return policy.resolution_due(start or timezone.now())
+
+
+def breached_tickets(now=None):
+    """Open tickets past their due date that have not been flagged yet."""
+    return SupportTicket.objects.filter(
+        status__in=OPEN_STATUSES, due_date__lt=now or timezone.now(), sla_breached=False,
+    )
+
+
+def response_breached_tickets(now=None):
+    """Open tickets still without a first response past their response deadline, not flagged yet."""
+    return SupportTicket.objects.filter(
+        status__in=OPEN_STATUSES, first_response_at__isnull=True,
+        response_due_date__lt=now or timezone.now(), response_breached=False,
+    )
+
+
+def _sweep(tickets, flag, reason, batch_size):
+    flagged = 0
+    while True:
+        batch = list(tickets.values(
+            'id', 'ticket_number', 'title', 'assigned_to__username', 'created_by__username',
+        )[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            SupportTicket.objects.filter(pk__in=[row['id'] for row in batch]).update(**{flag: True})
+            notify_breaches(batch, reason)
+        flagged += len(batch)
+    return flagged
+
+
+def sweep_breaches(now=None, batch_size=500):
+    """
+    Flag open tickets that missed their first-response or resolution
+    deadline and notify their assignees.
+
+    Unassigned tickets notify their creator. Returns the number of response
+    and resolution breaches flagged.
+    """
+    now = now or timezone.now()
+    responses = _sweep(response_breached_tickets(now), 'response_breached', 'has no first response', batch_size)
+    resolutions = _sweep(breached_tickets(now), 'sla_breached', 'is past its due date', batch_size)
+    if responses or resolutions:
+        bump_tags([model_tag(SupportTicket)])
+    return responses, resolutions
+
+
+def notify_breaches(rows, reason='is past its due date'):
+    usernames = {row['assigned_to__username'] or row['created_by__username'] for row in rows}
+    crm_users = dict(CRMUser.objects.filter(username__in=usernames).values_list('username', 'id'))
+    notifications = []
+    for row in rows:
+        user_id = crm_users.get(row['assigned_to__username'] or row['created_by__username'])
+        if user_id is None:
+            continue
+        notifications.append(Notification(
+            user_id=user_id,
+            type='system_alert',
+            title=f"SLA breached: {row['ticket_number']}",
+            message=f"Ticket {row['ticket_number']} ({row['title']}) {reason}.",
+            related_url=f"/api/support/tickets/{row['id']}/",
+        ))
+    send(notifications)
@@ -0,0 +1,292 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from crm.core.models import Company, Customer, Notification, User as CRMUser
+
+from . import metrics, numbering, routing, sla
+from .models import (
+    ServiceLevelAgreement, SupportMetrics, SupportTeam, SupportTicket, TicketResponse, TicketSequence,
+)
+
+
+UTC = dt_timezone.utc
+WEEKDAYS_9_TO_5 = {day: ['09:00', '17:00'] for day in ('mon', 'tue', 'wed', 'thu', 'fri')}
+
+
+def make_customer(email='ada@acme.com'):
+    company = Company.objects.create(name='Acme')
+    return Customer.objects.create(first_name='Ada', last_name='Byron', email=email, company=company)
+
+
+class BusinessCalendarTests(SimpleTestCase):
+    def setUp(self):
+        self.calendar = sla.BusinessCalendar({**WEEKDAYS_9_TO_5, 'timezone': 'UTC'})
+
+    def test_hours_carry_over_the_weekend(self):
+        friday = datetime(2024, 3, 1, 15, 0, tzinfo=UTC)
+        self.assertEqual(self.calendar.add_hours(friday, 4), datetime(2024, 3, 4, 11, 0, tzinfo=UTC))
+
+    def test_start_outside_hours_waits_for_opening(self):
+        saturday = datetime(2024, 3, 2, 12, 0, tzinfo=UTC)
+        self.assertEqual(self.calendar.add_hours(saturday, 8), datetime(2024, 3, 4, 17, 0, tzinfo=UTC))
+
+    def test_several_weeks(self):
+        monday = datetime(2024, 3, 4, 9, 0, tzinfo=UTC)
+        self.assertEqual(self.calendar.add_hours(monday, 80), datetime(2024, 3, 15, 17, 0, tzinfo=UTC))
+
+    def test_empty_calendar_is_always_open(self):
+        start = datetime(2024, 3, 2, 23, 0, tzinfo=UTC)
+        self.assertEqual(sla.BusinessCalendar().add_hours(start, 3), start + timedelta(hours=3))
+
+    def test_validation(self):
+        sla.validate_business_hours({**WEEKDAYS_9_TO_5, 'sat': {'start': '10:00', 'end': '14:00'}})
+        for hours in (
+            {'funday': ['09:00', '17:00']},
+            {'mon': ['9am', '5pm']},
+            {'mon': ['17:00', '09:00']},
+            {'mon': ['09:00', '09:00']},
+            {'timezone': 'Mars/Olympus'},
+        ):
+            with self.subTest(hours=hours), self.assertRaises(ValueError):
+                sla.validate_business_hours(hours)
+
+
+class SLATests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceLevelAgreement.objects.create(name='High', priority='high', response_time=2, resolution_time=8)
+        self.customer = make_customer()
+        self.agent = AuthUser.objects.create(username='agent')
+        CRMUser.objects.create(username='agent', email='agent@example.com')
+
+    def ticket(self, **fields):
+        return SupportTicket.objects.create(**{
+            'customer': self.customer, 'title': 'Broken', 'description': 'It broke',
+            'ticket_type': 'bug', 'priority': 'high', 'created_by': self.agent, **fields,
+        })
+
+    def test_due_dates_follow_the_sla(self):
+        before = timezone.now()
+        ticket = self.ticket()
+        after = timezone.now()
+        self.assertTrue(before + timedelta(hours=2) <= ticket.response_due_date <= after + timedelta(hours=2))
+        self.assertTrue(before + timedelta(hours=8) <= ticket.due_date <= after + timedelta(hours=8))
+
+    def test_no_sla_no_due_dates(self):
+        ticket = self.ticket(priority='low')
+        self.assertIsNone(ticket.due_date)
+        self.assertIsNone(ticket.response_due_date)
+
+    def test_sweep_flags_missed_first_responses(self):
+        waiting = self.ticket()
+        answered = self.ticket(first_response_at=timezone.now())
+        later = timezone.now() + timedelta(hours=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sla.sweep_breaches(later), (1, 0))
+        waiting.refresh_from_db()
+        answered.refresh_from_db()
+        self.assertTrue(waiting.response_breached)
+        self.assertFalse(waiting.sla_breached)
+        self.assertFalse(answered.response_breached)
+        notification = Notification.objects.get()
+        self.assertIn('no first response', notification.message)
+        self.assertEqual(sla.sweep_breaches(later), (0, 0))
+
+    def test_sweep_flags_resolution_breaches_of_open_tickets(self):
+        overdue = self.ticket(first_response_at=timezone.now())
+        self.ticket(first_response_at=timezone.now(), status='resolved')
+        later = timezone.now() + timedelta(hours=9)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sla.sweep_breaches(later), (0, 1))
+        overdue.refresh_from_db()
+        self.assertTrue(overdue.sla_breached)
+        self.assertIn('past its due date', Notification.objects.get().message)
+
+
+class TicketNumberTests(TransactionTestCase):
+    def setUp(self):
+        self.allocator = numbering.BlockAllocator('test', block_size=10)
+
+    def next_value(self):
+        return TicketSequence.objects.get(name='test').next_value
+
+    def test_numbers_come_from_leased_blocks(self):
+        self.assertEqual(self.allocator.allocate(3), [1, 2, 3])
+        self.assertEqual(self.next_value(), 11)
+        self.assertEqual(self.allocator.allocate(9), list(range(4, 13)))
+        self.assertEqual(self.next_value(), 21)
+
+    def test_other_allocators_get_other_blocks(self):
+        other = numbering.BlockAllocator('test', block_size=10)
+        self.assertEqual(self.allocator.allocate(), [1])
+        self.assertEqual(other.allocate(), [11])
+        self.assertEqual(self.allocator.allocate(), [2])
+
+    def test_large_requests_lease_what_they_need(self):
+        self.assertEqual(len(set(self.allocator.allocate(25))), 25)
+        self.assertEqual(self.next_value(), 26)
+
+    def test_batch_format(self):
+        with mock.patch.object(numbering, 'ticket_numbers', self.allocator):
+            self.assertEqual(numbering.ticket_number_batch(2), ['TKT-00000001', 'TKT-00000002'])
+
+
+class TicketNumberConnectionTests(SimpleTestCase):
+    def setUp(self):
+        self.allocator = numbering.BlockAllocator('test', block_size=10)
+        self.connections = mock.MagicMock()
+        self.connections.__getitem__.return_value = mock.Mock(in_atomic_block=True, vendor='postgresql')
+        patcher = mock.patch.object(numbering, 'connections', self.connections)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_leases_inside_a_transaction_reuse_one_connection(self):
+        with mock.patch.object(numbering, '_lease_committed', side_effect=[1, 11]) as lease:
+            self.allocator.allocate(8)
+            self.allocator.allocate(8)
+        self.assertEqual(self.connections.create_connection.call_count, 1)
+        own = self.connections.create_connection.return_value
+        self.assertEqual([call.args[0] for call in lease.call_args_list], [own, own])
+        own.close_if_unusable_or_obsolete.assert_called_once_with()
+
+    def test_dropped_connection_is_replaced(self):
+        broken, fresh = mock.Mock(), mock.Mock()
+        self.connections.create_connection.side_effect = [broken, fresh]
+        with mock.patch.object(numbering, '_lease_committed', side_effect=[OperationalError(), 1]) as lease:
+            self.assertEqual(self.allocator.allocate(), [1])
+        broken.close.assert_called_once_with()
+        self.assertIs(lease.call_args.args[0], fresh)
+
+
+class RoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer()
+        self.router = routing.TicketRouter(refresh_seconds=3600)
+
+    def agent(self, username, skills=(), max_tickets=10, open_tickets=0, **fields):
+        user = AuthUser.objects.create(username=username)
+        SupportTeam.objects.create(user=user, skills=list(skills), max_tickets=max_tickets, **fields)
+        for _ in range(open_tickets):
+            self.ticket(assigned_to=user)
+        return user.id
+
+    def ticket(self, ticket_type='bug', **fields):
+        return SupportTicket.objects.create(
+            customer=self.customer, title='Broken', description='It broke', ticket_type=ticket_type, **fields,
+        )
+
+    def test_least_utilized_skilled_agent(self):
+        self.agent('busy', skills=['bug'], open_tickets=5)
+        idle = self.agent('idle', skills=['bug'], open_tickets=1)
+        self.agent('billing', skills=['billing'])
+        self.assertEqual(self.router.choose('bug'), idle)
+
+    def test_falls_back_to_any_agent_without_the_skill(self):
+        generalist = self.agent('generalist', skills=['billing'])
+        self.assertEqual(self.router.choose('bug'), generalist)
+
+    def test_full_and_unavailable_agents_are_skipped(self):
+        self.agent('full', skills=['bug'], max_tickets=1, open_tickets=1)
+        self.agent('away', skills=['bug'], is_available=False)
+        self.assertIsNone(self.router.choose('bug'))
+
+    def test_choices_count_against_the_agent(self):
+        first = self.agent('first', skills=['bug'])
+        second = self.agent('second', skills=['bug'])
+        picks = [self.router.choose('bug') for _ in range(4)]
+        self.assertEqual(sorted(picks), sorted([first, second] * 2))
+
+    def test_off_shift_agents_are_skipped(self):
+        self.agent('night', skills=['bug'], working_hours={'sun': ['00:00', '00:01'], 'timezone': 'UTC'})
+        day = self.agent('day', skills=['bug'], open_tickets=3)
+        monday = datetime(2024, 3, 4, 12, 0, tzinfo=UTC)
+        self.assertEqual(self.router.choose('bug', now=monday), day)
+
+    def test_assign_persists_and_tracks_load_on_commit(self):
+        agent = self.agent('agent', skills=['bug'], max_tickets=2)
+        with mock.patch.object(routing, 'router', self.router):
+            ticket = self.ticket()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.router.assign(ticket), agent)
+            self.assertEqual(SupportTicket.objects.get(pk=ticket.pk).assigned_to_id, agent)
+            self.assertEqual(self.router._agents[agent].load, 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket.status = 'resolved'
+                ticket.save()
+            self.assertEqual(self.router._agents[agent].load, 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer()
+        self.agent = AuthUser.objects.create(username='agent')
+
+    def ticket(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SupportTicket.objects.create(
+                customer=self.customer, title='Broken', description='It broke', ticket_type='bug',
+            )
+
+    def today(self):
+        return SupportMetrics.objects.get(date=timezone.localdate())
+
+    def test_running_averages(self):
+        opened = datetime(2024, 3, 4, 8, 0, tzinfo=UTC)
+        metrics.record_response(opened, opened + timedelta(hours=2))
+        metrics.record_response(opened, opened + timedelta(hours=4))
+        metrics.record_resolved(opened, opened + timedelta(hours=5))
+        row = SupportMetrics.objects.get(date=opened.date())
+        self.assertEqual(row.responded_tickets, 2)
+        self.assertEqual(float(row.avg_response_time), 3.0)
+        self.assertEqual(row.resolved_tickets, 1)
+        self.assertEqual(float(row.avg_resolution_time), 5.0)
+
+    def test_first_public_reply_is_the_first_response(self):
+        ticket = self.ticket()
+        self.assertEqual(self.today().total_tickets, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            TicketResponse.objects.create(ticket=ticket, user=self.agent, message='Looking', is_internal=True)
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.first_response_at)
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = TicketResponse.objects.create(ticket=ticket, user=self.agent, message='Fixed soon')
+            TicketResponse.objects.create(ticket=ticket, user=self.agent, message='Fixed now')
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.first_response_at, reply.created_at)
+        self.assertEqual(self.today().responded_tickets, 1)
+
+    def test_resolution_counts_once(self):
+        ticket = self.ticket()
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.status = 'resolved'
+            ticket.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.status = 'closed'
+            ticket.save()
+        self.assertEqual(self.today().resolved_tickets, 1)
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        ticket = self.ticket()
+        with self.captureOnCommitCallbacks(execute=True):
+            TicketResponse.objects.create(ticket=ticket, user=self.agent, message='On it')
+        ticket = SupportTicket.objects.get(pk=ticket.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.status = 'resolved'
+            ticket.save()
+        expected = self.today()
+        SupportMetrics.objects.all().delete()
+        day = timezone.localdate()
+        self.assertEqual(metrics.rebuild(day - timedelta(days=1), day), 2)
+        row = self.today()
+        for field in ('total_tickets', 'responded_tickets', 'resolved_tickets'):
+            self.assertEqual(getattr(row, field), getattr(expected, field), field)
+        self.assertEqual(SupportMetrics.objects.get(date=day - timedelta(days=1)).total_tickets, 0)
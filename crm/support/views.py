@@ -4,11 +4,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
+from django.db.models import F, FloatField, Sum
 from django.utils import timezone
 from .models import (
     SupportTicket, TicketResponse, ServiceLevelAgreement, KnowledgeBase,
     CustomerFeedback, SupportTeam, SupportMetrics
 )
+from .routing import router
 from .serializers import (
     SupportTicketSerializer, TicketResponseSerializer, ServiceLevelAgreementSerializer,
     KnowledgeBaseSerializer, CustomerFeedbackSerializer, SupportTeamSerializer,
@@ -16,7 +19,7 @@ from .serializers import (
 )
 
 
-class SupportTicketViewSet(viewsets.ModelViewSet):
+class SupportTicketViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SupportTicket.objects.all()
     serializer_class = SupportTicketSerializer
     permission_classes = [IsAuthenticated]
@@ -26,15 +29,24 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
     ordering_fields = ['priority', 'created_at', 'due_date', 'resolved_at']
     ordering = ['-priority', '-created_at']
 
+    def perform_create(self, serializer):
+        ticket = serializer.save()
+        if ticket.assigned_to_id is None:
+            router.assign(ticket)
+
     @action(detail=True, methods=['post'])
     def assign(self, request, pk=None):
+        """Assign to ``user_id``, or route to the best available agent when omitted"""
         ticket = self.get_object()
         user_id = request.data.get('user_id')
         if user_id:
             ticket.assigned_to_id = user_id
             ticket.save()
             return Response({'status': 'Ticket assigned'})
-        return Response({'error': 'User ID required'}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = router.assign(ticket)
+        if user_id is None:
+            return Response({'error': 'No available agent'}, status=status.HTTP_409_CONFLICT)
+        return Response({'status': 'Ticket assigned', 'user_id': user_id})
 
     @action(detail=True, methods=['post'])
     def resolve(self, request, pk=None):
@@ -53,7 +65,7 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Ticket closed'})
 
 
-class TicketResponseViewSet(viewsets.ModelViewSet):
+class TicketResponseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = TicketResponse.objects.all()
     serializer_class = TicketResponseSerializer
     permission_classes = [IsAuthenticated]
@@ -64,7 +76,7 @@ class TicketResponseViewSet(viewsets.ModelViewSet):
     ordering = ['created_at']
 
 
-class ServiceLevelAgreementViewSet(viewsets.ModelViewSet):
+class ServiceLevelAgreementViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ServiceLevelAgreement.objects.all()
     serializer_class = ServiceLevelAgreementSerializer
     permission_classes = [IsAuthenticated]
@@ -75,7 +87,7 @@ class ServiceLevelAgreementViewSet(viewsets.ModelViewSet):
     ordering = ['priority', 'response_time']
 
 
-class KnowledgeBaseViewSet(viewsets.ModelViewSet):
+class KnowledgeBaseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = KnowledgeBase.objects.all()
     serializer_class = KnowledgeBaseSerializer
     permission_classes = [IsAuthenticated]
@@ -93,7 +105,7 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
         return Response({'status': 'View count incremented'})
 
 
-class CustomerFeedbackViewSet(viewsets.ModelViewSet):
+class CustomerFeedbackViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CustomerFeedback.objects.all()
     serializer_class = CustomerFeedbackSerializer
     permission_classes = [IsAuthenticated]
@@ -104,7 +116,7 @@ class CustomerFeedbackViewSet(viewsets.ModelViewSet):
     ordering = ['-rating', '-created_at']
 
 
-class SupportTeamViewSet(viewsets.ModelViewSet):
+class SupportTeamViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SupportTeam.objects.all()
     serializer_class = SupportTeamSerializer
     permission_classes = [IsAuthenticated]
@@ -115,7 +127,7 @@ class SupportTeamViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class SupportMetricsViewSet(viewsets.ModelViewSet):
+class SupportMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SupportMetrics.objects.all()
     serializer_class = SupportMetricsSerializer
     permission_classes = [IsAuthenticated]
@@ -128,13 +140,17 @@ class SupportMetricsViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get support metrics summary"""
-        total_tickets = sum(metric.total_tickets for metric in self.get_queryset())
-        resolved_tickets = sum(metric.resolved_tickets for metric in self.get_queryset())
-        avg_resolution_time = sum(metric.avg_resolution_time.total_seconds() for metric in self.get_queryset() if metric.avg_resolution_time) / max(len(self.get_queryset()), 1)
+        totals = self.get_queryset().aggregate(
+            tickets=Sum('total_tickets'),
+            resolved=Sum('resolved_tickets'),
+            resolution_hours=Sum(F('avg_resolution_time') * F('resolved_tickets'), output_field=FloatField()),
+        )
+        total_tickets = totals['tickets'] or 0
+        resolved_tickets = totals['resolved'] or 0
         
         return Response({
             'total_tickets': total_tickets,
             'resolved_tickets': resolved_tickets,
             'resolution_rate': (resolved_tickets / total_tickets * 100) if total_tickets > 0 else 0,
-            'avg_resolution_time_hours': avg_resolution_time / 3600
+            'avg_resolution_time_hours': float(totals['resolution_hours'] or 0) / max(resolved_tickets, 1)
         })
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SurveysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm.surveys'
+
+    def ready(self):
+        from . import nps, results
+        nps.connect_signals()
+        results.connect_signals()
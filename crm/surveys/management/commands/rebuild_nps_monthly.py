@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm.surveys.nps import rebuild_monthly
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-company monthly NPS table from NPS scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', help='Only rebuild this company id')
+
+    def handle(self, *args, **options):
+        written = rebuild_monthly(company=options['company'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} monthly NPS row(s)'))
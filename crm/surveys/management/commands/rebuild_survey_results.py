@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from crm.surveys.models import Survey
+from crm.surveys.results import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the survey results cube from stored answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey', type=int, help='Only rebuild this survey id')
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options['survey']:
+            surveys = surveys.filter(pk=options['survey'])
+        for survey_id in surveys.values_list('id', flat=True).iterator():
+            cells = rebuild(survey_id)
+            self.stdout.write(f'Survey {survey_id}: {cells} cell(s)')
+        self.stdout.write(self.style.SUCCESS('Survey results rebuilt'))
@@ -70,6 +70,9 @@ class SurveyResponse(models.Model):
     is_completed = models.BooleanField(default=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
+    # Customer status and company the answers are counted under in the results cube.
+    counted_status = models.CharField(max_length=20, null=True, blank=True)
+    counted_company_id = models.UUIDField(null=True, blank=True)
     
     class Meta:
         ordering = ['-started_at']
@@ -105,11 +108,36 @@ class NPSScore(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['customer', 'company', 'survey_response']
+        indexes = [
+            models.Index(fields=['company', 'created_at'], name='nps_company_created_idx'),
+        ]
     
     def __str__(self):
         return f"NPS {self.score} - {self.customer.name}"
 
 
+class NPSMonthly(models.Model):
+    """Promoter, passive and detractor counts per company and calendar month"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='nps_monthly')
+    month = models.DateField()  # First day of the month
+    promoters = models.IntegerField(default=0)
+    passives = models.IntegerField(default=0)
+    detractors = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['company', 'month']
+        verbose_name_plural = "NPS monthly"
+    
+    def __str__(self):
+        return f"NPS {self.month:%Y-%m} - {self.company.name}"
+    
+    @property
+    def nps_score(self):
+        return ((self.promoters - self.detractors) / self.total * 100) if self.total else 0
+
+
 class SurveyTemplate(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -141,3 +169,22 @@ class SurveyMetrics(models.Model):
     
     def __str__(self):
         return f"{self.survey.title} - {self.completion_rate}% completion"
+
+
+class SurveyResultCell(models.Model):
+    """Answer count for one question option or scale value within a customer segment"""
+    survey = models.ForeignKey(Survey, on_delete=models.CASCADE, related_name='result_cells')
+    question = models.ForeignKey(SurveyQuestion, on_delete=models.CASCADE, related_name='result_cells')
+    dimension = models.CharField(max_length=20)  # all, status or company
+    dimension_value = models.CharField(max_length=100, blank=True)
+    bucket = models.CharField(max_length=255)  # Option label or scale value
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['question', 'dimension', 'dimension_value', 'bucket']
+        indexes = [
+            models.Index(fields=['survey', 'dimension'], name='survey_result_dimension_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.question_id} {self.dimension}={self.dimension_value} {self.bucket}: {self.count}"
@@ -0,0 +1,168 @@
+"""
+NPS analytics.
+
+``breakdown`` classifies scores into promoters (9-10), passives (7-8) and
+detractors (0-6) with one conditional aggregate. Per-company monthly counts
+are materialized in ``NPSMonthly`` and kept current by ``NPSScore`` signals,
+so rolling NPS over any number of months reads a handful of rows instead of
+every score. ``rebuild_monthly`` recomputes the table for rows written
+without signals (``bulk_create``, imports).
+"""
+from datetime import date, datetime, time
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from crm.core.cache import bump_tags, model_tag
+
+from .models import NPSMonthly, NPSScore
+
+
+BUCKETS = {
+    'promoters': Q(score__gte=9),
+    'passives': Q(score__gte=7, score__lte=8),
+    'detractors': Q(score__lte=6),
+}
+
+
+def bucket(score):
+    if score >= 9:
+        return 'promoters'
+    if score >= 7:
+        return 'passives'
+    return 'detractors'
+
+
+def nps(promoters, detractors, total):
+    return ((promoters - detractors) / total * 100) if total else 0
+
+
+def _moment(value):
+    if isinstance(value, datetime):
+        return value
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def scores(company=None, survey=None, start=None, end=None):
+    """NPS scores narrowed to a company, survey and ``[start, end)`` period (dates or datetimes)."""
+    queryset = NPSScore.objects.all()
+    if company:
+        queryset = queryset.filter(company_id=company)
+    if survey:
+        queryset = queryset.filter(survey_response__survey_id=survey)
+    if start:
+        queryset = queryset.filter(created_at__gte=_moment(start))
+    if end:
+        queryset = queryset.filter(created_at__lt=_moment(end))
+    return queryset
+
+
+def breakdown(queryset):
+    """Promoter, passive and detractor counts plus NPS in a single query."""
+    counts = queryset.aggregate(**{name: Count('id', filter=condition) for name, condition in BUCKETS.items()})
+    total = sum(counts.values())
+    return {
+        'total_responses': total,
+        **counts,
+        'nps_score': nps(counts['promoters'], counts['detractors'], total),
+    }
+
+
+def month_start(moment):
+    day = timezone.localdate(moment)
+    return date(day.year, day.month, 1)
+
+
+def months_back(months, today=None):
+    """First day of the month ``months - 1`` months before the current one."""
+    today = today or timezone.localdate()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def rolling(company, months=12):
+    """NPS over the last ``months`` calendar months from the materialized table."""
+    totals = NPSMonthly.objects.filter(company_id=company, month__gte=months_back(months)).aggregate(
+        promoters=Sum('promoters'), passives=Sum('passives'), detractors=Sum('detractors'),
+    )
+    counts = {name: totals[name] or 0 for name in BUCKETS}
+    total = sum(counts.values())
+    return {
+        'months': months,
+        'total_responses': total,
+        **counts,
+        'nps_score': nps(counts['promoters'], counts['detractors'], total),
+    }
+
+
+def _apply(company_id, month, name, delta):
+    changes = {name: F(name) + delta, 'total': F('total') + delta}
+    if not NPSMonthly.objects.filter(company_id=company_id, month=month).update(**changes):
+        NPSMonthly.objects.get_or_create(company_id=company_id, month=month)
+        NPSMonthly.objects.filter(company_id=company_id, month=month).update(**changes)
+    bump_tags([model_tag(NPSMonthly)])
+
+
+def _key(score):
+    # Loaded values only; reading a deferred field would query per row.
+    values = score.__dict__
+    if values.get('score') is None or values.get('company_id') is None or values.get('created_at') is None:
+        return None
+    return values['company_id'], month_start(values['created_at']), bucket(values['score'])
+
+
+def remember_key(instance, **kwargs):
+    instance._nps_key = _key(instance)
+
+
+def track_saved(sender, instance, created, **kwargs):
+    previous, current = getattr(instance, '_nps_key', None), _key(instance)
+    if previous != current:
+        if previous and not created:
+            transaction.on_commit(lambda: _apply(*previous, -1))
+        if current:
+            transaction.on_commit(lambda: _apply(*current, 1))
+    instance._nps_key = current
+
+
+def track_deleted(sender, instance, **kwargs):
+    previous = _key(instance)
+    if previous:
+        transaction.on_commit(lambda: _apply(*previous, -1))
+
+
+def rebuild_monthly(company=None):
+    """Recompute ``NPSMonthly`` from scores with one grouped query; returns rows written."""
+    queryset = NPSScore.objects.all()
+    monthly = NPSMonthly.objects.all()
+    if company:
+        queryset = queryset.filter(company_id=company)
+        monthly = monthly.filter(company_id=company)
+    rows = (
+        queryset.annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('company_id', 'month')
+        .annotate(**{name: Count('id', filter=condition) for name, condition in BUCKETS.items()})
+        .order_by()
+    )
+    records = [
+        NPSMonthly(
+            company_id=row['company_id'], month=row['month'],
+            promoters=row['promoters'], passives=row['passives'], detractors=row['detractors'],
+            total=row['promoters'] + row['passives'] + row['detractors'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        monthly.delete()
+        NPSMonthly.objects.bulk_create(records, batch_size=1000)
+    bump_tags([model_tag(NPSMonthly)])
+    return len(records)
+
+
+def connect_signals():
+    post_init.connect(remember_key, sender=NPSScore, dispatch_uid='crm.nps.monthly')
+    post_save.connect(track_saved, sender=NPSScore, dispatch_uid='crm.nps.monthly')
+    post_delete.connect(track_deleted, sender=NPSScore, dispatch_uid='crm.nps.monthly')
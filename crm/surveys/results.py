@@ -0,0 +1,279 @@
+"""
+Survey results cube.
+
+Answers to choice and scale questions are counted into ``SurveyResultCell``
+rows keyed by question, a customer dimension (everyone, customer status or
+company) and the chosen option or scale value. Counts are adjusted as
+answers arrive, so per-question histograms, rating statistics and cross-tabs
+are read from a few hundred precomputed cells instead of scanning answers.
+
+Cells record the customer's status and company at the time of answering.
+The response stores them (``counted_status``, ``counted_company_id``), and
+later edits and deletions of its answers adjust those same cells even after
+the customer has moved to another status or company. Responses stored
+without them are stamped with the customer's current values the first time
+they are needed. ``rebuild`` recomputes a survey's cells from its answers.
+"""
+import hashlib
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.signals import post_delete, post_init, post_save
+
+from crm.core.cache import bump_tags, model_tag
+from crm.core.models import Customer
+
+from .models import SurveyAnswer, SurveyQuestion, SurveyResponse, SurveyResultCell
+
+
+CHOICE_TYPES = ('radio', 'checkbox')
+SCALE_TYPES = ('rating', 'likert', 'nps')
+DIMENSIONS = ('status', 'company')
+ALL = 'all'
+BUCKET_LENGTH = SurveyResultCell._meta.get_field('bucket').max_length
+
+
+def bucket_label(value):
+    """
+    ``value`` shortened to fit ``SurveyResultCell.bucket``. Radio questions
+    without options accept free text, so a label can be arbitrarily long; a
+    digest suffix keeps distinct long answers in distinct buckets.
+    """
+    value = str(value)
+    if len(value) <= BUCKET_LENGTH:
+        return value
+    digest = hashlib.sha1(value.encode()).hexdigest()[:12]
+    return f'{value[:BUCKET_LENGTH - len(digest) - 1]}~{digest}'
+
+
+def buckets(question_type, answer_text='', answer_value=None, answer_options=None):
+    """The histogram buckets one answer falls into."""
+    if question_type in SCALE_TYPES:
+        return [str(answer_value)] if answer_value is not None else []
+    if question_type == 'checkbox':
+        return [bucket_label(option) for option in answer_options or []]
+    if question_type == 'radio':
+        return [bucket_label(answer_text)] if answer_text else []
+    return []
+
+
+def cell_keys(question_id, status, company_id, answer_buckets):
+    """``(question, dimension, dimension_value, bucket)`` for every cell an answer counts in."""
+    dimensions = ((ALL, ''), ('status', status or ''), ('company', str(company_id or '')))
+    return [
+        (question_id, dimension, value, bucket)
+        for bucket in answer_buckets
+        for dimension, value in dimensions
+    ]
+
+
+def apply_deltas(survey_id, deltas):
+    """Add ``deltas`` (cell key -> change) to the cube with one insert and one update per distinct change."""
+    deltas = {key: change for key, change in deltas.items() if change}
+    if not deltas:
+        return
+    SurveyResultCell.objects.bulk_create(
+        [
+            SurveyResultCell(
+                survey_id=survey_id, question_id=question_id, dimension=dimension,
+                dimension_value=value, bucket=bucket, count=0,
+            )
+            for question_id, dimension, value, bucket in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    by_change = {}
+    for key, change in deltas.items():
+        by_change.setdefault(change, []).append(key)
+    for change, keys in by_change.items():
+        match = reduce(or_, (
+            Q(question_id=question_id, dimension=dimension, dimension_value=value, bucket=bucket)
+            for question_id, dimension, value, bucket in keys
+        ))
+        SurveyResultCell.objects.filter(match).update(count=F('count') + change)
+    bump_tags([model_tag(SurveyResultCell)])
+
+
+def record_answers(survey_id, status, company_id, answers, sign=1):
+    """
+    Count answers of one respondent into the cube.
+
+    ``answers`` is an iterable of ``(question_id, question_type, fields)``
+    where ``fields`` holds the ``SurveyAnswer`` value columns.
+    """
+    deltas = Counter()
+    for question_id, question_type, fields in answers:
+        for key in cell_keys(question_id, status, company_id, buckets(question_type, **fields)):
+            deltas[key] += sign
+    apply_deltas(survey_id, deltas)
+
+
+def _histograms(cells):
+    tables = {}
+    for cell in cells:
+        tables.setdefault(cell.question_id, {}).setdefault(cell.dimension_value, {})[cell.bucket] = cell.count
+    return tables
+
+
+def _scale_stats(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None}
+    values = {int(bucket): count for bucket, count in histogram.items() if count}
+    return {
+        'count': total,
+        'mean': sum(value * count for value, count in values.items()) / total,
+        'min': min(values) if values else None,
+        'max': max(values) if values else None,
+    }
+
+
+def _ordered(question, histogram):
+    if question.question_type in SCALE_TYPES:
+        return dict(sorted(histogram.items(), key=lambda item: int(item[0])))
+    order = {str(option): index for index, option in enumerate(question.options or [])}
+    return dict(sorted(histogram.items(), key=lambda item: (order.get(item[0], len(order)), item[0])))
+
+
+def results(survey_id, by=None):
+    """
+    Per-question distributions for a survey, split by ``by`` (``status`` or
+    ``company``) when given.
+    """
+    dimension = by if by in DIMENSIONS else ALL
+    questions = SurveyQuestion.objects.filter(survey_id=survey_id).order_by('order')
+    cells = SurveyResultCell.objects.filter(survey_id=survey_id, dimension=dimension, count__gt=0)
+    tables = _histograms(cells)
+    output = []
+    for question in questions:
+        if question.question_type not in CHOICE_TYPES + SCALE_TYPES:
+            continue
+        groups = tables.get(question.id, {})
+        entry = {'question': question.id, 'question_text': question.question_text, 'type': question.question_type}
+        if dimension == ALL:
+            entry['distribution'] = _ordered(question, groups.get('', {}))
+            if question.question_type in SCALE_TYPES:
+                entry['stats'] = _scale_stats(entry['distribution'])
+        else:
+            entry['by'] = dimension
+            entry['groups'] = {}
+            for value, histogram in sorted(groups.items()):
+                histogram = _ordered(question, histogram)
+                entry['groups'][value] = (
+                    {'distribution': histogram, 'stats': _scale_stats(histogram)}
+                    if question.question_type in SCALE_TYPES else {'distribution': histogram}
+                )
+        output.append(entry)
+    return output
+
+
+VALUE_FIELDS = ('answer_text', 'answer_value', 'answer_options')
+
+
+def _stamp(responses):
+    """Record the customers' current status and company on ``responses`` that have none yet."""
+    customer = Customer.objects.filter(pk=OuterRef('customer_id'))
+    responses.filter(counted_status__isnull=True).update(
+        counted_status=Subquery(customer.values('status')[:1]),
+        counted_company_id=Subquery(customer.values('company_id')[:1]),
+    )
+
+
+def rebuild(survey_id):
+    """Recompute a survey's cube from its stored answers; returns the number of cells."""
+    _stamp(SurveyResponse.objects.filter(survey_id=survey_id))
+    deltas = Counter()
+    rows = SurveyAnswer.objects.filter(
+        response__survey_id=survey_id,
+        question__question_type__in=CHOICE_TYPES + SCALE_TYPES,
+    ).values_list(
+        'question_id', 'question__question_type', 'response__counted_status',
+        'response__counted_company_id', *VALUE_FIELDS,
+    )
+    for question_id, question_type, status, company_id, *values in rows.iterator(chunk_size=2000):
+        fields = dict(zip(VALUE_FIELDS, values))
+        for key in cell_keys(question_id, status, company_id, buckets(question_type, **fields)):
+            deltas[key] += 1
+    with transaction.atomic():
+        SurveyResultCell.objects.filter(survey_id=survey_id).delete()
+        SurveyResultCell.objects.bulk_create(
+            [
+                SurveyResultCell(
+                    survey_id=survey_id, question_id=question_id, dimension=dimension,
+                    dimension_value=value, bucket=bucket, count=count,
+                )
+                for (question_id, dimension, value, bucket), count in deltas.items()
+            ],
+            batch_size=1000,
+        )
+    bump_tags([model_tag(SurveyResultCell)])
+    return len(deltas)
+
+
+def _answer_state(answer):
+    values = answer.__dict__
+    if 'question_id' not in values or any(field not in values for field in VALUE_FIELDS):
+        return None
+    return values['question_id'], {field: values[field] for field in VALUE_FIELDS}
+
+
+def remember_answer(instance, **kwargs):
+    instance._cube_state = _answer_state(instance)
+
+
+def _respondent(response_id):
+    """``(survey_id, status, company_id)`` a response's answers are counted under, or None."""
+    responses = SurveyResponse.objects.filter(pk=response_id)
+    respondent = responses.values_list('survey_id', 'counted_status', 'counted_company_id').first()
+    if respondent is not None and respondent[1] is None:
+        _stamp(responses)
+        respondent = responses.values_list('survey_id', 'counted_status', 'counted_company_id').first()
+    return respondent
+
+
+def _record_change(response_id, previous, current):
+    respondent = _respondent(response_id)
+    if respondent is None:
+        return
+    question_ids = {state[0] for state in (previous, current) if state}
+    types = dict(SurveyQuestion.objects.filter(pk__in=question_ids).values_list('id', 'question_type'))
+    deltas = Counter()
+    survey_id, status, company_id = respondent
+    for state, sign in ((previous, -1), (current, 1)):
+        if state:
+            question_id, fields = state
+            for key in cell_keys(question_id, status, company_id, buckets(types.get(question_id), **fields)):
+                deltas[key] += sign
+    apply_deltas(survey_id, deltas)
+
+
+def track_saved(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_cube_state', None)
+    current = _answer_state(instance)
+    if previous != current:
+        response_id = instance.response_id
+        transaction.on_commit(lambda: _record_change(response_id, previous, current))
+    instance._cube_state = current
+
+
+def track_deleted(sender, instance, **kwargs):
+    previous = _answer_state(instance)
+    if previous:
+        response_id = instance.response_id
+        # The response may be going away in the same cascade; read it now.
+        respondent = _respondent(response_id)
+        question_type = SurveyQuestion.objects.filter(pk=previous[0]).values_list('question_type', flat=True).first()
+        if respondent and question_type:
+            survey_id, status, company_id = respondent
+            transaction.on_commit(lambda: record_answers(
+                survey_id, status, company_id, [(previous[0], question_type, previous[1])], sign=-1,
+            ))
+
+
+def connect_signals():
+    post_init.connect(remember_answer, sender=SurveyAnswer, dispatch_uid='crm.results.answer')
+    post_save.connect(track_saved, sender=SurveyAnswer, dispatch_uid='crm.results.answer')
+    post_delete.connect(track_deleted, sender=SurveyAnswer, dispatch_uid='crm.results.answer')
@@ -23,7 +23,7 @@ class SurveyAnswerSerializer(serializers.ModelSerializer):
 
 
 class SurveyResponseSerializer(serializers.ModelSerializer):
-    survey = SurveySerializer(read_only=True)
+    survey = serializers.PrimaryKeyRelatedField(read_only=True)
     customer = CustomerSerializer(read_only=True)
     answers = SurveyAnswerSerializer(many=True, read_only=True)
     
@@ -0,0 +1,201 @@
+"""
+One-request survey submission.
+
+A survey's questions are compiled into a validation schema that is cached
+under the current ``Survey``/``SurveyQuestion`` table versions, so a
+submission validates every answer without reading the questions again. A
+valid submission is written in one transaction: the response, all answers
+through a single ``bulk_create`` and, for surveys with an NPS question, the
+customer's ``NPSScore``. The answers are counted into the results cube once
+the transaction commits.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers
+
+from crm.core.cache import bump_tags, get_tag_versions, model_tag
+from crm.core.models import Customer
+
+from . import results
+from .models import NPSScore, Survey, SurveyAnswer, SurveyQuestion, SurveyResponse
+
+
+SCHEMA_PREFIX = 'crm:survey-schema:'
+DEFAULT_SCALES = {'rating': (1, 5), 'likert': (1, 5), 'nps': (0, 10)}
+
+
+class AlreadySubmitted(Exception):
+    """The customer has already responded to this survey."""
+
+
+def compile_schema(survey_id):
+    questions = {}
+    for question in SurveyQuestion.objects.filter(survey_id=survey_id).order_by('order'):
+        low, high = DEFAULT_SCALES.get(question.question_type, (None, None))
+        questions[question.id] = {
+            'type': question.question_type,
+            'required': question.is_required,
+            'options': [str(option) for option in question.options or []],
+            'min': question.min_value if question.min_value is not None else low,
+            'max': question.max_value if question.max_value is not None else high,
+        }
+    return questions
+
+
+def get_schema(survey_id):
+    """Question rules for a survey, rebuilt only after a survey or question changes."""
+    versions = get_tag_versions([model_tag(Survey), model_tag(SurveyQuestion)])
+    key = f'{SCHEMA_PREFIX}{survey_id}:{versions[model_tag(Survey)]}:{versions[model_tag(SurveyQuestion)]}'
+    schema = cache.get(key)
+    if schema is None:
+        schema = compile_schema(survey_id)
+        cache.set(key, schema)
+    return schema
+
+
+def _number(value, rule):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError('Expected a whole number.')
+    if (rule['min'] is not None and number < rule['min']) or (rule['max'] is not None and number > rule['max']):
+        raise serializers.ValidationError(f"Expected a value between {rule['min']} and {rule['max']}.")
+    return {'answer_value': number}
+
+
+def clean_answer(rule, value):
+    """Field values for one ``SurveyAnswer``; raises ``ValidationError`` on bad input."""
+    kind = rule['type']
+    if kind in ('rating', 'likert', 'nps'):
+        return _number(value, rule)
+    if kind == 'checkbox':
+        choices = value if isinstance(value, list) else [value]
+        choices = [str(choice) for choice in choices]
+        unknown = [choice for choice in choices if rule['options'] and choice not in rule['options']]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown options: {", ".join(unknown)}.')
+        return {'answer_options': choices}
+    text = str(value)
+    if kind == 'radio' and rule['options'] and text not in rule['options']:
+        raise serializers.ValidationError(f'Unknown option: {text}.')
+    if kind == 'email':
+        try:
+            validate_email(text)
+        except DjangoValidationError:
+            raise serializers.ValidationError('Enter a valid email address.')
+    if kind == 'date' and parse_date(text) is None:
+        raise serializers.ValidationError('Expected a date as YYYY-MM-DD.')
+    return {'answer_text': text}
+
+
+def _blank(value):
+    return value is None or value == '' or value == []
+
+
+def validate_answers(schema, answers):
+    """
+    Check a submission against the schema.
+
+    ``answers`` maps question ids to values, or is a list of
+    ``{"question": id, "value": ...}`` objects. Returns field values keyed by
+    question id.
+    """
+    if isinstance(answers, list):
+        try:
+            answers = {item['question']: item.get('value') for item in answers}
+        except (TypeError, KeyError):
+            raise serializers.ValidationError({'answers': 'Each answer needs a question and a value.'})
+    if not isinstance(answers, dict):
+        raise serializers.ValidationError({'answers': 'Expected a list or an object of answers.'})
+
+    errors, cleaned = {}, {}
+    for raw_id, value in answers.items():
+        try:
+            question_id = int(raw_id)
+        except (TypeError, ValueError):
+            question_id = None
+        if question_id not in schema:
+            errors[str(raw_id)] = 'Not a question of this survey.'
+        elif not _blank(value):
+            try:
+                cleaned[question_id] = clean_answer(schema[question_id], value)
+            except serializers.ValidationError as exc:
+                errors[str(raw_id)] = exc.detail[0] if isinstance(exc.detail, list) else exc.detail
+    for question_id, rule in schema.items():
+        if rule['required'] and question_id not in cleaned and str(question_id) not in errors:
+            errors[str(question_id)] = 'This question is required.'
+    if errors:
+        raise serializers.ValidationError({'answers': errors})
+    return cleaned
+
+
+def submit(survey, data, ip_address=None, user_agent=''):
+    """Validate and store a complete survey response; returns the ``SurveyResponse``."""
+    now = timezone.now()
+    if not survey.is_active or (survey.start_date and now < survey.start_date) or (
+        survey.end_date and now > survey.end_date
+    ):
+        raise serializers.ValidationError({'survey': 'This survey is not accepting responses.'})
+    try:
+        customer_id = uuid.UUID(str(data.get('customer')))
+    except ValueError:
+        raise serializers.ValidationError({'customer': 'Enter a valid customer id.'})
+    customer = Customer.objects.filter(pk=customer_id).values('id', 'company_id', 'status').first()
+    if customer is None:
+        raise serializers.ValidationError({'customer': 'Unknown customer.'})
+
+    schema = get_schema(survey.pk)
+    cleaned = validate_answers(schema, data.get('answers') or {})
+    already = SurveyResponse.objects.filter(survey=survey, customer_id=customer['id'])
+    if already.exists():
+        raise AlreadySubmitted()
+
+    try:
+        with transaction.atomic():
+            response = SurveyResponse.objects.create(
+                survey=survey,
+                customer_id=customer['id'],
+                respondent_email=data.get('respondent_email', ''),
+                respondent_name=data.get('respondent_name', ''),
+                completed_at=now,
+                is_completed=True,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                counted_status=customer['status'],
+                counted_company_id=customer['company_id'],
+            )
+            SurveyAnswer.objects.bulk_create([
+                SurveyAnswer(response=response, question_id=question_id, **values)
+                for question_id, values in cleaned.items()
+            ])
+            bump_tags([model_tag(SurveyAnswer)])
+            # bulk_create sends no signals, so count the answers here.
+            counted = [(question_id, schema[question_id]['type'], values) for question_id, values in cleaned.items()]
+            transaction.on_commit(lambda: results.record_answers(
+                survey.pk, customer['status'], customer['company_id'], counted,
+            ))
+            nps_answer = next(
+                (cleaned[question_id] for question_id, rule in schema.items()
+                 if rule['type'] == 'nps' and question_id in cleaned),
+                None,
+            )
+            if nps_answer is not None:
+                NPSScore.objects.create(
+                    customer_id=customer['id'],
+                    company_id=customer['company_id'],
+                    score=nps_answer['answer_value'],
+                    survey_response=response,
+                )
+    except IntegrityError:
+        # A concurrent submission can still win the (survey, customer) unique
+        # constraint; any other integrity error is a real failure.
+        if already.exists():
+            raise AlreadySubmitted()
+        raise
+    return response
@@ -0,0 +1,144 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from crm.core.models import Company, Customer
+
+from . import results
+from .models import NPSScore, Survey, SurveyAnswer, SurveyQuestion, SurveyResponse, SurveyResultCell
+from .results import BUCKET_LENGTH, bucket_label
+
+
+class SurveyTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('surveyor')
+        cls.company = Company.objects.create(name='Acme')
+        cls.customer = Customer.objects.create(
+            company=cls.company, first_name='Ada', last_name='Byron', email='ada@example.com', status='customer',
+        )
+        cls.survey = Survey.objects.create(
+            title='Quarterly NPS', survey_type='nps', company=cls.company, created_by=cls.user,
+        )
+        cls.nps = SurveyQuestion.objects.create(survey=cls.survey, question_text='Recommend us?', question_type='nps')
+        cls.channel = SurveyQuestion.objects.create(
+            survey=cls.survey, question_text='Channel', question_type='radio', is_required=False,
+            options=['Email', 'Phone'], order=1,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = f'/api/surveys/surveys/{self.survey.pk}/submit/'
+
+    def submit(self, customer=None, answers=None):
+        body = {
+            'customer': str(self.customer.pk) if customer is None else customer,
+            'answers': {str(self.nps.pk): 9, str(self.channel.pk): 'Email'} if answers is None else answers,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, body, content_type='application/json')
+
+
+class SubmitTests(SurveyTestCase):
+    def test_submission_stores_answers_score_and_results(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(NPSScore.objects.get(customer=self.customer).score, 9)
+        self.assertTrue(SurveyResultCell.objects.filter(survey=self.survey, question=self.channel).exists())
+
+    def test_second_submission_conflicts(self):
+        self.assertEqual(self.submit().status_code, 201)
+        self.assertEqual(self.submit().status_code, 409)
+        self.assertEqual(SurveyResponse.objects.filter(survey=self.survey).count(), 1)
+
+    def test_malformed_customer_is_a_bad_request(self):
+        for customer in ('abc', '', 42):
+            with self.subTest(customer=customer):
+                response = self.submit(customer=customer)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('customer', response.json())
+
+    def test_invalid_answers_are_reported_per_question(self):
+        response = self.submit(answers={str(self.nps.pk): 11, str(self.channel.pk): 'Fax'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['answers']), {str(self.nps.pk), str(self.channel.pk)})
+        self.assertFalse(SurveyResponse.objects.exists())
+
+
+class NPSParameterTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('analyst'))
+
+    def test_malformed_parameters_are_bad_requests(self):
+        cases = [
+            ('summary', 'start=2024-02-30', 'start'),
+            ('summary', 'survey=first', 'survey'),
+            ('summary', 'company=acme', 'company'),
+            ('trend', 'company=acme', 'company'),
+            ('trend', 'company=4b0c2e9e-2f0a-4a8e-9a7a-6d0b6c1f3e21&months=0', 'months'),
+            ('trend', 'company=4b0c2e9e-2f0a-4a8e-9a7a-6d0b6c1f3e21&months=1000', 'months'),
+        ]
+        for action, query, name in cases:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/surveys/nps/{action}/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(name, response.json())
+
+
+class ResultCubeTests(SurveyTestCase):
+    def counts(self, dimension='status'):
+        return {
+            (cell.dimension_value, cell.bucket): cell.count
+            for cell in SurveyResultCell.objects.filter(question=self.channel, dimension=dimension, count__gt=0)
+        }
+
+    def answer(self):
+        return SurveyAnswer.objects.get(question=self.channel)
+
+    def move_customer(self):
+        self.customer.status = 'inactive'
+        self.customer.company = Company.objects.create(name='Globex')
+        self.customer.save()
+
+    def test_edits_adjust_the_cells_counted_at_submission(self):
+        self.submit()
+        self.move_customer()
+        answer = self.answer()
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.answer_text = 'Phone'
+            answer.save()
+        self.assertEqual(self.counts(), {('customer', 'Phone'): 1})
+        self.assertEqual(self.counts('company'), {(str(self.company.pk), 'Phone'): 1})
+
+    def test_deletes_adjust_the_cells_counted_at_submission(self):
+        self.submit()
+        self.move_customer()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answer().delete()
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(self.counts('company'), {})
+
+    def test_rebuild_keeps_the_submission_dimensions(self):
+        self.submit()
+        expected = self.counts()
+        self.move_customer()
+        results.rebuild(self.survey.pk)
+        self.assertEqual(self.counts(), expected)
+
+    def test_unstamped_responses_use_the_current_customer(self):
+        self.submit()
+        SurveyResponse.objects.update(counted_status=None, counted_company_id=None)
+        self.move_customer()
+        results.rebuild(self.survey.pk)
+        self.assertEqual(self.counts(), {('inactive', 'Email'): 1})
+        response = SurveyResponse.objects.get()
+        self.assertEqual(response.counted_company_id, self.customer.company_id)
+
+
+class BucketLabelTests(SimpleTestCase):
+    def test_long_labels_fit_and_stay_distinct(self):
+        first, second = 'x' * 500 + 'a', 'x' * 500 + 'b'
+        self.assertLessEqual(len(bucket_label(first)), BUCKET_LENGTH)
+        self.assertNotEqual(bucket_label(first), bucket_label(second))
+        self.assertEqual(bucket_label('Email'), 'Email')
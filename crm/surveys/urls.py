@@ -1,5 +1,16 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import views
+
+router = DefaultRouter()
+router.register(r'surveys', views.SurveyViewSet)
+router.register(r'questions', views.SurveyQuestionViewSet)
+router.register(r'responses', views.SurveyResponseViewSet)
+router.register(r'answers', views.SurveyAnswerViewSet)
+router.register(r'nps', views.NPSScoreViewSet)
+router.register(r'templates', views.SurveyTemplateViewSet)
+router.register(r'metrics', views.SurveyMetricsViewSet)
 
 urlpatterns = [
-    # Survey endpoints will be added here
+    path('', include(router.urls)),
 ]
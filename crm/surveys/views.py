@@ -4,19 +4,23 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     Survey, SurveyQuestion, SurveyResponse, SurveyAnswer, NPSScore,
-    SurveyTemplate, SurveyMetrics
+    SurveyTemplate, SurveyMetrics, NPSMonthly, SurveyResultCell
 )
+from . import nps, results, submission
 from .serializers import (
     SurveySerializer, SurveyQuestionSerializer, SurveyResponseSerializer,
     SurveyAnswerSerializer, NPSScoreSerializer, SurveyTemplateSerializer,
     SurveyMetricsSerializer
 )
 from django.utils import timezone
+from crm.core.cache import cache_response
+from crm.core.params import date_param, int_param, uuid_param
 
 
-class SurveyViewSet(viewsets.ModelViewSet):
+class SurveyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Survey.objects.all()
     serializer_class = SurveySerializer
     permission_classes = [IsAuthenticated]
@@ -40,8 +44,37 @@ class SurveyViewSet(viewsets.ModelViewSet):
         survey.save()
         return Response({'status': 'Survey deactivated'})
 
+    @action(detail=True, methods=['post'])
+    def submit(self, request, pk=None):
+        """Submit a complete response with all answers in one request"""
+        survey = self.get_object()
+        try:
+            response = submission.submit(
+                survey, request.data,
+                ip_address=request.META.get('REMOTE_ADDR'),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            )
+        except submission.AlreadySubmitted:
+            return Response({'error': 'This customer has already responded to the survey'},
+                            status=status.HTTP_409_CONFLICT)
+        response = SurveyResponse.objects.select_related('customer').prefetch_related(
+            'answers__question'
+        ).get(pk=response.pk)
+        return Response(SurveyResponseSerializer(response).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    @cache_response(SurveyQuestion, SurveyResultCell)
+    def results(self, request, pk=None):
+        """Get per-question answer distributions, optionally split by customer status or company"""
+        survey = self.get_object()
+        by = request.query_params.get('by')
+        if by and by not in results.DIMENSIONS:
+            return Response({'error': f"by must be one of: {', '.join(results.DIMENSIONS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'survey': survey.pk, 'by': by, 'questions': results.results(survey.pk, by)})
 
-class SurveyQuestionViewSet(viewsets.ModelViewSet):
+
+class SurveyQuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SurveyQuestion.objects.all()
     serializer_class = SurveyQuestionSerializer
     permission_classes = [IsAuthenticated]
@@ -52,7 +85,7 @@ class SurveyQuestionViewSet(viewsets.ModelViewSet):
     ordering = ['survey', 'order']
 
 
-class SurveyResponseViewSet(viewsets.ModelViewSet):
+class SurveyResponseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SurveyResponse.objects.all()
     serializer_class = SurveyResponseSerializer
     permission_classes = [IsAuthenticated]
@@ -71,7 +104,7 @@ class SurveyResponseViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Survey completed'})
 
 
-class SurveyAnswerViewSet(viewsets.ModelViewSet):
+class SurveyAnswerViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SurveyAnswer.objects.all()
     serializer_class = SurveyAnswerSerializer
     permission_classes = [IsAuthenticated]
@@ -82,7 +115,7 @@ class SurveyAnswerViewSet(viewsets.ModelViewSet):
     ordering = ['response', 'question__order']
 
 
-class NPSScoreViewSet(viewsets.ModelViewSet):
+class NPSScoreViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = NPSScore.objects.all()
     serializer_class = NPSScoreSerializer
     permission_classes = [IsAuthenticated]
@@ -93,25 +126,43 @@ class NPSScoreViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     @action(detail=False, methods=['get'])
+    @cache_response(NPSScore)
     def summary(self, request):
-        """Get NPS summary statistics"""
-        promoters = self.get_queryset().filter(score__gte=9).count()
-        passives = self.get_queryset().filter(score__in=[7, 8]).count()
-        detractors = self.get_queryset().filter(score__lte=6).count()
-        total = promoters + passives + detractors
-        
-        nps_score = ((promoters - detractors) / total * 100) if total > 0 else 0
-        
+        """Get NPS summary statistics, optionally scoped by company, survey, start and end"""
+        params = request.query_params
+        return Response(nps.breakdown(nps.scores(
+            company=uuid_param(params, 'company'),
+            survey=int_param(params, 'survey'),
+            start=date_param(params, 'start'),
+            end=date_param(params, 'end'),
+        )))
+
+    @action(detail=False, methods=['get'])
+    @cache_response(NPSMonthly)
+    def trend(self, request):
+        """Get monthly and rolling NPS for a company"""
+        company = uuid_param(request.query_params, 'company')
+        if not company:
+            return Response({'error': 'company is required'}, status=status.HTTP_400_BAD_REQUEST)
+        months = int_param(request.query_params, 'months', default=12, minimum=1, maximum=120)
+        monthly = NPSMonthly.objects.filter(company_id=company, month__gte=nps.months_back(months))
         return Response({
-            'total_responses': total,
-            'promoters': promoters,
-            'passives': passives,
-            'detractors': detractors,
-            'nps_score': nps_score
+            'rolling': nps.rolling(company, months),
+            'monthly': [
+                {
+                    'month': row.month,
+                    'promoters': row.promoters,
+                    'passives': row.passives,
+                    'detractors': row.detractors,
+                    'total_responses': row.total,
+                    'nps_score': row.nps_score,
+                }
+                for row in monthly
+            ],
         })
 
 
-class SurveyTemplateViewSet(viewsets.ModelViewSet):
+class SurveyTemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SurveyTemplate.objects.all()
     serializer_class = SurveyTemplateSerializer
     permission_classes = [IsAuthenticated]
@@ -122,7 +173,7 @@ class SurveyTemplateViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class SurveyMetricsViewSet(viewsets.ModelViewSet):
+class SurveyMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SurveyMetrics.objects.all()
     serializer_class = SurveyMetricsSerializer
     permission_classes = [IsAuthenticated]
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from crm.core.conditional import ConditionalGetMixin
 from .models import (
     WorkflowDefinition, WorkflowStep, WorkflowExecution, WorkflowStepExecution,
     WorkflowTemplate, WorkflowVariable, WorkflowIntegration, WorkflowMetrics
@@ -15,7 +16,7 @@ from .serializers import (
 )
 
 
-class WorkflowDefinitionViewSet(viewsets.ModelViewSet):
+class WorkflowDefinitionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowDefinition.objects.all()
     serializer_class = WorkflowDefinitionSerializer
     permission_classes = [IsAuthenticated]
@@ -40,7 +41,7 @@ class WorkflowDefinitionViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Workflow deactivated'})
 
 
-class WorkflowStepViewSet(viewsets.ModelViewSet):
+class WorkflowStepViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowStep.objects.all()
     serializer_class = WorkflowStepSerializer
     permission_classes = [IsAuthenticated]
@@ -51,7 +52,7 @@ class WorkflowStepViewSet(viewsets.ModelViewSet):
     ordering = ['workflow', 'order']
 
 
-class WorkflowExecutionViewSet(viewsets.ModelViewSet):
+class WorkflowExecutionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowExecution.objects.all()
     serializer_class = WorkflowExecutionSerializer
     permission_classes = [IsAuthenticated]
@@ -83,7 +84,7 @@ class WorkflowExecutionViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Execution cancelled'})
 
 
-class WorkflowStepExecutionViewSet(viewsets.ModelViewSet):
+class WorkflowStepExecutionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowStepExecution.objects.all()
     serializer_class = WorkflowStepExecutionSerializer
     permission_classes = [IsAuthenticated]
@@ -94,7 +95,7 @@ class WorkflowStepExecutionViewSet(viewsets.ModelViewSet):
     ordering = ['execution', 'step__order']
 
 
-class WorkflowTemplateViewSet(viewsets.ModelViewSet):
+class WorkflowTemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowTemplate.objects.all()
     serializer_class = WorkflowTemplateSerializer
     permission_classes = [IsAuthenticated]
@@ -105,7 +106,7 @@ class WorkflowTemplateViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class WorkflowVariableViewSet(viewsets.ModelViewSet):
+class WorkflowVariableViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowVariable.objects.all()
     serializer_class = WorkflowVariableSerializer
     permission_classes = [IsAuthenticated]
@@ -116,7 +117,7 @@ class WorkflowVariableViewSet(viewsets.ModelViewSet):
     ordering = ['workflow', 'name']
 
 
-class WorkflowIntegrationViewSet(viewsets.ModelViewSet):
+class WorkflowIntegrationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowIntegration.objects.all()
     serializer_class = WorkflowIntegrationSerializer
     permission_classes = [IsAuthenticated]
@@ -127,7 +128,7 @@ class WorkflowIntegrationViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class WorkflowMetricsViewSet(viewsets.ModelViewSet):
+class WorkflowMetricsViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WorkflowMetrics.objects.all()
     serializer_class = WorkflowMetricsSerializer
     permission_classes = [IsAuthenticated]
@@ -1,3 +1,9 @@
 
 
 
+try:
+    from .celery import app as celery_app
+except ImportError:  # Celery is only needed with AI_TRAINING_BACKEND = 'celery'
+    celery_app = None
+
+__all__ = ('celery_app',)
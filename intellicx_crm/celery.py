@@ -0,0 +1,15 @@
+"""
+Celery application, used when ``AI_TRAINING_BACKEND`` is ``'celery'``.
+
+Start a worker with ``celery -A intellicx_crm worker``; settings prefixed
+``CELERY_`` configure it.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intellicx_crm.settings')
+
+app = Celery('intellicx_crm')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -87,6 +87,137 @@ DATABASES = {
     }
 }
 
+# Cache
+# 'locmem' is a per-process LRU cache, 'file' is shared by all workers on one
+# host, and 'redis' is shared across hosts. Table versions behind response
+# caching and ETags live here and are bumped with incr, which is only atomic on
+# redis (the file cache reads then writes), so more than one worker needs
+# 'redis' (system check crm.E001).
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'intellicx-crm',
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[CACHE_BACKEND]}
+
+# Seconds a cached endpoint response may live before it is recomputed
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Channels
+# The in-memory layer only reaches clients connected to the same process; use
+# 'redis' when running more than one ASGI worker.
+CHANNEL_LAYER_BACKEND = config('CHANNEL_LAYER_BACKEND', default='memory')
+if CHANNEL_LAYER_BACKEND == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [config('REDIS_URL', default='redis://127.0.0.1:6379/2')]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# Seconds realtime events are buffered so a burst of writes becomes one message per client
+REALTIME_COALESCE_WINDOW = config('REALTIME_COALESCE_WINDOW', default=0.5, cast=float)
+
+# Seconds before the incrementally maintained dashboard snapshot is rebuilt from the database
+DASHBOARD_SNAPSHOT_TTL = config('DASHBOARD_SNAPSHOT_TTL', default=60, cast=int)
+
+# Seconds a cached unread-notification counter is trusted before it is recounted
+NOTIFICATION_UNREAD_TTL = config('NOTIFICATION_UNREAD_TTL', default=300, cast=int)
+
+# Ticket numbers each worker reserves per round-trip to the sequence table
+TICKET_NUMBER_BLOCK_SIZE = config('TICKET_NUMBER_BLOCK_SIZE', default=50, cast=int)
+
+# Seconds between rebuilds of the in-memory ticket routing index
+SUPPORT_ROUTING_REFRESH = config('SUPPORT_ROUTING_REFRESH', default=60, cast=int)
+
+# Loaded model artifacts each process keeps in memory
+AI_MODEL_CACHE_SIZE = config('AI_MODEL_CACHE_SIZE', default=8, cast=int)
+
+# Worker processes used for batch scoring; 0 scores in the calling process
+AI_SCORING_WORKERS = config('AI_SCORING_WORKERS', default=2, cast=int)
+
+# Hours a predictive score stays valid unless the model's config sets score_ttl_hours
+AI_SCORE_TTL_HOURS = config('AI_SCORE_TTL_HOURS', default=24, cast=int)
+
+# Seconds a queued full scoring run blocks another one for the same model
+AI_SCORING_TIMEOUT = config('AI_SCORING_TIMEOUT', default=3600, cast=int)
+
+# Where model training and full scoring runs go: 'local' (a process pool in the web process) or 'celery'
+AI_TRAINING_BACKEND = config('AI_TRAINING_BACKEND', default='local')
+AI_TRAINING_WORKERS = config('AI_TRAINING_WORKERS', default=1, cast=int)
+
+# Celery (intellicx_crm/celery.py), for AI_TRAINING_BACKEND = 'celery'
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://127.0.0.1:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Seconds without a progress report after which a running training job is
+# failed, and seconds a job may wait in the queue before it is failed too
+AI_TRAINING_HEARTBEAT_TIMEOUT = config('AI_TRAINING_HEARTBEAT_TIMEOUT', default=900, cast=int)
+AI_TRAINING_QUEUE_TIMEOUT = config('AI_TRAINING_QUEUE_TIMEOUT', default=21600, cast=int)
+
+# Samples per incremental training step
+AI_TRAINING_CHUNK_SIZE = config('AI_TRAINING_CHUNK_SIZE', default=5000, cast=int)
+
+# Directory for trained model artifacts
+AI_MODEL_DIR = config('AI_MODEL_DIR', default=str(BASE_DIR / 'models'))
+
+# Materialized customer feature snapshots, and how many to keep on disk
+AI_FEATURE_STORE_DIR = config('AI_FEATURE_STORE_DIR', default=str(BASE_DIR / 'feature_store'))
+AI_FEATURE_STORE_KEEP = config('AI_FEATURE_STORE_KEEP', default=2, cast=int)
+
+# Compiled chatbot classifiers each process keeps in memory
+CHATBOT_CACHE_SIZE = config('CHATBOT_CACHE_SIZE', default=32, cast=int)
+
+# Chatbot messages classified together, and seconds to wait for a batch to fill
+CHATBOT_BATCH_SIZE = config('CHATBOT_BATCH_SIZE', default=32, cast=int)
+CHATBOT_BATCH_WAIT = config('CHATBOT_BATCH_WAIT', default=0.01, cast=float)
+
+# Recommendations kept per customer, neighbours consulted, and hours they stay valid
+AI_RECOMMENDATIONS_PER_CUSTOMER = config('AI_RECOMMENDATIONS_PER_CUSTOMER', default=5, cast=int)
+AI_RECOMMENDATION_NEIGHBOURS = config('AI_RECOMMENDATION_NEIGHBOURS', default=20, cast=int)
+AI_RECOMMENDATION_TTL_HOURS = config('AI_RECOMMENDATION_TTL_HOURS', default=168, cast=int)
+
+# Seconds compiled personalization rules are reused before being reloaded,
+# even if the rule table's version has not moved
+PERSONALIZATION_RULES_TTL = config('PERSONALIZATION_RULES_TTL', default=60, cast=int)
+
+# Context columns held by more than this share of customers are left out of
+# neighbour similarity (they tell nobody apart and make it dense)
+AI_RECOMMENDATION_CONTEXT_MAX_SHARE = config('AI_RECOMMENDATION_CONTEXT_MAX_SHARE', default=0.05, cast=float)
+
+# Seconds a queued recommendation run holds its lock should its worker die
+AI_RECOMMENDATION_TIMEOUT = config('AI_RECOMMENDATION_TIMEOUT', default=3600, cast=int)
+
+# Texts scored per sentiment batch, and worker processes scoring them (0 scores inline)
+SENTIMENT_BATCH_SIZE = config('SENTIMENT_BATCH_SIZE', default=5000, cast=int)
+SENTIMENT_WORKERS = config('SENTIMENT_WORKERS', default=2, cast=int)
+
+# Hashed TF-IDF cosine similarity at which two product feedback rows are near-duplicates
+FEEDBACK_CLUSTER_SIMILARITY = config('FEEDBACK_CLUSTER_SIMILARITY', default=0.5, cast=float)
+
+# Score at which a customer/lead pair is a duplicate candidate, and the largest blocking-key block that is compared
+DEDUPE_THRESHOLD = config('DEDUPE_THRESHOLD', default=0.75, cast=float)
+DEDUPE_MAX_BLOCK = config('DEDUPE_MAX_BLOCK', default=200, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -10,8 +10,9 @@ from crm.core.views import root_view
 urlpatterns = [
     path('', root_view, name='root'),  # Serve React frontend at root
     path('admin/', admin.site.urls),
-    path('api/', include('crm.core.urls')),
+    # Before core's routes, whose customers/<pk>/ would swallow customers/duplicates/ and the rest
     path('api/customers/', include('crm.customers.urls')),
+    path('api/', include('crm.core.urls')),
     path('api/sales/', include('crm.sales.urls')),
     path('api/marketing/', include('crm.marketing.urls')),
     path('api/analytics/', include('crm.analytics.urls')),